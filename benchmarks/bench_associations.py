@@ -0,0 +1,77 @@
+"""Post <-> download association: per-pair loops vs. closure table joins.
+
+The former implementation scanned all downloads per post and, for add_associated_posts,
+recomputed each post's category subtree for every download. It is only timed up to
+LOOP_LIMIT downloads.
+
+    python benchmarks/bench_associations.py
+"""
+import random
+import time
+import polars as pl
+from lib.models import DownloadCategoryNode
+from lib.tree_functions import add_associated_downloads, add_associated_posts, get_all_category_ids
+
+N_CATEGORIES = 2000
+N_POSTS = 500
+LOOP_LIMIT = 2000
+
+
+def random_tree():
+    root = DownloadCategoryNode("root", data_id="36", data_level="0")
+    nodes = [root]
+    for i in range(1, N_CATEGORIES):
+        parent = random.choice(nodes)
+        nodes.append(DownloadCategoryNode(f"c{i}", data_id=str(36 + i), data_level="1", data_parent_id=parent.data_id, parent=parent))
+    return root
+
+
+def loop_associations(posts_df, downloads_df, root_node):
+    dl_dicts = downloads_df[["data_id", "data_category_id"]].to_dicts()
+    post_dicts = posts_df[["id", "download_chapter_dedicated"]].to_dicts()
+    downloads = {}
+    for post in post_dicts:
+        all_cat_ids = get_all_category_ids(post["download_chapter_dedicated"], root_node)
+        downloads[post["id"]] = [dl["data_id"] for dl in dl_dicts if dl["data_category_id"] in all_cat_ids] or None
+    posts = {}
+    for dl in dl_dicts:
+        matched = [
+            post["id"]
+            for post in post_dicts
+            if dl["data_category_id"] in get_all_category_ids(post["download_chapter_dedicated"], root_node)
+        ]
+        posts[dl["data_id"]] = matched or None
+    return downloads, posts
+
+
+def main():
+    random.seed(0)
+    root = random_tree()
+    posts_df = pl.DataFrame(
+        {
+            "id": range(N_POSTS),
+            "download_chapter_dedicated": [random.choice([None, 36 + random.randrange(N_CATEGORIES)]) for _ in range(N_POSTS)],
+        },
+        schema={"id": pl.Int64, "download_chapter_dedicated": pl.Int64},
+    )
+    for n_downloads in [1000, 10000, 100000]:
+        downloads_df = pl.DataFrame(
+            {
+                "data_id": range(n_downloads),
+                "data_category_id": [36 + random.randrange(N_CATEGORIES) for _ in range(n_downloads)],
+            }
+        )
+        start = time.perf_counter()
+        add_associated_downloads(posts_df, downloads_df, root)
+        add_associated_posts(downloads_df, posts_df, root)
+        joins = time.perf_counter() - start
+        line = f"{n_downloads:7} downloads: joins {joins:7.3f}s"
+        if n_downloads <= LOOP_LIMIT:
+            start = time.perf_counter()
+            loop_associations(posts_df, downloads_df, root)
+            line += f", loops {time.perf_counter() - start:7.3f}s"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
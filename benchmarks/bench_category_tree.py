@@ -0,0 +1,52 @@
+"""Category lookups by id: recursive search of the anytree tree vs. the CategoryTree index.
+
+process_link looks up the category of every downloaded file, so the search ran once per file.
+
+    python benchmarks/bench_category_tree.py
+"""
+import random
+import timeit
+from lib.models import DownloadCategoryNode
+from lib.tree_functions import CategoryTree
+
+N_LOOKUPS = 2000
+
+
+def random_tree(n_nodes):
+    root = DownloadCategoryNode("root", data_id="0", data_level="0")
+    nodes = [root]
+    for i in range(1, n_nodes):
+        parent = random.choice(nodes)
+        level = str(int(parent.data_level) + 1)
+        nodes.append(DownloadCategoryNode(f"c{i}", data_id=str(i), data_level=level, data_parent_id=parent.data_id, parent=parent))
+    return root
+
+
+def search(node, target_id):
+    # the former find_node_by_id
+    if node.data_id == target_id:
+        return node
+    for child in node.children:
+        found = search(child, target_id)
+        if found:
+            return found
+    return None
+
+
+def main():
+    random.seed(0)
+    for n_nodes in [100, 1000, 10000]:
+        root = random_tree(n_nodes)
+        targets = [str(random.randrange(n_nodes)) for _ in range(N_LOOKUPS)]
+        dfs = timeit.timeit(lambda: [search(root, t) for t in targets], number=1)
+        build = timeit.timeit(lambda: CategoryTree.from_anytree(root), number=1)
+        tree = CategoryTree.from_anytree(root)
+        indexed = timeit.timeit(lambda: [tree.node(t) for t in targets], number=1)
+        print(
+            f"{n_nodes:6} nodes: search {dfs / N_LOOKUPS * 1e6:8.1f} µs/lookup, "
+            f"index {indexed / N_LOOKUPS * 1e6:5.2f} µs/lookup (+{build * 1e3:.1f} ms to build)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""Download throughput of the thread pool and asyncio backends of extract_download_info.
+
+A local HTTP/1.1 keep-alive server stands in for meinsvwissen.de, with a fixed latency per
+request to simulate the round trip to the server.
+
+    python benchmarks/bench_download_backends.py
+"""
+import os
+import sys
+import time
+from lib import scraping
+from lib.config import rate_limits, async_download_concurrency
+from lib.models import DownloadCategoryNode
+from lib.spool import FileSpool
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "tests"))
+from conftest import LocalServer
+
+N_FILES = 200
+FILE_KB = 256
+LATENCY = 0.05
+THREAD_WORKERS = 4
+
+body = bytes(range(256)) * (FILE_KB * 4)
+connections = set()
+
+
+def respond(request):
+    connections.add(request.client_address)
+    time.sleep(LATENCY)
+    return 200, {"Content-Type": "application/pdf"}, body
+
+
+def main():
+    # the benchmark measures the backends, not the politeness settings of the real host
+    rate_limits["127.0.0.1"] = {"rate": 1000.0, "burst": 1000, "initial_window": 64, "max_window": 64}
+    server = LocalServer(respond, protocol_version="HTTP/1.1")
+    base_url = server.url
+
+    root = DownloadCategoryNode("root", data_id="36", data_level="0")
+    DownloadCategoryNode("child", data_id="41", data_level="1", data_parent_id="36", parent=root)
+    links = [{"data-category_id": "41", "data-id": str(i), "title": f"File {i}"} for i in range(N_FILES)]
+
+    for backend in ["threads", "asyncio"]:
+        connections.clear()
+        start = time.perf_counter()
+        df = scraping.extract_download_info(
+            links, root, max_workers=THREAD_WORKERS, spool=FileSpool(), backend=backend, base_url=base_url
+        )
+        seconds = time.perf_counter() - start
+        mb = df["file_size"].sum() / 1e6
+        print(
+            f"{backend:8} {len(df)} files in {seconds:.2f}s, {len(df) / seconds:.0f} files/s, "
+            f"{mb / seconds:.0f} MB/s, {len(connections)} connections"
+        )
+    print(f"(threads: {THREAD_WORKERS} workers, asyncio: {async_download_concurrency} concurrent requests)")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
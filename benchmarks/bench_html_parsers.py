@@ -0,0 +1,45 @@
+"""Posts parsed per second (PostAnalysis with sections) for every html parser of lib.html_parsing.
+
+The post is the test fixture with its widgets repeated, about the size of a long Elementor page.
+
+    python benchmarks/bench_html_parsers.py
+"""
+import os
+import time
+import logging
+import polars as pl
+from lib import html_parsing, post_parsing
+from lib.post_parsing import PostAnalysis
+from lib.transcripts import TranscriptIndex
+
+REPEAT = 40
+N_POSTS = 20
+FIXTURE = os.path.join(os.path.dirname(__file__), "..", "tests", "fixtures", "elementor_post.html")
+
+
+def main():
+    # no transcript sheet download
+    transcripts = pl.DataFrame({"url_medium": ["-"], "url_transkript": ["-"]})
+    index = TranscriptIndex(transcripts)
+    post_parsing.get_transcript_index = lambda: index
+    logger = logging.getLogger("bench")
+    with open(FIXTURE) as f:
+        content = f.read() * REPEAT
+    print(f"post size {len(content) / 1024:.0f} KiB")
+
+    for parser in html_parsing.PARSERS:
+        html_parsing.set_parser(parser)
+        start = time.perf_counter()
+        analyses = [PostAnalysis(content) for _ in range(N_POSTS)]
+        parsed = time.perf_counter() - start
+        for analysis in analyses:
+            analysis.sections("title", 1, logger)
+            analysis.related_links
+            analysis.download_chapters_further
+        total = time.perf_counter() - start
+        # sections include markdownify, which is the same for every parser
+        print(f"{parser:12} parse {N_POSTS / parsed:6.1f} posts/s, with all columns and sections {N_POSTS / total:6.1f} posts/s")
+
+
+if __name__ == "__main__":
+    main()
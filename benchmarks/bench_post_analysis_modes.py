@@ -0,0 +1,49 @@
+"""Post analysis throughput with threads vs. worker processes, and rows per second per worker.
+
+Posts are the test fixture with its widgets repeated, including its video widget. Transcripts
+are looked up in a small index set in this process instead of the downloaded sheet; worker
+processes get it from here like in the pipeline.
+
+    python benchmarks/bench_post_analysis_modes.py
+"""
+import os
+import time
+import logging
+import polars as pl
+from lib.metrics import RunReport
+from lib.post_parsing import analyze_posts, set_transcript_index
+from lib.transcripts import TranscriptIndex
+
+N_POSTS = 200
+REPEAT = 5
+WORKERS = [1, 2, 4]
+FIXTURE = os.path.join(os.path.dirname(__file__), "..", "tests", "fixtures", "elementor_post.html")
+
+
+def main():
+    set_transcript_index(
+        TranscriptIndex(pl.DataFrame({"url_medium": ["https://youtu.be/ZqFnl5tJi7o"], "url_transkript": ["-"]}))
+    )
+    with open(FIXTURE) as f:
+        post = f.read()
+    # a post has only one "Volltext" button
+    content = post + post.replace("Volltext", "Mehr") * (REPEAT - 1)
+    df = pl.DataFrame([{"id": i, "title": f"Post {i}", "content": content} for i in range(N_POSTS)])
+    logger = logging.getLogger("bench")
+
+    for mode in ["threads", "processes"]:
+        for workers in WORKERS:
+            report = RunReport("bench")
+            start = time.perf_counter()
+            with report.track("post_analysis"):
+                analyze_posts(df, logger, max_workers=workers, mode=mode)
+            seconds = time.perf_counter() - start
+            per_worker = [w["rows_per_s"] for w in report.to_dict()["stages"]["post_analysis"]["workers"].values()]
+            print(
+                f"{mode:9} {workers} workers: {N_POSTS / seconds:6.1f} posts/s, "
+                f"per worker {', '.join(f'{r:.1f}' for r in per_worker)} rows/s"
+            )
+
+
+if __name__ == "__main__":
+    main()
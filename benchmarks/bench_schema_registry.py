@@ -0,0 +1,46 @@
+"""Per-row validation cost of sections, with and without the schema registry.
+
+Before the registry, extract_sections built the pydantic model (create_model) for every post.
+
+    python benchmarks/bench_schema_registry.py
+"""
+import timeit
+from lib.models import SectionSchema
+
+N_POSTS = 2000
+SECTIONS_PER_POST = 5
+
+sections = [
+    {
+        "post_id": i,
+        "title": f"Section {j}",
+        "text": "Lorem ipsum " * 20,
+        "type": "plain_text",
+        "external_link": None,
+        "transcript_url": None,
+    }
+    for i in range(N_POSTS)
+    for j in range(SECTIONS_PER_POST)
+]
+posts = [sections[i : i + SECTIONS_PER_POST] for i in range(0, len(sections), SECTIONS_PER_POST)]
+
+
+def validate_rebuilding_model():
+    for post_sections in posts:
+        schema = SectionSchema._build_pydantic_model()
+        for section in post_sections:
+            schema.model_validate(section)
+
+
+def validate_with_registry():
+    for post_sections in posts:
+        schema = SectionSchema.to_pydantic_model()
+        for section in post_sections:
+            schema.model_validate(section)
+
+
+if __name__ == "__main__":
+    n_rows = len(sections)
+    for name, func in [("model per post", validate_rebuilding_model), ("registry", validate_with_registry)]:
+        seconds = min(timeit.repeat(func, number=1, repeat=3))
+        print(f"{name:>15}: {seconds * 1e6 / n_rows:8.2f} µs/row ({seconds:.3f}s for {n_rows} rows)")
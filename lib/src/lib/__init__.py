@@ -1,28 +1,140 @@
+import threading
 import pyarrow as pa
-from typing import Any, Dict, List, ClassVar, Optional, Type
+from typing import Any, Dict, List, ClassVar, NamedTuple, Optional, Tuple, Type, Union
 import datetime
 from pydantic import BaseModel, create_model
 from polars.datatypes import Enum as PlEnum
 from polars.datatypes import List as PlList
 import polars as pl
-import seaborn as sns
-import matplotlib.pyplot as plt
 
 # pydantic is not very compatible with dlt (no nested types, e.g. lists get converted to json strings), pyarrow and polars
 # Polars schemas do not provide otion to specify if a field is nullable or not: https://github.com/pola-rs/polars/issues/16090
 # Pyarrow schemas do not support enums
 # Cause we want both for validation (at different stages), we need to convert base schema info to both
 
+# Parquet settings for single fields, spread into the field dict (`{"name": ..., **BINARY_COLUMN}`).
+# Fields may set "compression", "compression_level", "dictionary" and "statistics" individually.
+# Already compressed files (pdf, docx, ...) do not shrink any further, and neither dictionaries nor
+# min/max statistics are useful for them
+BINARY_COLUMN = {"compression": "none", "dictionary": False, "statistics": False}
+# long, mostly unique texts like html compress well, but are never filtered on
+LONG_TEXT_COLUMN = {"compression_level": 9, "dictionary": False, "statistics": False}
+
+
+class FrozenPolarsSchema(pl.Schema):
+    """pl.Schema that can not be modified, handed out by the schema registry to all callers"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._frozen = True
+
+    def __setitem__(self, key, value):
+        if getattr(self, "_frozen", False):
+            self._readonly()
+        super().__setitem__(key, value)
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError("Registry schemas are shared, copy them (pl.Schema(schema)) before modifying")
+
+    __delitem__ = pop = popitem = clear = update = setdefault = move_to_end = _readonly
+
+    def __reduce__(self):
+        return (self.__class__, (list(self.items()),))
+
+
+class SchemaValidationError(ValueError):
+    """Raised for frames that do not match a schema, `errors` holds the per-row report"""
+
+    def __init__(self, schema_name: str, errors: pl.DataFrame):
+        self.errors = errors
+        summary = errors.group_by("column", "error").len().sort("len", descending=True)
+        details = ", ".join(f"{r['column']}: {r['error']} ({r['len']} rows)" for r in summary.iter_rows(named=True))
+        super().__init__(f"{len(errors)} validation errors for {schema_name}: {details}")
+
+
+class FrameValidation(NamedTuple):
+    # the frame with the schema's columns, in schema order, cast to the schema's dtypes
+    frame: pl.DataFrame
+    # one row per problem: row (index in the input, null for missing columns), column, error, value
+    errors: pl.DataFrame
+
+    @property
+    def ok(self) -> bool:
+        return self.errors.is_empty()
+
+    def raise_for_errors(self, schema_name: str = "frame"):
+        if not self.ok:
+            raise SchemaValidationError(schema_name, self.errors)
+
+
+_ERROR_REPORT_SCHEMA = {"row": pl.UInt32, "column": pl.Utf8, "error": pl.Utf8, "value": pl.Utf8}
+
+
+def _coercion_error(ty) -> str:
+    if isinstance(ty, PlEnum):
+        return "is not a valid enum value"
+    return f"can not be coerced to {ty}"
+
+
+def _value_repr(value) -> str:
+    if isinstance(value, pl.Series):
+        value = value.to_list()
+    return repr(value)[:100]
+
+
+# Schema registry: conversions of a schema class are built once and shared, keyed by
+# (schema class, conversion). Subclasses get their own entries.
+_registry: Dict[Tuple[type, Any], Any] = {}
+_registry_lock = threading.Lock()
+
+
+def _registered(key, build):
+    try:
+        return _registry[key]
+    except KeyError:
+        pass
+    with _registry_lock:
+        if key not in _registry:
+            _registry[key] = build()
+        return _registry[key]
+
+
 class BaseSchema:
     fields: ClassVar[List[Dict[str, Any]]] = []
+    # columns that identify a row, used to order rows when fingerprinting table content
+    sort_keys: ClassVar[List[str]] = []
+    # Parquet layout defaults of the table, fields can override codec, level, dictionary and statistics
+    compression: ClassVar[str] = "zstd"
+    compression_level: ClassVar[Optional[int]] = None
+    row_group_size: ClassVar[Optional[int]] = None  # rows, None uses the pyarrow default
+    write_page_index: ClassVar[bool] = True
+    # hive partitioning of the table's dataset, see lib.datasets. `bucket_by = (column, n)`
+    # partitions an integer column into n buckets (column % n)
+    partition_by: ClassVar[List[str]] = []
+    bucket_by: ClassVar[Optional[Tuple[str, int]]] = None
+
+    # The to_* conversions are memoized in the schema registry and return shared objects:
+    # a read-only pl.Schema, an (immutable) pa.Schema and one pydantic model class per name.
 
     @classmethod
     def to_polars_schema(cls) -> pl.Schema:
-        mapping = {fld["name"]: fld["type"] for fld in cls.fields}
-        return pl.Schema(mapping)
+        return _registered((cls, "polars"), cls._build_polars_schema)
 
     @classmethod
     def to_pyarrow_schema(cls) -> pa.Schema:
+        return _registered((cls, "pyarrow"), cls._build_pyarrow_schema)
+
+    @classmethod
+    def to_pydantic_model(cls, model_name: Optional[str] = None) -> Type[BaseModel]:
+        return _registered((cls, "pydantic", model_name), lambda: cls._build_pydantic_model(model_name))
+
+    @classmethod
+    def _build_polars_schema(cls) -> pl.Schema:
+        mapping = {fld["name"]: fld["type"] for fld in cls.fields}
+        return FrozenPolarsSchema(mapping)
+
+    @classmethod
+    def _build_pyarrow_schema(cls) -> pa.Schema:
         pa_fields = []
         for fld in cls.fields:
             name = fld["name"]
@@ -32,6 +144,99 @@ class BaseSchema:
             pa_fields.append(pa.field(name, arrow_type, nullable=nullable))
         return pa.schema(pa_fields)
 
+    @classmethod
+    def validate_frame(cls, frame: Union[pl.DataFrame, pa.Table]) -> FrameValidation:
+        """Check a whole polars or Arrow frame against the schema, column by column.
+
+        Every column is cast to its schema dtype; values that can not be coerced (including
+        strings that are not enum members, also inside lists) and nulls in non-nullable columns
+        are reported. Extra columns are dropped, missing ones reported. Nothing is raised, use
+        `raise_for_errors` on the result.
+        """
+        if isinstance(frame, pa.Table):
+            frame = pl.from_arrow(frame)
+        frame = frame.with_row_index("__row")
+        columns = []
+        reports = []
+
+        def report(mask, name, error):
+            # evaluating the mask before filtering, polars can not filter on list.eval directly
+            reports.append(
+                frame.with_columns(mask.alias("__mask")).filter("__mask").select(
+                    pl.col("__row").alias("row"),
+                    pl.lit(name).alias("column"),
+                    pl.lit(error).alias("error"),
+                    pl.col(name).map_elements(_value_repr, return_dtype=pl.Utf8).alias("value"),
+                )
+            )
+
+        for fld in cls.fields:
+            name, ty = fld["name"], fld["type"]
+            if name not in frame.columns:
+                reports.append(pl.DataFrame([{"row": None, "column": name, "error": "missing column", "value": None}], schema=_ERROR_REPORT_SCHEMA))
+                columns.append(pl.lit(None, dtype=ty).alias(name))
+                continue
+            source = pl.col(name)
+            cast = source.cast(ty, strict=False)
+            report(source.is_not_null() & cast.is_null(), name, _coercion_error(ty))
+            if isinstance(ty, PlList):
+                # non-strict casts turn invalid list elements (e.g. unknown enum values) into nulls
+                null_elements = lambda expr: expr.list.eval(pl.element().is_null()).list.sum()
+                report(cast.is_not_null() & (null_elements(cast) > null_elements(source)), name, f"element {_coercion_error(ty.inner)}")
+            if not fld["nullable"]:
+                report(source.is_null(), name, "null in non-nullable column")
+            columns.append(cast)
+
+        errors = pl.concat(reports) if reports else pl.DataFrame(schema=_ERROR_REPORT_SCHEMA)
+        errors = errors.cast(_ERROR_REPORT_SCHEMA).sort("row", "column", nulls_last=False)
+        return FrameValidation(frame.select(columns), errors)
+
+    @classmethod
+    def check_frame(cls, frame: Union[pl.DataFrame, pa.Table]) -> pl.DataFrame:
+        """validate_frame, raising SchemaValidationError on errors, returns the coerced frame"""
+        result = cls.validate_frame(frame)
+        result.raise_for_errors(cls.__name__)
+        return result.frame
+
+    @classmethod
+    def to_parquet_write_options(cls) -> Dict[str, Any]:
+        """Keyword arguments for pyarrow.parquet.write_table, per column where needed"""
+        compression: Dict[str, str] = {}
+        compression_level: Dict[str, int] = {}
+        use_dictionary: List[str] = []
+        write_statistics: List[str] = []
+        for fld in cls.fields:
+            codec = fld.get("compression", cls.compression)
+            level = fld.get("compression_level", cls.compression_level)
+            for path in cls._parquet_column_paths(fld["name"], fld["type"]):
+                compression[path] = codec
+                # pyarrow refuses levels for uncompressed columns
+                if level is not None and codec != "none":
+                    compression_level[path] = level
+                if fld.get("dictionary", True):
+                    use_dictionary.append(path)
+                if fld.get("statistics", True):
+                    write_statistics.append(path)
+
+        options: Dict[str, Any] = {
+            "compression": compression,
+            "use_dictionary": use_dictionary,
+            "write_statistics": write_statistics,
+            "write_page_index": cls.write_page_index,
+        }
+        if compression_level:
+            options["compression_level"] = compression_level
+        if cls.row_group_size is not None:
+            options["row_group_size"] = cls.row_group_size
+        return options
+
+    @staticmethod
+    def _parquet_column_paths(name: str, ty: Any) -> List[str]:
+        # per column options address leaf columns, lists are written as <name>.list.element
+        if isinstance(ty, PlList):
+            return BaseSchema._parquet_column_paths(f"{name}.list.element", ty.inner)
+        return [name]
+
     @staticmethod
     def _pl_type_to_pa(ty: Any) -> pa.DataType:
         # 1) Primitives
@@ -77,7 +282,7 @@ class BaseSchema:
         raise NotImplementedError(f"Cannot map Polars type {ty} to PyArrow")
 
     @classmethod
-    def to_pydantic_model(cls, model_name: Optional[str] = None) -> Type[BaseModel]:
+    def _build_pydantic_model(cls, model_name: Optional[str] = None) -> Type[BaseModel]:
         # 1) Determine model class name
         model_name = model_name or f"{cls.__name__}Model"
 
@@ -163,6 +368,10 @@ class BaseSchema:
 
 
 def count_plot(df, col):
+    # plotting libraries are slow to import and only needed in notebooks
+    import seaborn as sns
+    import matplotlib.pyplot as plt
+
     lst = [x for xs in df[col] for x in xs]
 
     series = pl.Series(col, lst)
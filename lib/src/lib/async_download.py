@@ -0,0 +1,149 @@
+import asyncio
+import threading
+import aiohttp
+from lib import metrics
+from lib.config import async_download_concurrency, download_chunk_kb, download_base_url
+from lib.rate_limit import limiter_for, parse_retry_after, is_retryable
+from lib.scraping import link_info, download_record, file_type_from_content_type
+from lib.validators import conditional_headers
+
+# asyncio backend of scraping.extract_download_info. All downloads share one aiohttp session whose
+# connector keeps up to `concurrency` HTTP/1.1 keep-alive connections open, so the TLS handshake
+# is paid once per connection instead of once per file. Requests still go through the per-host
+# limiters of lib.rate_limit, acquired in a worker thread to not block the event loop. Spool files
+# are written in worker threads as well.
+
+
+async def _acquire(limiter):
+    """Acquire a slot of the limiter without blocking the event loop.
+
+    The thread cannot be interrupted, so if the waiting task is cancelled (e.g. when gather
+    aborts after another download failed), the slot the thread takes is released again.
+    """
+    lock = threading.Lock()
+    state = {"acquired": False, "cancelled": False}
+
+    def acquire():
+        limiter.acquire()
+        with lock:
+            if state["cancelled"]:
+                limiter.release()
+            else:
+                state["acquired"] = True
+
+    try:
+        await asyncio.to_thread(acquire)
+    except asyncio.CancelledError:
+        with lock:
+            state["cancelled"] = True
+            if state["acquired"]:
+                limiter.release()
+        raise
+
+
+def _record(limiter, response):
+    if is_retryable(response.status):
+        limiter.on_failure(parse_retry_after(response.headers.get("Retry-After")))
+    else:
+        limiter.on_success()
+
+
+async def download_file(session, url, spool, max_retries=5, retry_delay=3, validators=None):
+    """Stream a file into the spool, returns (is_valid, file_type, SpooledFile) like
+    scraping.download_file, including conditional requests with a ValidatorStore and retries of
+    429 and 5xx responses.
+    """
+    known = await asyncio.to_thread(validators.get, url) if validators is not None else None
+    if known is not None and not await asyncio.to_thread(spool.has, known["sha256"]):
+        known = None
+    headers = conditional_headers(known) if known is not None else {}
+    limiter = limiter_for(url)
+    delay = 0
+
+    for attempt in range(max_retries):
+        if delay:
+            await asyncio.sleep(delay)
+        await _acquire(limiter)
+        recorded = False
+        try:
+            async with session.get(url, headers=headers, allow_redirects=True) as response:
+                metrics.incr("http_requests")
+                _record(limiter, response)
+                recorded = True
+                if is_retryable(response.status) and attempt < max_retries - 1:
+                    # the limiter has backed off and pauses the host for a Retry-After
+                    metrics.incr("http_retries")
+                    delay = 0 if response.headers.get("Retry-After") else retry_delay * 2**attempt
+                    continue
+                if response.status == 304 and known is not None:
+                    metrics.incr("http_not_modified")
+                    return True, known["file_type"], await asyncio.to_thread(spool.get, known["sha256"])
+                if response.status != 200:
+                    return False, "unknown", None
+                file_type = file_type_from_content_type(response.headers.get("Content-Type", ""))
+                writer = await asyncio.to_thread(spool.writer)
+                try:
+                    async for chunk in response.content.iter_chunked(download_chunk_kb * 1024):
+                        await asyncio.to_thread(writer.write, chunk)
+                except BaseException:
+                    writer.abort()
+                    raise
+                spooled = await asyncio.to_thread(writer.commit)
+                metrics.incr("http_bytes_downloaded", spooled.size)
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            if not recorded:
+                limiter.on_failure()
+            if attempt < max_retries - 1:
+                metrics.incr("http_retries")
+                delay = retry_delay * 2**attempt
+                continue
+            return False, "unknown", None
+        finally:
+            limiter.release()
+
+        if validators is not None:
+            await asyncio.to_thread(
+                validators.put,
+                url,
+                response.headers.get("ETag"),
+                response.headers.get("Last-Modified"),
+                file_type,
+                spooled.sha256,
+                spooled.size,
+            )
+        return True, file_type, spooled
+
+
+async def _download_links(lst, root_node, spool, validators, base_url, concurrency, on_done):
+    semaphore = asyncio.Semaphore(concurrency)
+    connector = aiohttp.TCPConnector(limit=concurrency, keepalive_timeout=30)
+    timeout = aiohttp.ClientTimeout(total=None, sock_connect=30, sock_read=60)
+
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+
+        async def process_link(link):
+            info = link_info(link, root_node, base_url)
+            async with semaphore:
+                result = await download_file(session, info["download_link"], spool, validators=validators)
+            if on_done is not None:
+                on_done()
+            return download_record(info, *result)
+
+        return await asyncio.gather(*(process_link(link) for link in lst))
+
+
+def download_links(
+    lst,
+    root_node,
+    spool,
+    validators=None,
+    base_url=download_base_url,
+    concurrency=async_download_concurrency,
+    on_done=None,
+):
+    """Download the files of all links with at most `concurrency` requests in flight.
+
+    Returns the same records as scraping.process_link, in the order of `lst`. `on_done` is
+    called after each finished download, e.g. to advance a progress bar.
+    """
+    return asyncio.run(_download_links(lst, root_node, spool, validators, base_url, concurrency, on_done))
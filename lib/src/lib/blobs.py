@@ -0,0 +1,181 @@
+import io
+import hashlib
+import functools
+import polars as pl
+import requests
+from lib import metrics
+from lib.metrics import ContextThreadPoolExecutor, HTTP_HOOKS
+from lib.config import bucket_url, blob_prefix, s3_upload_concurrency
+
+# Binaries (downloads, publication pdfs) can be stored once per content in S3 instead of inside
+# the parquet files. The binary column `<name>_binary` is then replaced by `<name>_sha256`,
+# `<name>_size` and `<name>_key`, the key pointing to the blob below the bucket url.
+
+
+def blob_key(digest: str) -> str:
+    # two character fan-out keeps listings of the blob prefix manageable
+    return f"{blob_prefix}/{digest[:2]}/{digest}"
+
+
+def external_column_names(column: str):
+    """Names of the sha256, size and key columns replacing a `<name>_binary` column"""
+    base = column.removesuffix("_binary")
+    return f"{base}_sha256", f"{base}_size", f"{base}_key"
+
+
+@functools.cache
+def externalized_schema(schema_cls):
+    """Variant of a schema with every binary field replaced by its sha256, size and key fields"""
+    fields = []
+    for fld in schema_cls.fields:
+        if fld["type"] is not pl.Binary:
+            fields.append(fld)
+            continue
+        sha256_col, size_col, key_col = external_column_names(fld["name"])
+        nullable = fld["nullable"]
+        fields += [
+            # hashes and keys are (nearly) unique, dictionaries would only grow the file
+            {"name": sha256_col, "type": pl.Utf8, "nullable": nullable, "dictionary": False},
+            {"name": size_col, "type": pl.Int64, "nullable": nullable},
+            {"name": key_col, "type": pl.Utf8, "nullable": nullable, "dictionary": False},
+        ]
+    # without the binaries the table is small metadata, the row groups of the binary table would be tiny
+    return type(f"External{schema_cls.__name__}", (schema_cls,), {"fields": fields, "row_group_size": None})
+
+
+def _blob_exists(client, bucket, key):
+    from botocore.exceptions import ClientError
+
+    try:
+        client.head_object(Bucket=bucket, Key=key)
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+            return False
+        raise
+    return True
+
+
+def _upload_blob(client, bucket, key, open_body, size, extra_args):
+    # the key is derived from the content, an existing object never has to be replaced
+    if _blob_exists(client, bucket, key):
+        metrics.incr("s3_blobs_skipped")
+        return
+    with open_body() as body:
+        client.put_object(Bucket=bucket, Key=key, Body=body, **extra_args)
+    metrics.incr("s3_blobs_uploaded")
+    metrics.incr("s3_bytes_uploaded", size)
+
+
+def _upload_blobs(client, bucket, blobs, extra_args, max_workers):
+    """Upload `blobs` (digest -> (open_body, size)), returns once all of them are stored"""
+    with ContextThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            executor.submit(_upload_blob, client, bucket, blob_key(digest), open_body, size, extra_args or {})
+            for digest, (open_body, size) in blobs.items()
+        ]
+        for future in futures:
+            future.result()
+
+
+def externalize_binaries(
+    df: pl.DataFrame,
+    column: str,
+    client,
+    bucket,
+    extra_args=None,
+    max_workers=s3_upload_concurrency,
+    logger=None,
+) -> pl.DataFrame:
+    """Upload every distinct binary of `column` once and replace the column by sha256, size and key.
+
+    Null binaries get null sha256, size and key. Blobs are uploaded before the dataframe is
+    returned, so a table written afterwards never references a missing blob.
+    """
+    sha256_col, size_col, key_col = external_column_names(column)
+    binaries = df[column].to_list()
+    digests = [hashlib.sha256(b).hexdigest() if b is not None else None for b in binaries]
+
+    unique = {}
+    for digest, body in zip(digests, binaries):
+        if digest is not None and digest not in unique:
+            unique[digest] = (functools.partial(io.BytesIO, body), len(body))
+    if logger:
+        logger.info(f"Storing {len(unique)} distinct blobs of {len(binaries)} {column} values")
+    _upload_blobs(client, bucket, unique, extra_args, max_workers)
+
+    position = df.columns.index(column)
+    external = pl.DataFrame(
+        {
+            sha256_col: digests,
+            size_col: [len(b) if b is not None else None for b in binaries],
+            key_col: [blob_key(d) if d is not None else None for d in digests],
+        },
+        schema={sha256_col: pl.Utf8, size_col: pl.Int64, key_col: pl.Utf8},
+    )
+    columns = df.drop(column).get_columns()
+    return pl.DataFrame(columns[:position] + external.get_columns() + columns[position:])
+
+
+def externalize_spooled_binaries(
+    df: pl.DataFrame,
+    column: str,
+    spool,
+    client,
+    bucket,
+    extra_args=None,
+    max_workers=s3_upload_concurrency,
+    logger=None,
+) -> pl.DataFrame:
+    """Like externalize_binaries for a frame whose `column` files are in a FileSpool.
+
+    The frame has the `<name>_sha256` and `<name>_size` columns of the spooled files (see
+    lib.spool.load_spooled_binaries); the blobs are streamed from the spool files and a
+    `<name>_key` column is added, so the binaries are never loaded into memory.
+    """
+    sha256_col, size_col, key_col = external_column_names(column)
+    unique = {
+        digest: (functools.partial(open, spool.file_path(digest), "rb"), size)
+        for digest, size in df.select(sha256_col, size_col).unique(sha256_col).iter_rows()
+        if digest is not None
+    }
+    if logger:
+        logger.info(f"Storing {len(unique)} distinct blobs of {len(df)} {column} values")
+    _upload_blobs(client, bucket, unique, extra_args, max_workers)
+
+    keys = pl.Series(key_col, [blob_key(d) if d is not None else None for d in df[sha256_col]], dtype=pl.Utf8)
+    position = df.columns.index(size_col) + 1
+    columns = df.get_columns()
+    return pl.DataFrame(columns[:position] + [keys] + columns[position:])
+
+
+class BlobResolver:
+    """Fetches externalized binaries by key from the public bucket, only when they are accessed.
+
+    Fetched blobs are checked against their sha256 if it is given, and the most recently used
+    ones are cached.
+    """
+
+    def __init__(self, base_url=bucket_url, cache_size=128, session=None):
+        self.base_url = base_url.rstrip("/")
+        self.session = session or requests.Session()
+        self.get = functools.lru_cache(maxsize=cache_size)(self._fetch)
+
+    def _fetch(self, key, sha256=None) -> bytes:
+        response = self.session.get(f"{self.base_url}/{key}", hooks=HTTP_HOOKS, timeout=60)
+        response.raise_for_status()
+        body = response.content
+        if sha256 is not None and hashlib.sha256(body).hexdigest() != sha256:
+            raise ValueError(f"Content of blob {key} does not match its sha256")
+        return body
+
+    def with_binaries(self, frame, column: str) -> pl.LazyFrame:
+        """Add the `column` binaries back to a frame with externalized blobs, fetched on collect"""
+        sha256_col, _, key_col = external_column_names(column)
+        return frame.lazy().with_columns(
+            pl.struct(key_col, sha256_col)
+            .map_elements(
+                lambda row: self.get(row[key_col], row[sha256_col]) if row[key_col] else None,
+                return_dtype=pl.Binary,
+            )
+            .alias(column)
+        )
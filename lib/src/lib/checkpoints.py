@@ -0,0 +1,124 @@
+import os
+import json
+import threading
+import datetime
+import polars as pl
+from anytree import NodeMixin
+from lib.tree_functions import export_tree_to_json, import_tree_from_json
+
+
+def new_run_id() -> str:
+    return datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+
+
+def spooled_digests(root_dir):
+    """sha256 of all spooled files referenced by the checkpoints of the runs in `root_dir`.
+
+    Checkpointed frames reference files of the FileSpool by their `<name>_sha256` columns.
+    """
+    digests = set()
+    if not os.path.isdir(root_dir):
+        return digests
+    for run_id in os.listdir(root_dir):
+        run_path = os.path.join(root_dir, run_id)
+        if not os.path.exists(os.path.join(run_path, CheckpointStore.manifest_name)):
+            continue
+        for file_name in os.listdir(run_path):
+            if not file_name.endswith(".arrow"):
+                continue
+            path = os.path.join(run_path, file_name)
+            columns = [name for name in pl.read_ipc_schema(path) if name.endswith("_sha256")]
+            if columns:
+                df = pl.read_ipc(path, columns=columns, memory_map=True)
+                for column in columns:
+                    digests.update(df[column].drop_nulls())
+    return digests
+
+
+class CheckpointStore:
+    """Persists stage outputs of one pipeline run in `<root_dir>/<run_id>/`.
+
+    DataFrames are written as uncompressed Arrow IPC files so they can be memory-mapped on
+    resume, category trees as anytree json and everything else as plain json.
+    `manifest.json` records which stages completed and where their outputs live.
+    """
+
+    manifest_name = "manifest.json"
+
+    def __init__(self, root_dir, run_id):
+        self.run_id = run_id
+        self.path = os.path.join(root_dir, run_id)
+        self._lock = threading.Lock()
+        os.makedirs(self.path, exist_ok=True)
+        manifest_path = os.path.join(self.path, self.manifest_name)
+        if os.path.exists(manifest_path):
+            with open(manifest_path) as f:
+                self.manifest = json.load(f)
+        else:
+            self.manifest = {"run_id": run_id, "completed_stages": [], "artifacts": {}}
+
+    @classmethod
+    def open_existing(cls, root_dir, run_id):
+        if not os.path.exists(os.path.join(root_dir, run_id, cls.manifest_name)):
+            raise FileNotFoundError(f"No checkpoints found for run {run_id} in {root_dir}")
+        return cls(root_dir, run_id)
+
+    def is_completed(self, stage_name) -> bool:
+        return stage_name in self.manifest["completed_stages"]
+
+    def has(self, name) -> bool:
+        return name in self.manifest["artifacts"]
+
+    def save_stage(self, stage_name, outputs):
+        """Write all outputs of a stage, then mark the stage as completed."""
+        files = {name: self._write(name, value) for name, value in outputs.items()}
+        with self._lock:
+            self.manifest["artifacts"].update(files)
+            if stage_name not in self.manifest["completed_stages"]:
+                self.manifest["completed_stages"].append(stage_name)
+            self._write_manifest()
+
+    def invalidate_stage(self, stage_name):
+        """Mark a stage as not completed, so a resumed run executes it again."""
+        with self._lock:
+            if stage_name in self.manifest["completed_stages"]:
+                self.manifest["completed_stages"].remove(stage_name)
+                self._write_manifest()
+
+    def load(self, name):
+        file_name = self.manifest["artifacts"][name]
+        path = os.path.join(self.path, file_name)
+        if file_name.endswith(".arrow"):
+            return pl.read_ipc(path, memory_map=True)
+        if file_name.endswith(".tree.json"):
+            return import_tree_from_json(path)
+        with open(path) as f:
+            return json.load(f)
+
+    def _write(self, name, value):
+        if isinstance(value, pl.DataFrame):
+            file_name = f"{name}.arrow"
+            write = lambda path: value.write_ipc(path, compression="uncompressed")
+        elif isinstance(value, NodeMixin):
+            file_name = f"{name}.tree.json"
+            write = lambda path: export_tree_to_json(value, path)
+        else:
+            file_name = f"{name}.json"
+
+            def write(path):
+                with open(path, "w") as f:
+                    json.dump(value, f)
+
+        path = os.path.join(self.path, file_name)
+        # write to a temporary file first so an interrupted run never leaves a truncated checkpoint
+        tmp_path = f"{path}.tmp"
+        write(tmp_path)
+        os.replace(tmp_path, path)
+        return file_name
+
+    def _write_manifest(self):
+        path = os.path.join(self.path, self.manifest_name)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.manifest, f, indent=2)
+        os.replace(tmp_path, path)
@@ -4,6 +4,12 @@ pipeline_name = "segg"
 
 tree_json_path = "downloads_tree.json"
 
+# per-stage performance numbers of the latest run
+run_report_path = "run_report.json"
+
+# local stage outputs of pipeline runs, used to resume failed runs
+checkpoint_dir = ".checkpoints"
+
 download_subpage = "/sv-archiv"
 
 # ISO 3166-2 format for German states: https://www.iso.org/obp/ui/#iso:code:3166:DE
@@ -36,3 +42,50 @@ llm_base_url="https://openrouter.ai/api/v1"
 
 llm_model="mistralai/mistral-small-3.2-24b-instruct"
 
+
+# Per-domain request throttling, see lib.rate_limit. rate: requests per second, burst: token bucket
+# size, initial_window/max_window: concurrent requests (grows while responses are healthy).
+# Subdomains use the settings of their domain, unknown hosts "default".
+rate_limits = {
+    "default": {"rate": 2.0, "burst": 2, "initial_window": 2, "max_window": 4},
+    "meinsvwissen.de": {"rate": 4.0, "burst": 4, "initial_window": 2, "max_window": 8},
+    "svtipps.de": {"rate": 2.0, "burst": 2, "initial_window": 1, "max_window": 4},
+    "api.zotero.org": {"rate": 5.0, "burst": 5, "initial_window": 2, "max_window": 6},
+}
+
+# downloaded files are streamed to disk in chunks of this size, see lib.spool
+download_chunk_kb = 64
+# "threads" or "asyncio" (lib.async_download), see scraping.extract_download_info
+download_backend = "threads"
+async_download_concurrency = 16
+download_base_url = "https://meinsvwissen.de"
+# "http" reads the WP File Download category tree and file lists without a browser, selenium is the fallback
+listing_backend = "http"
+# get_file_links keeps one headless Chrome per worker and moves between categories via the URL hash
+reuse_browser_sessions = True
+# spool shared by all runs, and the ETag/Last-Modified of its files for conditional re-downloads
+spool_dir = ".cache/spool"
+download_validators_path = ".cache/download_validators.sqlite"
+
+# public url of the S3 bucket, and the prefix of content-addressed blobs (externalized binaries) in it
+bucket_url = "https://cdl-segg.fra1.cdn.digitaloceanspaces.com"
+blob_prefix = "blobs/sha256"
+
+# multipart upload of parquet files to S3
+s3_part_size_mb = 16
+s3_upload_concurrency = 4
+# background uploads running at once, and the (in memory) table size they may hold in total
+s3_background_uploads = 2
+s3_max_bytes_in_flight_mb = 512
+
+# BeautifulSoup tree builder of lib.html_parsing.parse_html: "html.parser" or "lxml" (faster)
+html_parser = "html.parser"
+
+# lib.post_parsing.analyze_posts: "processes" parses posts on several cores, "threads" in this process
+post_analysis_mode = "processes"
+post_analysis_batch_size = 16
+
+# lib.permalinks: links between posts that are not in the permalink index of the loaded posts are
+# looked up in the WP API, this many slugs per request
+wp_api_url = "https://meinsvwissen.de/wp-json/wp/v2"
+slug_lookup_batch_size = 50
@@ -0,0 +1,147 @@
+import json
+import urllib.parse
+import polars as pl
+import pyarrow as pa
+from lib.s3_helpers import conform_to_schema, upload_table, upload_bytes
+
+# Hive-style partitioned datasets: `<prefix>/<column>=<value>/.../part-0.parquet` plus
+# `<prefix>/manifest.json`, which lists every file with its partition values, row count and the
+# min/max of its columns, so clients can pick the files they need before downloading anything.
+# Partition columns are not stored inside the files, readers take them from the path
+# (e.g. pyarrow.dataset.dataset(..., partitioning="hive")).
+
+MANIFEST_NAME = "manifest.json"
+# hive convention for null partition values
+NULL_PARTITION = "__HIVE_DEFAULT_PARTITION__"
+
+# column types whose min/max are published in the manifest
+_STATISTICS_TYPES = (pl.Int8, pl.Int16, pl.Int32, pl.Int64, pl.UInt8, pl.UInt16, pl.UInt32, pl.UInt64, pl.Float32, pl.Float64, pl.Date, pl.Datetime, pl.Utf8)
+
+
+def bucket_column(column: str) -> str:
+    return f"{column}_bucket"
+
+
+def partition_columns(schema_cls):
+    columns = list(schema_cls.partition_by)
+    if schema_cls.bucket_by is not None:
+        columns.append(bucket_column(schema_cls.bucket_by[0]))
+    return columns
+
+
+def partition_frame(df: pl.DataFrame, schema_cls):
+    """Split a dataframe into (partition values, rows) pairs according to the schema's partitioning.
+
+    `bucket_by = (column, n)` adds the partition `<column>_bucket = column % n`. Ids are assigned
+    sequentially, so the modulo spreads them evenly and, unlike a hash, is easy to compute for
+    readers looking for a single id.
+    """
+    columns = partition_columns(schema_cls)
+    if schema_cls.bucket_by is not None:
+        column, n_buckets = schema_cls.bucket_by
+        df = df.with_columns((pl.col(column) % n_buckets).alias(bucket_column(column)))
+    if not columns:
+        return [({}, df)]
+    # enums are partitioned by their labels
+    df = df.with_columns(pl.col(c).cast(pl.Utf8) for c in columns if isinstance(df.schema[c], pl.Enum))
+    parts = df.partition_by(columns, as_dict=True, maintain_order=True)
+    return sorted(
+        ((dict(zip(columns, values)), part) for values, part in parts.items()),
+        key=lambda item: [str(v) for v in item[0].values()],
+    )
+
+
+def partition_path(partition) -> str:
+    return "/".join(
+        f"{column}={NULL_PARTITION if value is None else urllib.parse.quote(str(value), safe='')}"
+        for column, value in partition.items()
+    )
+
+
+def column_statistics(df: pl.DataFrame, schema_cls):
+    """min/max of the columns that keep parquet statistics, skipping lists, binaries and enums"""
+    statistics = {}
+    for fld in schema_cls.fields:
+        name = fld["name"]
+        if name not in df.columns or not fld.get("statistics", True):
+            continue
+        if not any(fld["type"] is ty or fld["type"] == ty for ty in _STATISTICS_TYPES):
+            continue
+        column = df[name].drop_nulls()
+        if len(column) == 0:
+            continue
+        statistics[name] = {"min": column.min(), "max": column.max()}
+    return statistics
+
+
+def upload_dataset(client, df: pl.DataFrame, schema_cls, bucket, prefix, extra_args=None, skip_unchanged=True, logger=None):
+    """Upload a dataframe as a partitioned dataset below `prefix`, then its manifest.
+
+    Every partition file is fingerprinted and skipped when unchanged, like a flat table. The
+    manifest is uploaded last, so it only ever lists files that exist; files of partitions that
+    no longer exist are deleted afterwards. Returns the number of bytes uploaded.
+    """
+    columns = partition_columns(schema_cls)
+    full_schema = schema_cls.to_pyarrow_schema()
+    file_schema = pa.schema([f for f in full_schema if f.name not in columns])
+    write_options = schema_cls.to_parquet_write_options()
+
+    files = []
+    uploaded = 0
+    for partition, part in partition_frame(df, schema_cls):
+        path = partition_path(partition)
+        key = f"{prefix}/{path}/part-0.parquet" if path else f"{prefix}/part-0.parquet"
+        table = conform_to_schema(part.drop(columns).to_arrow(), file_schema, key, logger=logger)
+        uploaded += upload_table(
+            client,
+            table,
+            bucket,
+            key,
+            extra_args=extra_args,
+            sort_keys=schema_cls.sort_keys,
+            skip_unchanged=skip_unchanged,
+            logger=logger,
+            **write_options,
+        )
+        files.append(
+            {
+                "key": key,
+                "partition": partition,
+                "rows": len(part),
+                "statistics": column_statistics(part, schema_cls),
+            }
+        )
+
+    manifest = {
+        "format": "parquet",
+        "partitioning": "hive",
+        "partition_by": columns,
+        "bucket_by": list(schema_cls.bucket_by) if schema_cls.bucket_by is not None else None,
+        "rows": len(df),
+        "files": files,
+    }
+    body = json.dumps(manifest, indent=2, default=str).encode("utf-8")
+    uploaded += upload_bytes(
+        client,
+        body,
+        bucket,
+        f"{prefix}/{MANIFEST_NAME}",
+        extra_args={**(extra_args or {}), "ContentType": "application/json"},
+        skip_unchanged=skip_unchanged,
+        logger=logger,
+    )
+    _delete_stale_files(client, bucket, prefix, {f["key"] for f in files}, logger)
+    if logger:
+        logger.info(f"Uploaded {len(files)} partitions of {prefix}")
+    return uploaded
+
+
+def _delete_stale_files(client, bucket, prefix, keep, logger=None):
+    paginator = client.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=bucket, Prefix=f"{prefix}/"):
+        for obj in page.get("Contents", []):
+            key = obj["Key"]
+            if key.endswith(".parquet") and key not in keep:
+                if logger:
+                    logger.info(f"Deleting stale partition file {key}")
+                client.delete_object(Bucket=bucket, Key=key)
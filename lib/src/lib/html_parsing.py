@@ -0,0 +1,35 @@
+import soupsieve
+from bs4 import BeautifulSoup
+from lib.config import html_parser
+
+# All scrapers parse html through parse_html, so the BeautifulSoup tree builder is chosen here.
+# "lxml" parses in C and is several times faster than the pure-Python "html.parser" on large
+# Elementor pages and law documents; the trees differ only in the <html>/<body> wrapper that
+# lxml adds around fragments, which find/select-based code does not see.
+PARSERS = ("html.parser", "lxml")
+
+_parser = html_parser
+
+
+def set_parser(name):
+    """Select the parser used by parse_html for the rest of the process"""
+    global _parser
+    if name not in PARSERS:
+        raise ValueError(f"Unknown html parser: {name}, choose one of {PARSERS}")
+    if name == "lxml":
+        # fail at startup rather than on the first page
+        import lxml  # noqa: F401
+    _parser = name
+
+
+def get_parser():
+    return _parser
+
+
+def parse_html(markup, parser=None) -> BeautifulSoup:
+    return BeautifulSoup(markup, parser or _parser)
+
+
+def compile_selector(css) -> soupsieve.SoupSieve:
+    """A CSS selector compiled once at import, for `.select(tag)`, `.select_one(tag)` and `.match(tag)`"""
+    return soupsieve.compile(css)
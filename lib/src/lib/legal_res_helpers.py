@@ -1,15 +1,12 @@
 import requests
 import polars as pl
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from bs4 import BeautifulSoup
+from lib.html_parsing import parse_html
 from html_sanitizer import Sanitizer
 import time
 from lib.models import LegalResourceSchema
-from rich.progress import Progress, TimeRemainingColumn, BarColumn, TextColumn
+from lib.progress import progress_task
+from lib import metrics
+from lib.metrics import HTTP_HOOKS
 
 from html_sanitizer.sanitizer import DEFAULT_SETTINGS
 
@@ -17,6 +14,9 @@ DEFAULT_SETTINGS["attributes"] = {"a": ("name", "target", "title", "id", "rel")}
 
 
 def create_chrome_driver():
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options
+
     options = Options()
     options.add_argument("--headless=new")
     options.add_argument("--no-sandbox")
@@ -25,9 +25,14 @@ def create_chrome_driver():
 
 
 def scrape_legal_page(url, timeout=35):
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
+
     driver = create_chrome_driver()
 
     driver.get(url)
+    metrics.incr("selenium_page_loads")
 
     time.sleep(8)
 
@@ -57,7 +62,7 @@ def scrape_legal_page(url, timeout=35):
 
         page_source = driver.page_source
 
-        soup = BeautifulSoup(page_source, "html.parser")
+        soup = parse_html(page_source)
 
         doc_body = soup.find(class_=content_class)
     elif version == "wolterskluwer":
@@ -105,7 +110,7 @@ def scrape_legal_page(url, timeout=35):
 
         page_source = driver.page_source
 
-        soup = BeautifulSoup(page_source, "html.parser")
+        soup = parse_html(page_source)
 
         doc_body = soup.find(class_=content_class)
 
@@ -122,9 +127,9 @@ def get_legal_soup(url, class_=None):
         "Accept-Language": "en-US,en;q=0.9",
     }
 
-    res = requests.get(url, headers=headers)
+    res = requests.get(url, headers=headers, hooks=HTTP_HOOKS)
     res.raise_for_status()
-    soup = BeautifulSoup(res.content, "html.parser")
+    soup = parse_html(res.content)
     if class_ is not None:
         content = soup.find(class_=class_)
     else:
@@ -140,11 +145,12 @@ def wait_jportal_load(url):
     driver = create_chrome_driver()
 
     driver.get(url)
+    metrics.incr("selenium_page_loads")
     time.sleep(5)
     page_source = driver.page_source
     driver.quit()
 
-    soup = BeautifulSoup(page_source, "html.parser")
+    soup = parse_html(page_source)
 
     doc_body = soup.find(class_="docbody")
     if doc_body:
@@ -157,16 +163,9 @@ def get_legal_resources(cfg, debug=False, logger=None):
     Very open data
     """
     sanitizer = Sanitizer(settings=DEFAULT_SETTINGS)
-    schema = LegalResourceSchema.to_pydantic_model()
     law_resources = []
-    with Progress(
-        TextColumn("[progress.description]{task.description}"),
-        BarColumn(),
-        TextColumn("[progress.percentage]{task.percentage:>3.0f}%"),
-        TimeRemainingColumn(),
-    ) as progress:
-        total = sum(len(entry["resources"]) for entry in cfg)
-        task = progress.add_task("Getting legal resources...", total=total)
+    total = sum(len(entry["resources"]) for entry in cfg)
+    with progress_task("Getting legal resources...", total=total) as advance:
         for obj in cfg:
             jurisdiction = obj["jurisdiction"]
             for resource in obj["resources"]:
@@ -183,7 +182,7 @@ def get_legal_resources(cfg, debug=False, logger=None):
                 else:
                     raise ValueError(f"Not a valid strategy: {resource['strategy']}")
                 sanitized = sanitizer.sanitize(html)
-                validated = schema.model_validate(
+                law_resources.append(
                     {
                         "html": sanitized,
                         "title": resource["title"],
@@ -193,9 +192,7 @@ def get_legal_resources(cfg, debug=False, logger=None):
                         if resource.get("permalink", None) is not None
                         else resource.get("url"),
                     }
-                ).model_dump()
-                law_resources.append(validated)
-                progress.update(task, advance=1)
+                )
+                advance()
 
-    df = pl.DataFrame(law_resources)
-    return df
+    return LegalResourceSchema.check_frame(pl.from_dicts(law_resources, infer_schema_length=None))
@@ -0,0 +1,214 @@
+import contextlib
+import contextvars
+import datetime
+import json
+import resource
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# The stage whose metrics are currently recorded. Set by RunReport.track and carried into
+# worker threads by ContextThreadPoolExecutor.
+_current_stage = contextvars.ContextVar("current_stage", default=None)
+
+
+def _peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on linux, bytes on macOS
+    if sys.platform == "darwin":
+        return peak / 1024**2
+    return peak / 1024
+
+
+class StageMetrics:
+    def __init__(self, name):
+        self.name = name
+        self.wall_time_s = 0.0
+        self.cpu_time_s = 0.0
+        self.peak_rss_mb = 0.0
+        self.rows = None
+        self.output_rows = {}
+        self.status = "running"
+        self.counters = {}
+        self.phases = {}
+        self.workers = {}
+        self._lock = threading.Lock()
+
+    def incr(self, key, n=1):
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + n
+
+    def add_cpu_time(self, seconds):
+        with self._lock:
+            self.cpu_time_s += seconds
+
+    def add_phase(self, name, seconds):
+        with self._lock:
+            self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def record_worker(self, worker, rows, seconds):
+        with self._lock:
+            totals = self.workers.setdefault(worker, {"rows": 0, "busy_s": 0.0})
+            totals["rows"] += rows
+            totals["busy_s"] += seconds
+
+    def to_dict(self):
+        return {
+            "status": self.status,
+            "wall_time_s": round(self.wall_time_s, 3),
+            "cpu_time_s": round(self.cpu_time_s, 3),
+            "peak_rss_mb": round(self.peak_rss_mb, 1),
+            "rows": self.rows,
+            **({"output_rows": self.output_rows} if self.output_rows else {}),
+            **dict(sorted(self.counters.items())),
+            "phases_wall_time_s": {k: round(v, 3) for k, v in self.phases.items()},
+            **({"workers": self._workers_dict()} if self.workers else {}),
+        }
+
+    def _workers_dict(self):
+        return {
+            worker: {
+                "rows": totals["rows"],
+                "busy_s": round(totals["busy_s"], 3),
+                "rows_per_s": round(totals["rows"] / totals["busy_s"], 1) if totals["busy_s"] else None,
+            }
+            for worker, totals in sorted(self.workers.items())
+        }
+
+
+class RunReport:
+    """Collects per-stage performance numbers of a pipeline run.
+
+    CPU time is summed over the stage thread and all tasks it submits through
+    ContextThreadPoolExecutor. Peak RSS is the process-wide high-water mark when the stage
+    finished, so it includes stages running at the same time.
+    """
+
+    def __init__(self, run_id):
+        self.run_id = run_id
+        self.started_at = datetime.datetime.now(datetime.timezone.utc)
+        self.stages = {}
+        self.uploads = []
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def track(self, stage_name):
+        stage = StageMetrics(stage_name)
+        with self._lock:
+            self.stages[stage_name] = stage
+        token = _current_stage.set(stage)
+        wall_start = time.perf_counter()
+        cpu_start = time.thread_time()
+        try:
+            yield stage
+            stage.status = "succeeded"
+        except BaseException:
+            stage.status = "failed"
+            raise
+        finally:
+            stage.add_cpu_time(time.thread_time() - cpu_start)
+            stage.wall_time_s = time.perf_counter() - wall_start
+            stage.peak_rss_mb = _peak_rss_mb()
+            _current_stage.reset(token)
+
+    def record_upload(self, transfer):
+        with self._lock:
+            self.uploads.append(transfer)
+
+    def to_dict(self):
+        return {
+            "run_id": self.run_id,
+            "started_at": self.started_at.isoformat(),
+            "wall_time_s": round(time.perf_counter() - self._start, 3),
+            "peak_rss_mb": round(_peak_rss_mb(), 1),
+            "stages": {name: stage.to_dict() for name, stage in self.stages.items()},
+            "uploads": list(self.uploads),
+        }
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), indent=2)
+
+
+class ContextThreadPoolExecutor(ThreadPoolExecutor):
+    """ThreadPoolExecutor whose tasks count towards the stage that submitted them."""
+
+    def submit(self, fn, /, *args, **kwargs):
+        context = contextvars.copy_context()
+
+        def run():
+            cpu_start = time.thread_time()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                stage = _current_stage.get()
+                if stage is not None:
+                    stage.add_cpu_time(time.thread_time() - cpu_start)
+
+        return super().submit(context.run, run)
+
+
+def current_stage():
+    """The StageMetrics of the stage running in this context, None outside of a tracked stage."""
+    return _current_stage.get()
+
+
+def incr(key, n=1):
+    """Add to a counter of the current stage. Does nothing outside of a tracked stage."""
+    stage = _current_stage.get()
+    if stage is not None:
+        stage.incr(key, n)
+
+
+def add_cpu_time(seconds):
+    """Add CPU time spent outside of the stage's threads, e.g. in worker processes."""
+    stage = _current_stage.get()
+    if stage is not None:
+        stage.add_cpu_time(seconds)
+
+
+def record_worker(worker, rows, seconds):
+    """Add rows processed by a worker of the current stage and the time it was busy with them."""
+    stage = _current_stage.get()
+    if stage is not None:
+        stage.record_worker(worker, rows, seconds)
+
+
+@contextlib.contextmanager
+def phase(name):
+    """Record the wall time of a part of the current stage."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stage = _current_stage.get()
+        if stage is not None:
+            stage.add_phase(name, time.perf_counter() - start)
+
+
+def track_response(response, *args, **kwargs):
+    """requests response hook counting requests, downloaded bytes and urllib3 retries."""
+    incr("http_requests")
+    if kwargs.get("stream"):
+        # do not consume streamed bodies here, rely on the announced size
+        n_bytes = int(response.headers.get("Content-Length") or 0)
+    else:
+        n_bytes = len(response.content)
+    incr("http_bytes_downloaded", n_bytes)
+    retries = getattr(response.raw, "retries", None)
+    if retries is not None and retries.history:
+        incr("http_retries", len(retries.history))
+    return response
+
+
+HTTP_HOOKS = {"response": track_response}
+
+
+def record_llm_usage(history):
+    """Count LLM calls and tokens from the history entries of a dspy LM."""
+    for entry in history:
+        incr("llm_calls")
+        usage = entry.get("usage") or {}
+        incr("llm_prompt_tokens", usage.get("prompt_tokens") or 0)
+        incr("llm_completion_tokens", usage.get("completion_tokens") or 0)
@@ -1,7 +1,7 @@
 from anytree import NodeMixin
 from lib.config import valid_jurisdictions, valid_school_types
 import polars as pl
-from lib import BaseSchema
+from lib import BaseSchema, BINARY_COLUMN, LONG_TEXT_COLUMN
 
 # The Downloads from https://meinsvwissen.de/sv-archiv/ as a Tree Structure
 class DownloadCategoryNode(NodeMixin):
@@ -28,6 +28,9 @@ class DownloadCategoryNode(NodeMixin):
 
 # Various files from https://meinsvwissen.de/sv-archiv/
 class DownloadSchema(BaseSchema):
+    sort_keys = ["data_id", "data_category_id"]
+    # a few MB of file binaries per row, small row groups keep reads of single files cheap
+    row_group_size = 64
     fields = [
         {"name": "data_id", "type": pl.Int64, "nullable": False},
         {"name": "data_category_id", "type": pl.Int64, "nullable": False},
@@ -35,7 +38,7 @@ class DownloadSchema(BaseSchema):
         {"name": "category_title", "type": pl.Utf8, "nullable": False},
         {"name": "download_link", "type": pl.Utf8, "nullable": False},
         {"name": "file_type", "type": pl.Utf8, "nullable": False},
-        {"name": "file_binary", "type": pl.Binary, "nullable": False},
+        {"name": "file_binary", "type": pl.Binary, "nullable": False, **BINARY_COLUMN},
         {
             "name": "associated_posts",
             "type": pl.List(pl.Int64),
@@ -48,6 +51,8 @@ class DownloadSchema(BaseSchema):
 
 # "Wissensmodule"/"Wissenskatalog"/Posts from https://meinsvwissen.de/wissen/
 class PostSchema(BaseSchema):
+    sort_keys = ["id"]
+    bucket_by = ("id", 8)
     fields = [
         {"name": "id", "type": pl.Int64, "nullable": False},
         {"name": "date", "type": pl.Date, "nullable": False},
@@ -95,6 +100,9 @@ class PostSchema(BaseSchema):
     ]
 
 class SectionSchema(BaseSchema):
+    # sections of a post keep their order, the sort is stable
+    sort_keys = ["post_id"]
+    partition_by = ["type"]
     fields = [
         {
             "name": "post_id",
@@ -102,7 +110,7 @@ class SectionSchema(BaseSchema):
             "nullable": False,
         },  # foreign key to posts (id)
         {"name": "title", "type": pl.Utf8, "nullable": True},
-        {"name": "text", "type": pl.Utf8, "nullable": True},
+        {"name": "text", "type": pl.Utf8, "nullable": True, **LONG_TEXT_COLUMN},
         {
             "name": "type",
             "type": pl.Enum(
@@ -132,9 +140,10 @@ class SectionSchema(BaseSchema):
 
 # Sub page of https://meinsvwissen.de/glossar-schuelervertretung/
 class TermSchema(BaseSchema):
+    sort_keys = ["term"]
     fields = [
         {"name": "term", "type": pl.Utf8, "nullable": False},
-        {"name": "definition", "type": pl.Utf8, "nullable": True},
+        {"name": "definition", "type": pl.Utf8, "nullable": True, **LONG_TEXT_COLUMN},
         *[
             {"name": region, "type": pl.Utf8, "nullable": True}
             for region in list(valid_jurisdictions.keys())
@@ -143,15 +152,18 @@ class TermSchema(BaseSchema):
 
 # Publications from the Zotero group library: https://www.zotero.org/groups/6066861/segg/library
 class PublicationSchema(BaseSchema):
+    sort_keys = ["key"]
+    row_group_size = 64
+    partition_by = ["jurisdiction"]
     fields = [
         {"name": "key", "type": pl.Utf8, "nullable": False},
         {"name": "type", "type": pl.Utf8, "nullable": False},
         {"name": "title", "type": pl.Utf8, "nullable": False},
         {"name": "authors", "type": pl.List(pl.Utf8), "nullable": False},
-        {"name": "abstract", "type": pl.Utf8, "nullable": True},
+        {"name": "abstract", "type": pl.Utf8, "nullable": True, **LONG_TEXT_COLUMN},
         {"name": "date", "type": pl.Utf8, "nullable": False},
         {"name": "url", "type": pl.Utf8, "nullable": False},
-        {"name": "pdf_binary", "type": pl.Binary, "nullable": False},
+        {"name": "pdf_binary", "type": pl.Binary, "nullable": False, **BINARY_COLUMN},
         {
             "name": "jurisdiction",
             "type": pl.Enum(list(valid_jurisdictions.keys())),
@@ -168,11 +180,13 @@ class PublicationSchema(BaseSchema):
 
 # Attempt to get the latest relevant legal sources for all german states 
 class LegalResourceSchema(BaseSchema):
+    sort_keys = ["url"]
+    partition_by = ["jurisdiction"]
     fields = [
         {"name": "url", "type": pl.Utf8, "nullable": False},
         {"name": "type", "type": pl.Utf8, "nullable": False},
         {"name": "title", "type": pl.Utf8, "nullable": False},
-        {"name": "html", "type": pl.Utf8, "nullable": False},
+        {"name": "html", "type": pl.Utf8, "nullable": False, **LONG_TEXT_COLUMN},
         {
             "name": "jurisdiction",
             "type": pl.Enum(list(valid_jurisdictions.keys())),
@@ -183,6 +197,7 @@ class LegalResourceSchema(BaseSchema):
 # https://www.bildungsserver.de/schule/gremien-der-schuelervertretung-sm-12681-de.html
 class SCCSchema(BaseSchema):
     #Student council committees/Gremien der Schüler*innenvertretung
+    sort_keys = ["name"]
     fields = [
         {"name": "name", "type": pl.Utf8, "nullable": False},
         {"name": "description", "type": pl.Utf8, "nullable": False},
@@ -196,10 +211,11 @@ class SCCSchema(BaseSchema):
 
 # https://svtipps.de
 class SVTippsSchema(BaseSchema):
+    sort_keys = ["url"]
     fields = [
         {"name": "title", "type": pl.Utf8, "nullable": False},
         {"name": "url", "type": pl.Utf8, "nullable": False},
-        {"name": "html_content", "type": pl.Utf8, "nullable": False},
+        {"name": "html_content", "type": pl.Utf8, "nullable": False, **LONG_TEXT_COLUMN},
         {"name": "category", "type": pl.Utf8, "nullable": True},  # Top level category (e.g. "Struktur", "Management")
         {"name": "subcategory", "type": pl.Utf8, "nullable": True},  # Subcategory if applicable
     ]
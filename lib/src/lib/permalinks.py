@@ -0,0 +1,84 @@
+import time
+import urllib.parse
+import polars as pl
+import requests
+from lib import metrics
+from lib.config import wp_api_url, slug_lookup_batch_size
+from lib.rate_limit import limited_get
+
+# Links between posts are resolved against the permalinks and slugs that dlt loaded with the
+# posts (posts_pre), so most links need no request at all. Links that are not in the index are
+# looked up with the posts endpoint of the WP API, many slugs per request.
+
+
+def permalink_path(url):
+    """Host without www and the decoded, lowercased path without trailing slash"""
+    url = url.strip()
+    parts = urllib.parse.urlsplit(url if "//" in url else f"//{url}")
+    host = (parts.hostname or "").removeprefix("www.")
+    path = urllib.parse.unquote(parts.path).lower().rstrip("/")
+    return f"{host}{path}"
+
+
+def permalink_slug(url):
+    """The last path segment, which is the post's slug for the site's permalink structure"""
+    return permalink_path(url).rpartition("/")[2]
+
+
+def _normalize_slug(slug):
+    return urllib.parse.unquote(slug).lower()
+
+
+class PermalinkIndex:
+    """Post ids by permalink and by slug, built from the `id`, `link` and `slug` of the posts"""
+
+    def __init__(self, df: pl.DataFrame):
+        self._by_path = {}
+        self._by_slug = {}
+        for post_id, link, slug in df.select("id", "link", "slug").iter_rows():
+            if link:
+                self._by_path[permalink_path(link)] = post_id
+            if slug:
+                self._by_slug[_normalize_slug(slug)] = post_id
+
+    def __len__(self):
+        return len(self._by_path)
+
+    def add(self, slug, post_id):
+        self._by_slug[_normalize_slug(slug)] = post_id
+
+    def lookup(self, href):
+        post_id = self._by_path.get(permalink_path(href))
+        if post_id is None:
+            post_id = self._by_slug.get(permalink_slug(href))
+        if post_id is None:
+            # plain permalinks, e.g. https://meinsvwissen.de/?p=4791
+            query = urllib.parse.parse_qs(urllib.parse.urlsplit(href).query)
+            post_id = next((int(p) for p in query.get("p", []) if p.isdigit()), None)
+        return post_id
+
+
+def fetch_post_ids_by_slug(slugs, session=None, api_url=wp_api_url, batch_size=slug_lookup_batch_size, max_retries=3):
+    """Post ids of the given slugs from the WP API, `batch_size` slugs per request.
+
+    Slugs without a post are missing from the returned dict.
+    """
+    slugs = sorted({slug for slug in slugs if slug})
+    found = {}
+    for start in range(0, len(slugs), batch_size):
+        batch = slugs[start : start + batch_size]
+        params = {"slug": ",".join(batch), "per_page": len(batch), "_fields": "id,slug"}
+        for attempt in range(max_retries):
+            try:
+                # 429 and 5xx responses are retried by limited_get
+                response = limited_get(f"{api_url}/posts", session=session, params=params, timeout=10)
+                break
+            except requests.exceptions.RequestException:
+                if attempt == max_retries - 1:
+                    raise
+                metrics.incr("http_retries")
+                time.sleep(2**attempt)
+        response.raise_for_status()
+        for post in response.json():
+            found[_normalize_slug(post["slug"])] = post["id"]
+    return found
@@ -1,91 +1,291 @@
 import polars as pl
-from bs4 import BeautifulSoup
+from bs4 import Tag
 from markdownify import markdownify
 import requests
 import re
 import concurrent.futures
 from lib.tree_functions import find_node_by_id
-from lib.config import download_subpage
-from lib.models import SectionSchema
-from selenium import webdriver
-from selenium.webdriver.common.by import By
+from lib.config import (
+    download_subpage,
+    post_analysis_mode,
+    post_analysis_batch_size,
+    spool_dir,
+    download_validators_path,
+    wp_api_url,
+)
+from lib.spool import FileSpool
+from lib.validators import ValidatorStore
+from lib.transcripts import TranscriptIndex, load_transcript_sheet
+from lib.permalinks import PermalinkIndex, fetch_post_ids_by_slug, permalink_slug
+from lib.html_parsing import parse_html, compile_selector, get_parser, set_parser
 import time
-import random
 import json
 import threading
+import logging
+import multiprocessing
+import functools
+from lib import metrics
+from lib.metrics import ContextThreadPoolExecutor, track_response
 
 category_pattern = r"#\d+-(\d+)"  # get second number after root category id
 
-transcript_df = pl.read_excel(
-    "https://meinsvwissen.de/wp-content/uploads/2025/08/transkripte.xlsx"
-)
+transcript_sheet_url = "https://meinsvwissen.de/wp-content/uploads/2025/08/transkripte.xlsx"
 
 
-def get_transcript_url(media_url, df=transcript_df):
-    media_url = media_url.replace("https://", "")
-    if "youtu.be" in media_url:
-        media_url = media_url.split("/")[-1]
-    elif "youtube" in media_url:
-        if "embed" in media_url:
-            # https://www.youtube.com/embed/ZqFnl5tJi7o?si=xX18a5jYW_FkxuMk
-            media_url = media_url.split("/")[-1].split("?")[0]
-        else:
-            media_url = media_url.split("v=")[-1]
+@functools.cache
+def get_transcript_df():
+    # loaded on first use instead of at import time, from the disk cache if the sheet is unchanged;
+    # the pipeline loads it with load_transcript_index instead
+    return load_transcript_sheet(transcript_sheet_url, FileSpool(spool_dir), ValidatorStore(download_validators_path))
 
-    transcript_url = df.filter(
-        pl.col("url_medium").str.strip_chars().str.contains(media_url)
-    )["url_transkript"]
-    if transcript_url.is_empty():
-        return None
-    return transcript_url[0]
 
+_transcript_index = None
 
-def extract_further_download_category_ids(df):
-    def func(row):
+
+def get_transcript_index():
+    global _transcript_index
+    if _transcript_index is None:
+        _transcript_index = TranscriptIndex(get_transcript_df())
+    return _transcript_index
+
+
+def set_transcript_index(index):
+    """Look up transcripts in `index` for the rest of the process instead of loading the sheet"""
+    global _transcript_index
+    _transcript_index = index
+
+
+def load_transcript_index(spool, validators):
+    """Load the transcript sheet through the given spool and ValidatorStore and use it for all lookups.
+
+    The pipeline passes its own store, since a second sqlite connection to the validators of
+    the concurrently running downloads stage could fail with "database is locked".
+    """
+    set_transcript_index(TranscriptIndex(load_transcript_sheet(transcript_sheet_url, spool, validators)))
+
+
+def get_transcript_url(media_url, df=None):
+    index = get_transcript_index() if df is None else TranscriptIndex(df)
+    return index.lookup(media_url)
+
+
+def _is_post_link(href):
+    return (
+        "meinsvwissen" in href
+        and download_subpage not in href
+        and "uploads" not in href
+        and "download" not in href
+        and "?s" not in href
+        and "feedback_geben" not in href
+    )
+
+
+class PostAnalysis:
+    """Everything the pipeline reads from a post's Elementor HTML, from one parse of it.
+
+    A single walk over the DOM collects the elements each column is derived from; the
+    derived values are computed on first access and only search inside those elements.
+    """
+
+    def __init__(self, content):
+        self.icon_lists = []
+        self.toggle_items = []
+        self.buttons = []
+        self.icon_list_items = []
+        self.embeds = []
+        self.text_editors = []
+        self.download_widgets = []
+        # widgets outside of accordion contents, which process_widget handles itself
+        self.widgets = []
+
+        soup = parse_html(content)
+        stack = [(child, False) for child in reversed(soup.contents)]
+        while stack:
+            element, in_tab_content = stack.pop()
+            if not isinstance(element, Tag):
+                continue
+            classes = element.get("class") or ()
+            if classes:
+                self._collect(element, classes, in_tab_content)
+                in_tab_content = in_tab_content or "elementor-tab-content" in classes
+            stack.extend((child, in_tab_content) for child in reversed(element.contents))
+
+    def _collect(self, element, classes, in_tab_content):
+        if "elementor-icon-list-items" in classes:
+            self.icon_lists.append(element)
+        if "elementor-toggle-item" in classes:
+            self.toggle_items.append(element)
+        if "elementor-widget-button" in classes:
+            self.buttons.append(element)
+        if "elementor-icon-list-item" in classes:
+            self.icon_list_items.append(element)
+        if element.name == "div":
+            if " ".join(classes) == "wp-embed type-post":
+                self.embeds.append(element)
+            if "elementor-widget-text-editor" in classes:
+                self.text_editors.append(element)
+        if "elementor-widget-wpfd_choose_category" in classes:
+            self.download_widgets.append(element)
+        if "elementor-widget" in classes and not in_tab_content:
+            self.widgets.append(element)
+
+    @functools.cached_property
+    def download_chapters_further(self):
+        """Categories linked from icon lists and accordions (links to the download subpage)"""
         lst = []
-        soup = BeautifulSoup(row["content"], "html.parser")
-        list_item_widgets = soup.find_all(class_="elementor-icon-list-items")
-        for list_item_widget in list_item_widgets:
-            links = list_item_widget.find_all("a")
-            further_dl_links = [
-                a for a in links if a.has_attr("href") and download_subpage in a["href"]
-            ]
-            for link in further_dl_links:
-                second_numbers = int(re.search(category_pattern, link["href"]).group(1))
-                lst.append(second_numbers)
-        toggle_items = soup.find_all(class_="elementor-toggle-item")
-        for toggle_item in toggle_items:
-            links = toggle_item.find_all("a")
-            further_dl_links = [
-                a for a in links if a.has_attr("href") and download_subpage in a["href"]
-            ]
-            for link in further_dl_links:
-                second_numbers = int(re.search(category_pattern, link["href"]).group(1))
-                lst.append(second_numbers)
+        for container in self.icon_lists + self.toggle_items:
+            for link in container.find_all("a"):
+                if link.has_attr("href") and download_subpage in link["href"]:
+                    lst.append(int(re.search(category_pattern, link["href"]).group(1)))
         return lst
 
+    @functools.cached_property
+    def book_chapter(self):
+        """Link of the "Volltext" button, if any"""
+        buttons = [widget for widget in self.buttons if "volltext" in widget.get_text().lower()]
+        if len(buttons) == 0:
+            return None
+        if len(buttons) > 1:
+            raise ValueError("More than one button widget found")
+        return buttons[0].find("a")["href"]
+
+    @functools.cached_property
+    def related_links(self):
+        """Links to other posts, still to be resolved to post ids"""
+        to_check = []
+        # icon list links
+        for item in self.icon_list_items:
+            a = item.find("a", href=True)
+            href = a["href"] if a else ""
+            if _is_post_link(href):
+                to_check.append(href)
+        # embedded posts
+        for post in self.embeds:
+            to_check.append(EMBED_LINK.select_one(post)["href"])
+        # standalone text links
+        for widget in self.text_editors:
+            for a in widget.find_all("a", href=True):
+                if _is_post_link(a["href"]):
+                    to_check.append(a["href"])
+        return to_check
+
+    @functools.cached_property
+    def download_chapter_dedicated(self):
+        """Category of the first download widget that displays files"""
+        if not self.download_widgets:
+            return None
+        # if there seem to be multiple download sections, only consider the first one
+        firsta = DOWNLOAD_TREE.select_one(self.download_widgets[0])
+        # if there are file links displayed already, get the parent download category
+        if firsta:
+            if firsta.has_attr("data-category"):
+                return int(firsta["data-category"])
+            raise ValueError("No category found")
+        return None
+
+    def sections(self, post_title, post_id, logger):
+        sections = []
+        for widget in self.widgets:
+            result = process_widget(widget, post_title, post_id, logger)
+            if result:
+                if isinstance(result, list):
+                    sections.extend(result)
+                else:
+                    sections.append(result)
+        return sections
+
+
+def analyze_post(row, logger):
+    """All values parsed from one post, as plain data:
+    `download_chapters_further`, `book_chapter`, `related_links` (unresolved),
+    `download_chapter_dedicated` and the post's `sections`.
+    """
+    analysis = PostAnalysis(row["content"])
+    return {
+        "id": row["id"],
+        "download_chapters_further": analysis.download_chapters_further,
+        "book_chapter": analysis.book_chapter,
+        "related_links": analysis.related_links,
+        "download_chapter_dedicated": analysis.download_chapter_dedicated,
+        "sections": analysis.sections(row["title"], row["id"], logger),
+    }
+
+
+post_analysis_schema = {
+    "id": pl.Int64,
+    "download_chapters_further": pl.List(pl.Int32),
+    "book_chapter": pl.Utf8,
+    "related_links": pl.List(pl.Utf8),
+    "download_chapter_dedicated": pl.Int64,
+}
+
+
+def _init_worker(parser, transcript_index):
+    # worker processes are spawned and inherit neither the parser chosen at startup nor the
+    # transcript index, which would otherwise be loaded from the sheet again in every worker
+    set_parser(parser)
+    set_transcript_index(transcript_index)
+
+
+def _analyze_batch(rows, logger=None):
+    """Analyze a batch of posts, returns (worker name, results, wall seconds, cpu seconds)"""
+    logger = logger or logging.getLogger(__name__)
+    wall_start, cpu_start = time.perf_counter(), time.thread_time()
+    results = [analyze_post(row, logger) for row in rows]
+    worker = f"{multiprocessing.current_process().name}/{threading.current_thread().name}"
+    return worker, results, time.perf_counter() - wall_start, time.thread_time() - cpu_start
+
+
+def analyze_posts(df, logger, max_workers, mode=post_analysis_mode, batch_size=post_analysis_batch_size):
+    """Analyze all posts in batches of `batch_size`, returns (post columns frame, section records).
+
+    With mode "processes" the batches run in `max_workers` worker processes, so parsing uses
+    several cores; "threads" runs them in threads of this process. The rows per second of every
+    worker are recorded in the run report.
+    """
+    rows = list(df.select("id", "title", "content").iter_rows(named=True))
+    batches = [rows[i : i + batch_size] for i in range(0, len(rows), batch_size)]
+    if mode == "processes":
+        # spawn, since forking a process that runs other stages in threads is unsafe. The index is
+        # loaded here once, so its request is counted in this stage, and pickled to every worker.
+        executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(get_parser(), get_transcript_index()),
+        )
+        submit = lambda batch: executor.submit(_analyze_batch, batch)
+    elif mode == "threads":
+        executor = ContextThreadPoolExecutor(max_workers=max_workers)
+        submit = lambda batch: executor.submit(_analyze_batch, batch, logger)
+    else:
+        raise ValueError(f"Unknown post analysis mode: {mode}")
+
+    results = []
+    with executor:
+        for future in [submit(batch) for batch in batches]:
+            worker, batch_results, seconds, cpu_seconds = future.result()
+            results.extend(batch_results)
+            metrics.record_worker(worker, len(batch_results), seconds)
+            if mode == "processes":
+                metrics.add_cpu_time(cpu_seconds)
+    sections = [section for result in results for section in result.pop("sections")]
+    return pl.DataFrame(results, schema=post_analysis_schema), sections
+
+
+def extract_further_download_category_ids(df):
     df_ = df.with_columns(
         pl.struct("content", "title")
-        .map_elements(lambda row: func(row), return_dtype=pl.List(pl.Int32))
+        .map_elements(
+            lambda row: PostAnalysis(row["content"]).download_chapters_further, return_dtype=pl.List(pl.Int32)
+        )
         .alias("download_chapters_further")
     )
     return df_
 
 
 def extract_book_chapter_row(row):
-    soup = BeautifulSoup(row["content"], "html.parser")
-    buttom_widgets = soup.find_all(class_="elementor-widget-button")
-    buttom_widgets = [
-        widget for widget in buttom_widgets if "volltext" in widget.get_text().lower()
-    ]
-    if len(buttom_widgets) == 0:
-        return None
-    elif len(buttom_widgets) > 1:
-        raise ValueError("More than one button widget found")
-    else:
-        buttom_widgets = buttom_widgets[0]
-        link = buttom_widgets.find("a")["href"]
-        return link
+    return PostAnalysis(row["content"]).book_chapter
 
 
 def extract_book_chapter(df):
@@ -100,6 +300,7 @@ def extract_book_chapter(df):
 cache_lock = threading.Lock()
 post_id_cache = {}
 session = requests.Session()
+session.hooks["response"].append(track_response)
 
 
 def fetch_post_id(search_term):
@@ -134,7 +335,7 @@ def process_post_link(href, logger, max_retries=3):
 
             resp.raise_for_status()
 
-            soup = BeautifulSoup(resp.text, "html.parser")
+            soup = parse_html(resp.text)
             title_tag = soup.find("h1", class_="gb-headline")
             if not title_tag or not title_tag.text.strip():
                 raise ValueError("Missing or empty title")
@@ -163,6 +364,7 @@ def process_post_link(href, logger, max_retries=3):
 
         # Retry unless it's the last attempt
         if attempt < max_retries:
+            metrics.incr("http_retries")
             time.sleep(backoff)
             backoff *= 2
         else:
@@ -171,50 +373,23 @@ def process_post_link(href, logger, max_retries=3):
 
 
 def extract_related_posts_row(row, logger, max_workers):
-    lst = []
-    to_check = []
-    soup = BeautifulSoup(row["content"], "html.parser")
-
-    def check(href):
-        return (
-            "meinsvwissen" in href
-            and download_subpage not in href
-            and "uploads" not in href
-            and "download" not in href
-            and "?s" not in href
-            and "feedback_geben" not in href
-        )
-
-    # icon list links
-    for item in soup.find_all(class_="elementor-icon-list-item"):
-        a = item.find("a", href=True)
-        href = a["href"] if a else ""
+    return resolve_related_posts(row["id"], PostAnalysis(row["content"]).related_links, logger, max_workers)
 
-        if check(href):
-            to_check.append(href)
 
-    # embedded posts
-    for post in soup.find_all("div", class_="wp-embed type-post"):
-        href = post.find("a", class_="wp-embed-more")["href"]
-        to_check.append(href)
-
-    # standalone text links
-    for widget in soup.find_all("div", class_="elementor-widget-text-editor"):
-        for a in widget.find_all("a", href=True):
-            href = a["href"]
-            if check(href):
-                to_check.append(href)
+def resolve_related_posts(post_id, to_check, logger, max_workers):
+    """Post ids of the links found in a post, without the post itself"""
+    lst = []
     # resolve links in parallel, skipping 404s
-    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+    with ContextThreadPoolExecutor(max_workers=max_workers) as executor:
         futures = {
             executor.submit(process_post_link, href, logger): href for href in to_check
         }
         for future in concurrent.futures.as_completed(futures):
             href = futures[future]
             try:
-                post_id = future.result()
-                if post_id is not None:
-                    lst.append(post_id)
+                related_id = future.result()
+                if related_id is not None:
+                    lst.append(related_id)
 
             except requests.exceptions.HTTPError as e:
                 # this only fires for non-404 HTTP errors after retries
@@ -227,9 +402,9 @@ def extract_related_posts_row(row, logger, max_workers):
             except Exception as e:
                 logger.error(f"Error processing {href}: {e}")
                 raise
-    no_self = [x for x in lst if x != row["id"]]
+    no_self = [x for x in lst if x != post_id]
     if len(no_self) != len(lst):
-        logger.warning(f"Removed self-reference for post {row['id']}")
+        logger.warning(f"Removed self-reference for post {post_id}")
     return no_self
 
 
@@ -244,24 +419,40 @@ def extract_related_posts(df, logger, max_workers):
     )
 
 
-def extract_dedicated_download_chapter_id_row(row, root_node):
-    soup = BeautifulSoup(row["content"], "html.parser")
-    downloads = soup.find_all(class_="elementor-widget-wpfd_choose_category")
+def resolve_related_links(df, post_links, logger, api_url=wp_api_url):
+    """Replace the `related_links` of analyze_posts by the `related_posts` ids they point to.
+
+    Links are looked up in a PermalinkIndex of `post_links` (`id`, `link`, `slug` of all posts),
+    the remaining ones with batched slug queries to the WP API. Unknown links are skipped.
+    """
+    index = PermalinkIndex(post_links)
+    hrefs = {href for links in df["related_links"] if links is not None for href in links}
+    misses = {href for href in hrefs if index.lookup(href) is None}
+    metrics.incr("related_links_indexed", len(hrefs) - len(misses))
+    if misses:
+        logger.info(f"Looking up {len(misses)} of {len(hrefs)} related links in the WP API")
+        found = fetch_post_ids_by_slug((permalink_slug(href) for href in misses), session=session, api_url=api_url)
+        for slug, post_id in found.items():
+            index.add(slug, post_id)
+        for href in sorted(misses):
+            if index.lookup(href) is None:
+                logger.warning(f"No post found for related link {href}")
+
+    related_posts = []
+    for post_id, links in df.select("id", "related_links").iter_rows():
+        ids = [index.lookup(href) for href in links or []]
+        ids = [related_id for related_id in ids if related_id is not None]
+        no_self = [related_id for related_id in ids if related_id != post_id]
+        if len(no_self) != len(ids):
+            logger.warning(f"Removed self-reference for post {post_id}")
+        related_posts.append(no_self)
+    return df.with_columns(pl.Series("related_links", related_posts, dtype=pl.List(pl.Int32))).rename(
+        {"related_links": "related_posts"}
+    )
 
-    if len(downloads) == 0:
-        return None
-    if len(downloads) > 1:
-        # if there seem to be multiple download sections, only consider the first one
-        downloads = [downloads[0]]
-
-    firsta = downloads[0].find(class_="wpfd-content-tree")
-    # if there are file links displayed already, get the parent download category
-    if firsta:
-        if firsta.has_attr("data-category"):
-            category_id = firsta["data-category"]
-            return int(category_id)
-        else:
-            raise ValueError("No category found")
+
+def extract_dedicated_download_chapter_id_row(row, root_node):
+    return PostAnalysis(row["content"]).download_chapter_dedicated
     # if there are no file links displayed, get the parent download category from the download tree
     # else:
     #     firsta = downloads[0].find("a")
@@ -301,6 +492,9 @@ prezi_pattern = r"https://prezi.com/p/embed\/(.+?)(?:\/|$)"
 
 
 def get_prezi_transcript(url, logger):
+    from selenium import webdriver
+    from selenium.webdriver.common.by import By
+
     match = re.search(prezi_pattern, url)
     if not match:
         raise ValueError("Invalid Prezi URL")
@@ -314,6 +508,7 @@ def get_prezi_transcript(url, logger):
     driver = None
     driver = webdriver.Chrome(options=options)
     driver.get(prezi_url)
+    metrics.incr("selenium_page_loads")
     driver.implicitly_wait(4)
 
     if "Page not found" in driver.title:
@@ -321,16 +516,34 @@ def get_prezi_transcript(url, logger):
         return None
 
     transcript_div = driver.find_element(by=By.ID, value="transcript-full-text")
-    soup = BeautifulSoup(transcript_div.get_attribute("innerHTML"), "html.parser")
+    soup = parse_html(transcript_div.get_attribute("innerHTML"))
     text = str(soup)
     driver.quit()
     return text
 
 
+# compiled once instead of on every find() call
+TEXT_EDITOR = compile_selector(".elementor-widget-text-editor")
+TOGGLE_ITEM = compile_selector("div.elementor-toggle-item")
+TOGGLE_TITLE = compile_selector("a.elementor-toggle-title")
+TOGGLE_CONTENT = compile_selector("div.elementor-tab-content")
+HTMEGA_ACCORDION_ITEM = compile_selector("div.single_accourdion")
+HTMEGA_ACCORDION_TITLE = compile_selector(".htmega-accourdion-title")
+HTMEGA_ACCORDION_CONTENT = compile_selector("div.accordion-content")
+YOUTUBE_TITLE = compile_selector("a.ytp-title-link")
+QUIZ_MESSAGE = compile_selector(".qsm-before-message")
+H5P_IFRAME = compile_selector("iframe.h5p-iframe")
+FLIPBOX_FRONT = compile_selector(".front-container")
+FLIPBOX_BACK = compile_selector(".back-container")
+FLIPBOX_BUTTON = compile_selector(".flp-btn")
+EMBED_LINK = compile_selector("a.wp-embed-more")
+DOWNLOAD_TREE = compile_selector(".wpfd-content-tree")
+
+
 def process_widget(widget, post_title, post_id, logger):
     sections = []
     if "elementor-widget-text-editor" in widget["class"]:
-        if widget.find(class_="elementor-widget-text-editor"):
+        if TEXT_EDITOR.select_one(widget):
             return sections
         text = markdownify(str(widget)).replace("\n", "")
         logger.debug("Appending section type: plain_text")
@@ -349,27 +562,19 @@ def process_widget(widget, post_title, post_id, logger):
     ):
         logger.debug("Found accordion widget")
         if "elementor-widget-htmega-accordion-addons" in widget["class"]:
-            accordion_sections = widget.find_all("div", class_="single_accourdion")
+            accordion_sections = HTMEGA_ACCORDION_ITEM.select(widget)
             accordion_type = "htmega"
         else:
-            accordion_sections = widget.find_all("div", class_="elementor-toggle-item")
+            accordion_sections = TOGGLE_ITEM.select(widget)
             accordion_type = "elementor"
 
         for accordion_section in accordion_sections:
             if accordion_type == "elementor":
-                title = accordion_section.find(
-                    "a", class_="elementor-toggle-title"
-                ).get_text()
-                accordion_section_content = accordion_section.find(
-                    "div", class_="elementor-tab-content"
-                )
+                title = TOGGLE_TITLE.select_one(accordion_section).get_text()
+                accordion_section_content = TOGGLE_CONTENT.select_one(accordion_section)
             else:
-                title = accordion_section.find(
-                    class_="htmega-accourdion-title"
-                ).get_text()
-                accordion_section_content = accordion_section.find(
-                    "div", class_="accordion-content"
-                )
+                title = HTMEGA_ACCORDION_TITLE.select_one(accordion_section).get_text()
+                accordion_section_content = HTMEGA_ACCORDION_CONTENT.select_one(accordion_section)
 
             logger.debug(f"Accordion section title: {title}")
 
@@ -433,10 +638,8 @@ def process_widget(widget, post_title, post_id, logger):
                             external_link = iframe["src"]
                             if iframe.has_attr("title"):
                                 yt_title = iframe["title"]
-                            elif iframe.find("a", class_="ytp-title-link"):
-                                yt_title = iframe.find(
-                                    "a", class_="ytp-title-link"
-                                ).text
+                            elif YOUTUBE_TITLE.select_one(iframe):
+                                yt_title = YOUTUBE_TITLE.select_one(iframe).text
                             else:
                                 yt_title = None
                             logger.debug(
@@ -513,10 +716,8 @@ def process_widget(widget, post_title, post_id, logger):
                             }
                         )
 
-            if accordion_section_content.find(class_="qsm-before-message"):
-                quiz_message = accordion_section_content.find(
-                    class_="qsm-before-message"
-                ).get_text()
+            if QUIZ_MESSAGE.select_one(accordion_section_content):
+                quiz_message = QUIZ_MESSAGE.select_one(accordion_section_content).get_text()
                 logger.debug(
                     f"Appending section type: accordion_section_quiz for post '{post_title}' ({post_id}) and accordion section '{title}'"
                 )
@@ -535,8 +736,8 @@ def process_widget(widget, post_title, post_id, logger):
             return sections
     elif "elementor-widget-shortcode" in widget["class"]:
         logger.debug(f"Found shortcode widget for post '{post_title}' ({post_id})'")
-        if widget.find(class_="qsm-before-message"):
-            quiz_message = widget.find(class_="qsm-before-message").get_text()
+        if QUIZ_MESSAGE.select_one(widget):
+            quiz_message = QUIZ_MESSAGE.select_one(widget).get_text()
             logger.debug(
                 f"Appending section type: quiz for post '{post_title}' ({post_id})"
             )
@@ -562,7 +763,7 @@ def process_widget(widget, post_title, post_id, logger):
                     continue
                 elif iframe.has_attr("class"):
                     if "h5p-iframe" in iframe["class"]:
-                        iframe = widget.find("iframe", class_="h5p-iframe")
+                        iframe = H5P_IFRAME.select_one(widget)
                         logger.debug(
                             f"Appending section type: h5p for post '{post_title}' ({post_id})"
                         )
@@ -582,14 +783,14 @@ def process_widget(widget, post_title, post_id, logger):
             logger.warning(f"Unknown Shortcode {post_title}, {post_id}")
     elif "elementor-widget-htmega-flipbox-addons" in widget["class"]:
         ### Flipcard ###
-        front_text = widget.find(class_="front-container").get_text()
+        front_text = FLIPBOX_FRONT.select_one(widget).get_text()
 
-        back_text = widget.find(class_="back-container").get_text()
+        back_text = FLIPBOX_BACK.select_one(widget).get_text()
         section = {}
         section["text"] = front_text + "\n" + back_text
         section["type"] = "flipcard"
         section["title"] = front_text
-        if widget.find(class_="flp-btn"):
+        if FLIPBOX_BUTTON.select_one(widget):
             link = widget.find("a")["href"]
             section["external_link"] = link
         section["post_id"] = post_id
@@ -619,7 +820,7 @@ def process_widget(widget, post_title, post_id, logger):
             data_settings = json.loads(data_settings)
             video_type = data_settings["video_type"]
             if video_type == "youtube":
-                external_link = data_settings["youtube_url"].replace("\/", "/")
+                external_link = data_settings["youtube_url"].replace(r"\/", "/")
                 logger.debug(
                     f"Appending section type: youtube for post '{post_title}' ({post_id})'"
                 )
@@ -657,28 +858,8 @@ def process_widget(widget, post_title, post_id, logger):
         return None
 
 def extract_sections(row, logger):
-    jitter = random.uniform(0.5, 1.5)
-    time.sleep(jitter)
-    soup = BeautifulSoup(row["content"], "html.parser")
-    widgets = soup.find_all(class_="elementor-widget")
-    widgets = [
-        widget
-        for widget in widgets
-        if not widget.find_parent(class_="elementor-tab-content")
-    ]
-    sections = []
-    for widget in widgets:
-        result = process_widget(widget, row["title"], row["id"], logger)
-        if result:
-            if isinstance(result, list):
-                sections.extend(result)
-            else:
-                sections.append(result)
-
-    schema = SectionSchema.to_pydantic_model()
-    for section in sections:
-        schema.model_validate(section)
-    return sections
+    # validated as one frame by the caller (SectionSchema.check_frame)
+    return PostAnalysis(row["content"]).sections(row["title"], row["id"], logger)
 
 
 def process_posts_row(row, logger):
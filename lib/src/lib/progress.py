@@ -0,0 +1,41 @@
+import threading
+import contextlib
+from rich.progress import Progress, TimeRemainingColumn, BarColumn, TextColumn
+
+# A console can only show one live display at once (rich < 14.1 raises LiveError otherwise),
+# but the scheduler runs several scraping stages in parallel. All of them add their task to
+# one shared Progress, which is displayed while at least one task is open.
+
+_lock = threading.Lock()
+_progress = None
+_open_tasks = 0
+
+
+def _new_progress():
+    return Progress(
+        TextColumn("[progress.description]{task.description}"),
+        BarColumn(),
+        TextColumn("[progress.percentage]{task.percentage:>3.0f}%"),
+        TimeRemainingColumn(),
+    )
+
+
+@contextlib.contextmanager
+def progress_task(description, total):
+    """Show a task on the shared progress display, yields a function advancing it (by 1 by default)"""
+    global _progress, _open_tasks
+    with _lock:
+        if _progress is None:
+            _progress = _new_progress()
+            _progress.start()
+        _open_tasks += 1
+        progress = _progress
+        task = progress.add_task(description, total=total)
+    try:
+        yield lambda advance=1: progress.update(task, advance=advance)
+    finally:
+        with _lock:
+            _open_tasks -= 1
+            if _open_tasks == 0:
+                progress.stop()
+                _progress = None
@@ -2,31 +2,29 @@ import polars as pl
 import requests
 from typing import Any, Dict, List, Optional
 from lib.models import PublicationSchema
-import time
 import random
 import certifi
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
-
-schema = PublicationSchema.to_pydantic_model()
+from lib.metrics import HTTP_HOOKS, track_response
+from lib.rate_limit import limited_get
 
 
 def get_zotero_api_data(
     api_url: str = "https://api.zotero.org/groups/6066861/items", sample_k=-1
 ) -> List[Dict[str, Any]]:
     params = {"format": "json", "include": "csljson", "limit": 100}
-    resp = requests.get(api_url, params=params)
+    resp = requests.get(api_url, params=params, hooks=HTTP_HOOKS)
     resp.raise_for_status()
     jason = resp.json()
     if sample_k != -1:
         jason = random.choices(jason, k=sample_k)
     res = []
     for elem in jason:
-        time.sleep(random.uniform(0.25, 0.5))
         main = elem["csljson"]
         # <userOrGroupPrefix>/items/<itemKey>/tags
         url = f"https://api.zotero.org/groups/6066861/items/{elem['key']}/tags"
-        resp = requests.get(url, params=params)
+        resp = limited_get(url, params=params, hooks=HTTP_HOOKS)
         resp.raise_for_status()
         jason = resp.json()
         tags = [item["tag"] for item in jason]
@@ -61,6 +59,7 @@ def download_pdf(
     adapter = HTTPAdapter(max_retries=retry_strategy)
     session.mount("https://", adapter)
     session.mount("http://", adapter)
+    session.hooks["response"].append(track_response)
 
     try:
         response = session.get(
@@ -143,7 +142,5 @@ def convert_zotero_api_results(data, logger) -> pl.DataFrame:
             ]
 
         raw_records.append(rec)
-    validated = [schema.model_validate(r).model_dump() for r in raw_records]
 
-    df = pl.DataFrame(validated)
-    return df
+    return PublicationSchema.check_frame(pl.from_dicts(raw_records, infer_schema_length=None))
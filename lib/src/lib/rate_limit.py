@@ -0,0 +1,168 @@
+import time
+import threading
+import contextlib
+import email.utils
+import urllib.parse
+import requests
+from lib import metrics
+from lib.config import rate_limits
+
+# Shared per-host throttling for all scrapers. Every host gets a token bucket (`rate` requests
+# per second, bursts of up to `burst`) and an AIMD concurrency window: each healthy response
+# widens the window by 1/window (about +1 per window of requests), each 429/5xx or connection
+# error multiplies it by `decrease`. A Retry-After header pauses the host for that long.
+
+
+class HostLimiter:
+    def __init__(self, host, rate, burst, initial_window, max_window, min_window=1, decrease=0.5):
+        self.host = host
+        self.rate = rate
+        self.burst = burst
+        self.window = float(initial_window)
+        self.min_window = min_window
+        self.max_window = max_window
+        self.decrease = decrease
+        self.in_flight = 0
+        self._tokens = float(burst)
+        self._refilled_at = time.monotonic()
+        self._paused_until = 0.0
+        self._condition = threading.Condition()
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._refilled_at) * self.rate)
+        self._refilled_at = now
+
+    def acquire(self):
+        with self._condition:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                if now < self._paused_until:
+                    timeout = self._paused_until - now
+                elif self.in_flight >= int(self.window):
+                    # woken up by release
+                    timeout = None
+                elif self._tokens < 1:
+                    timeout = (1 - self._tokens) / self.rate
+                else:
+                    self._tokens -= 1
+                    self.in_flight += 1
+                    return
+                self._condition.wait(timeout)
+
+    def release(self):
+        with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    def on_success(self):
+        with self._condition:
+            self.window = min(self.max_window, self.window + 1 / self.window)
+            self._condition.notify_all()
+
+    def on_failure(self, retry_after=None):
+        metrics.incr("rate_limit_backoffs")
+        with self._condition:
+            self.window = max(self.min_window, self.window * self.decrease)
+            if retry_after:
+                self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+
+    def record(self, response):
+        """Adapt to a response: back off on 429 and 5xx (honoring Retry-After), speed up otherwise"""
+        if is_retryable(response.status_code):
+            self.on_failure(parse_retry_after(response.headers.get("Retry-After")))
+        else:
+            self.on_success()
+
+    @contextlib.contextmanager
+    def slot(self):
+        """Hold one request slot of the host. Call `record(response)` on the yielded recorder to
+        adapt to the response; without it, leaving the block counts as success and raising as failure.
+        """
+        self.acquire()
+        recorder = _Recorder(self)
+        try:
+            yield recorder
+        except Exception:
+            if not recorder.recorded:
+                self.on_failure()
+            raise
+        else:
+            if not recorder.recorded:
+                self.on_success()
+        finally:
+            self.release()
+
+
+class _Recorder:
+    def __init__(self, limiter):
+        self.limiter = limiter
+        self.recorded = False
+
+    def record(self, response):
+        self.recorded = True
+        self.limiter.record(response)
+
+
+def is_retryable(status):
+    """Responses telling the client to slow down or come back later"""
+    return status == 429 or status >= 500
+
+
+def parse_retry_after(value):
+    """Seconds to wait from a Retry-After header (delay in seconds or an HTTP date)"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, date.timestamp() - time.time())
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def _settings_for(host):
+    # the most specific configured domain the host belongs to, e.g. www.svtipps.de -> svtipps.de
+    parts = host.split(".")
+    for i in range(len(parts)):
+        domain = ".".join(parts[i:])
+        if domain in rate_limits:
+            return rate_limits[domain]
+    return rate_limits["default"]
+
+
+def limiter_for(url) -> HostLimiter:
+    """The limiter shared by all requests to the host of `url`"""
+    host = urllib.parse.urlsplit(url).hostname or ""
+    with _limiters_lock:
+        if host not in _limiters:
+            _limiters[host] = HostLimiter(host, **_settings_for(host))
+        return _limiters[host]
+
+
+def limited_get(url, session=None, max_retries=3, retry_delay=1, **kwargs):
+    """requests.get (or session.get) through the host's limiter. For streamed bodies hold
+    `limiter_for(url).slot()` until the body is read instead.
+
+    429 and 5xx responses are retried up to `max_retries` attempts in total. The limiter pauses
+    the host for a Retry-After; without one, the delay doubles with every attempt. The last
+    response is returned either way.
+    """
+    limiter = limiter_for(url)
+    for attempt in range(max_retries):
+        with limiter.slot() as slot:
+            response = (session or requests).get(url, **kwargs)
+            slot.record(response)
+        if not is_retryable(response.status_code) or attempt == max_retries - 1:
+            return response
+        metrics.incr("http_retries")
+        response.close()
+        if not response.headers.get("Retry-After"):
+            time.sleep(retry_delay * 2**attempt)
@@ -0,0 +1,370 @@
+import io
+import time
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from lib import metrics
+from lib.metrics import ContextThreadPoolExecutor
+from lib.config import s3_part_size_mb, s3_upload_concurrency, s3_background_uploads, s3_max_bytes_in_flight_mb
+
+# S3 rejects multipart parts smaller than this, except for the last one
+MIN_PART_SIZE = 5 * 1024**2
+
+# user metadata key (x-amz-meta-fingerprint) holding the content fingerprint of an object
+FINGERPRINT_METADATA_KEY = "fingerprint"
+
+# rows hashed at once when fingerprinting, bounds the memory of the reordered copy
+FINGERPRINT_BATCH_ROWS = 1024
+
+
+class S3MultipartWriter(io.RawIOBase):
+    """Write-only file object that streams its content into a multipart S3 upload.
+
+    Every `part_size` bytes are uploaded as one part, with up to `max_concurrency` parts in
+    flight; writes block while that many are pending, so at most about
+    `(max_concurrency + 1) * part_size` bytes are buffered. Objects smaller than one part are
+    sent with a single put_object instead. `extra_args` (e.g. ACL, Metadata) are passed to
+    create_multipart_upload or put_object. Use as a context manager: the upload is completed
+    on exit and aborted if an exception is raised.
+    """
+
+    def __init__(
+        self,
+        client,
+        bucket,
+        key,
+        extra_args=None,
+        part_size=s3_part_size_mb * 1024**2,
+        max_concurrency=s3_upload_concurrency,
+    ):
+        super().__init__()
+        if part_size < MIN_PART_SIZE:
+            raise ValueError(f"part_size must be at least {MIN_PART_SIZE} bytes")
+        self.client = client
+        self.bucket = bucket
+        self.key = key
+        self.extra_args = extra_args or {}
+        self.part_size = part_size
+        self.upload_id = None
+        self._buffer = bytearray()
+        self._position = 0
+        self._futures = []
+        self._slots = threading.Semaphore(max_concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency)
+
+    def writable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def write(self, data):
+        with memoryview(data) as view:
+            n_bytes = view.nbytes
+            self._buffer += view
+        self._position += n_bytes
+        while len(self._buffer) >= self.part_size:
+            self._submit_part(bytes(self._buffer[: self.part_size]))
+            del self._buffer[: self.part_size]
+        return n_bytes
+
+    def _submit_part(self, body):
+        if self.upload_id is None:
+            response = self.client.create_multipart_upload(
+                Bucket=self.bucket, Key=self.key, **self.extra_args
+            )
+            self.upload_id = response["UploadId"]
+        part_number = len(self._futures) + 1
+        self._slots.acquire()
+        # stop writing at the first failed part, the caller's exception aborts the upload
+        for future in self._futures:
+            if future.done() and future.exception() is not None:
+                self._slots.release()
+                raise future.exception()
+        self._futures.append(self._executor.submit(self._upload_part, part_number, body))
+
+    def _upload_part(self, part_number, body):
+        try:
+            response = self.client.upload_part(
+                Bucket=self.bucket,
+                Key=self.key,
+                UploadId=self.upload_id,
+                PartNumber=part_number,
+                Body=body,
+            )
+            return {"PartNumber": part_number, "ETag": response["ETag"]}
+        finally:
+            self._slots.release()
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            if self.upload_id is None:
+                self.client.put_object(
+                    Bucket=self.bucket, Key=self.key, Body=bytes(self._buffer), **self.extra_args
+                )
+            else:
+                if self._buffer:
+                    self._submit_part(bytes(self._buffer))
+                parts = [future.result() for future in self._futures]
+                self.client.complete_multipart_upload(
+                    Bucket=self.bucket,
+                    Key=self.key,
+                    UploadId=self.upload_id,
+                    MultipartUpload={"Parts": parts},
+                )
+            self._buffer = bytearray()
+            metrics.incr("s3_bytes_uploaded", self._position)
+        except BaseException:
+            # a failed part or completion must not leave an incomplete (billed) upload behind
+            self.abort()
+            raise
+        finally:
+            self._executor.shutdown()
+            super().close()
+
+    def abort(self):
+        self._executor.shutdown(cancel_futures=True)
+        if self.upload_id is not None:
+            self.client.abort_multipart_upload(
+                Bucket=self.bucket, Key=self.key, UploadId=self.upload_id
+            )
+        self._buffer = bytearray()
+        super().close()
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.abort()
+        else:
+            self.close()
+
+
+def conform_to_schema(table: pa.Table, schema: pa.Schema, table_name, logger=None) -> pa.Table:
+    """Select and cast the schema's columns, skipping both copies when the table already matches."""
+    df_columns = set(table.column_names)
+    schema_columns = set(schema.names)
+
+    missing_in_df = schema_columns - df_columns
+    extra_in_df = df_columns - schema_columns
+
+    if missing_in_df:
+        raise ValueError(f"DataFrame missing required schema fields for {table_name}: {missing_in_df}")
+    if extra_in_df and logger:
+        logger.warning(f"Extra fields in DataFrame for {table_name}: {extra_in_df}")
+
+    if table.column_names != schema.names:
+        table = table.select(schema.names)
+    if not table.schema.equals(schema):
+        table = table.cast(schema)
+    return table
+
+
+class _HashingSink(io.RawIOBase):
+    def __init__(self):
+        super().__init__()
+        self.hash = hashlib.sha256()
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        with memoryview(data) as view:
+            self.hash.update(view)
+            return view.nbytes
+
+
+def table_fingerprint(table: pa.Table, sort_keys=(), salt="") -> str:
+    """Stable sha256 over the schema and column data of a table, independent of row order.
+
+    Rows are ordered by `sort_keys` (stable, so rows with equal keys keep their relative
+    order) and streamed in fixed-size batches through the Arrow IPC format into the hash.
+    `salt` is mixed in, e.g. to change the fingerprint when the parquet layout changes.
+    """
+    indices = None
+    if sort_keys:
+        # dictionary (enum) columns can not be sorted directly
+        key_columns = {
+            key: table[key].cast(table[key].type.value_type)
+            if pa.types.is_dictionary(table[key].type)
+            else table[key]
+            for key in sort_keys
+        }
+        indices = pc.sort_indices(
+            pa.table(key_columns), sort_keys=[(key, "ascending") for key in sort_keys]
+        )
+
+    sink = _HashingSink()
+    sink.hash.update(salt.encode("utf-8"))
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        for start in range(0, table.num_rows, FINGERPRINT_BATCH_ROWS):
+            if indices is None:
+                batch = table.slice(start, FINGERPRINT_BATCH_ROWS)
+            else:
+                batch = table.take(indices[start : start + FINGERPRINT_BATCH_ROWS])
+            writer.write_table(batch.combine_chunks())
+    return sink.hash.hexdigest()
+
+
+def remote_fingerprint(client, bucket, key):
+    """Fingerprint stored with an S3 object, None if the object or the metadata does not exist."""
+    from botocore.exceptions import ClientError
+
+    try:
+        response = client.head_object(Bucket=bucket, Key=key)
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+            return None
+        raise
+    return response.get("Metadata", {}).get(FINGERPRINT_METADATA_KEY)
+
+
+def _with_fingerprint(extra_args, fingerprint):
+    extra_args = dict(extra_args or {})
+    extra_args["Metadata"] = {**extra_args.get("Metadata", {}), FINGERPRINT_METADATA_KEY: fingerprint}
+    return extra_args
+
+
+def is_unchanged(client, bucket, key, fingerprint, logger=None):
+    if remote_fingerprint(client, bucket, key) == fingerprint:
+        if logger:
+            logger.info(f"{key} is unchanged, skipping upload")
+        metrics.incr("s3_uploads_skipped")
+        return True
+    return False
+
+
+def upload_bytes(client, body: bytes, bucket, key, extra_args=None, skip_unchanged=True, logger=None):
+    """Upload a small object, skipping it if the remote copy has the same sha256.
+
+    Returns the number of bytes uploaded, 0 if the upload was skipped.
+    """
+    fingerprint = hashlib.sha256(body).hexdigest()
+    if skip_unchanged and is_unchanged(client, bucket, key, fingerprint, logger):
+        return 0
+    client.put_object(Bucket=bucket, Key=key, Body=body, **_with_fingerprint(extra_args, fingerprint))
+    metrics.incr("s3_bytes_uploaded", len(body))
+    return len(body)
+
+
+def upload_table(
+    client,
+    table: pa.Table,
+    bucket,
+    key,
+    extra_args=None,
+    part_size=s3_part_size_mb * 1024**2,
+    max_concurrency=s3_upload_concurrency,
+    sort_keys=(),
+    skip_unchanged=True,
+    logger=None,
+    **write_options,
+):
+    """Write a table as parquet straight into S3, row group by row group, without a local file.
+
+    The table's fingerprint is stored as object metadata. With `skip_unchanged`, the upload is
+    skipped when the remote object already carries the same fingerprint. Returns the number of
+    bytes uploaded, 0 if the upload was skipped.
+    """
+    fingerprint = table_fingerprint(table, sort_keys, salt=repr(sorted(write_options.items())))
+    if skip_unchanged and is_unchanged(client, bucket, key, fingerprint, logger):
+        return 0
+    extra_args = _with_fingerprint(extra_args, fingerprint)
+    with S3MultipartWriter(
+        client, bucket, key, extra_args, part_size=part_size, max_concurrency=max_concurrency
+    ) as sink:
+        pq.write_table(table, sink, **write_options)
+    return sink.tell()
+
+
+class BackgroundUploader:
+    """Runs uploads in background threads so stages can hand off their results and move on.
+
+    `submit` blocks while the objects already queued or uploading hold more than
+    `max_bytes_in_flight` bytes (an object larger than that is still accepted once nothing else
+    is in flight), which bounds the memory kept alive by pending uploads. Uploads count towards
+    the stage that submitted them. `wait` blocks until all uploads finished and re-raises the
+    first error; the names of the stages whose uploads failed are collected in `failed_stages`.
+    The size, duration and throughput of every upload is kept in `transfers` and recorded in
+    the `RunReport`, if one is given.
+    """
+
+    def __init__(
+        self,
+        max_workers=s3_background_uploads,
+        max_bytes_in_flight=s3_max_bytes_in_flight_mb * 1024**2,
+        logger=None,
+        report=None,
+    ):
+        self.max_bytes_in_flight = max_bytes_in_flight
+        self.logger = logger
+        self.report = report
+        self.transfers = []
+        self.failed_stages = set()
+        self._bytes_in_flight = 0
+        self._futures = []
+        self._condition = threading.Condition()
+        self._executor = ContextThreadPoolExecutor(max_workers=max_workers)
+
+    def submit(self, key, n_bytes, fn, *args, **kwargs):
+        """Queue `fn(*args, **kwargs)`, which uploads `key` and returns the bytes it sent.
+
+        `n_bytes` is the memory held by the arguments until the upload is done.
+        """
+        with self._condition:
+            self._condition.wait_for(
+                lambda: self._bytes_in_flight == 0
+                or self._bytes_in_flight + n_bytes <= self.max_bytes_in_flight
+            )
+            self._bytes_in_flight += n_bytes
+            stage = metrics.current_stage()
+            future = self._executor.submit(self._run, key, n_bytes, fn, args, kwargs)
+            self._futures.append((future, stage.name if stage is not None else None))
+
+    def _run(self, key, n_bytes, fn, args, kwargs):
+        start = time.perf_counter()
+        try:
+            uploaded = fn(*args, **kwargs)
+        except Exception as e:
+            if self.logger:
+                self.logger.error(f"Upload of {key} failed: {e}")
+            raise
+        finally:
+            with self._condition:
+                self._bytes_in_flight -= n_bytes
+                self._condition.notify_all()
+        seconds = time.perf_counter() - start
+        transfer = {
+            "key": key,
+            "bytes": uploaded,
+            "seconds": round(seconds, 3),
+            "mb_per_s": round(uploaded / 1024**2 / seconds, 2) if uploaded and seconds else 0.0,
+        }
+        with self._condition:
+            self.transfers.append(transfer)
+        if self.report is not None:
+            self.report.record_upload(transfer)
+        if self.logger and uploaded:
+            self.logger.info(
+                f"Uploaded {key} to S3 ({uploaded / 1024**2:.1f} MB in {seconds:.1f}s, {transfer['mb_per_s']} MB/s)"
+            )
+        return transfer
+
+    def wait(self):
+        errors = []
+        for future, stage_name in self._futures:
+            try:
+                future.result()
+            except Exception as e:
+                errors.append(e)
+                if stage_name is not None:
+                    self.failed_stages.add(stage_name)
+        self._futures = []
+        if errors:
+            raise errors[0]
+
+    def shutdown(self):
+        self._executor.shutdown()
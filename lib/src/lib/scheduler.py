@@ -0,0 +1,182 @@
+import contextlib
+import threading
+import concurrent.futures
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+
+
+class Stage:
+    """A pipeline step with named input and output artifacts.
+
+    `func` is called with one keyword argument per input artifact. It returns the value of
+    its single output, a tuple if it has several outputs, or nothing if it has none.
+    `workers` is the number of threads, processes or concurrent requests the stage uses
+    internally and is charged against the scheduler's worker budget while the stage runs.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        func: Callable[..., Any],
+        inputs: Sequence[str] = (),
+        outputs: Sequence[str] = (),
+        workers: int = 1,
+    ):
+        self.name = name
+        self.func = func
+        self.inputs = tuple(inputs)
+        self.outputs = tuple(outputs)
+        self.workers = workers
+
+    def __repr__(self):
+        return f"Stage(name='{self.name}', inputs={self.inputs}, outputs={self.outputs})"
+
+
+def resolve_dependencies(stages: Iterable[Stage]) -> Dict[str, List[str]]:
+    """Map every stage name to the names of the stages producing its inputs."""
+    stages = list(stages)
+    producers = {}
+    for stage in stages:
+        for output in stage.outputs:
+            if output in producers:
+                raise ValueError(
+                    f"Artifact '{output}' is produced by both '{producers[output]}' and '{stage.name}'"
+                )
+            producers[output] = stage.name
+
+    dependencies = {}
+    for stage in stages:
+        missing = [i for i in stage.inputs if i not in producers]
+        if missing:
+            raise ValueError(f"No stage produces inputs {missing} of '{stage.name}'")
+        dependencies[stage.name] = sorted({producers[i] for i in stage.inputs})
+    return dependencies
+
+
+def select_stages(stages: Sequence[Stage], names: Iterable[str]) -> List[Stage]:
+    """Return the named stages plus every stage they transitively depend on, in declaration order."""
+    dependencies = resolve_dependencies(stages)
+    selected = set()
+    todo = list(names)
+    while todo:
+        name = todo.pop()
+        if name in selected:
+            continue
+        if name not in dependencies:
+            raise ValueError(f"Unknown stage: {name}")
+        selected.add(name)
+        todo.extend(dependencies[name])
+    return [stage for stage in stages if stage.name in selected]
+
+
+def run_stages(
+    stages: Sequence[Stage],
+    worker_budget: int,
+    logger=None,
+    checkpoints=None,
+    report=None,
+) -> Dict[str, Any]:
+    """Run stages as soon as their inputs exist, in parallel, without exceeding the worker budget.
+
+    A stage that needs more workers than the whole budget is run once nothing else is running.
+    If a stage fails, no further stages are started, running ones are awaited and the first
+    error is re-raised. Returns all produced artifacts by name.
+
+    With a `CheckpointStore`, the outputs of every finished stage are persisted, and stages the
+    store already marks as completed are skipped; their outputs are loaded from the store.
+    With a `RunReport`, the performance numbers of every stage are recorded in it.
+    """
+    stages = list(stages)
+    dependencies = resolve_dependencies(stages)
+    by_name = {stage.name: stage for stage in stages}
+
+    artifacts: Dict[str, Any] = {}
+    done = set()
+    if checkpoints is not None:
+        done = {stage.name for stage in stages if checkpoints.is_completed(stage.name)}
+        needed = {i for stage in stages if stage.name not in done for i in stage.inputs}
+        for name in done:
+            if logger:
+                logger.info(f"[yellow]⏭️ Resuming from checkpoint: {name}", extra={"markup": True})
+            for output in by_name[name].outputs:
+                if output in needed:
+                    artifacts[output] = checkpoints.load(output)
+    pending = [stage.name for stage in stages if stage.name not in done]
+    running: Dict[concurrent.futures.Future, Stage] = {}
+    free = worker_budget
+    error: Optional[BaseException] = None
+    lock = threading.Lock()
+    total = len(pending)
+    started = 0
+
+    def cost(stage):
+        return min(max(stage.workers, 1), worker_budget)
+
+    def call(stage):
+        with lock:
+            kwargs = {name: artifacts[name] for name in stage.inputs}
+        tracking = report.track(stage.name) if report is not None else contextlib.nullcontext()
+        with tracking as metrics:
+            result = stage.func(**kwargs)
+            if len(stage.outputs) == 0:
+                outputs = {}
+            elif len(stage.outputs) == 1:
+                outputs = {stage.outputs[0]: result}
+            else:
+                outputs = dict(zip(stage.outputs, result, strict=True))
+            if metrics is not None:
+                # rows of the primary (first) output, the length of every output is listed separately
+                sized = {name: len(v) for name, v in outputs.items() if hasattr(v, "__len__")}
+                metrics.rows = sized.get(stage.outputs[0]) if stage.outputs else None
+                if len(outputs) > 1:
+                    metrics.output_rows = sized
+        if checkpoints is not None:
+            checkpoints.save_stage(stage.name, outputs)
+        return outputs
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(total, 1)) as executor:
+        while pending or running:
+            if error is None:
+                for name in list(pending):
+                    stage = by_name[name]
+                    if not all(dep in done for dep in dependencies[name]):
+                        continue
+                    if cost(stage) > free:
+                        continue
+                    pending.remove(name)
+                    free -= cost(stage)
+                    started += 1
+                    if logger:
+                        logger.info(
+                            f"[bold blue]🏭 Pipeline Stage {started}/{total}: {name}",
+                            extra={"markup": True},
+                        )
+                    running[executor.submit(call, stage)] = stage
+            elif not running:
+                break
+
+            if not running:
+                raise RuntimeError(f"Stages {pending} can not be scheduled")
+
+            finished, _ = concurrent.futures.wait(
+                running, return_when=concurrent.futures.FIRST_COMPLETED
+            )
+            for future in finished:
+                stage = running.pop(future)
+                free += cost(stage)
+                try:
+                    outputs = future.result()
+                except BaseException as e:
+                    if logger:
+                        logger.error(f"Stage {stage.name} failed: {e}")
+                    if error is None:
+                        error = e
+                    continue
+                with lock:
+                    artifacts.update(outputs)
+                done.add(stage.name)
+                if logger:
+                    logger.info(f"Finished stage {stage.name}")
+
+    if error is not None:
+        raise error
+    return artifacts
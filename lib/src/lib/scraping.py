@@ -1,95 +1,275 @@
 from lib.tree_functions import find_node_by_id
 import requests
-from rich.progress import Progress, TimeRemainingColumn, BarColumn, TextColumn
+from lib.progress import progress_task
 import concurrent.futures
 import polars as pl
-from selenium import webdriver
 import json
-from selenium.webdriver.common.by import By
 from bs4 import BeautifulSoup
+from lib.html_parsing import parse_html
 import time
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from lib.llm_parsers import make_termparser
+from concurrent.futures import as_completed
 import random
-from lib.config import valid_jurisdictions
-import dspy
+import threading
+import logging
+from lib.config import valid_jurisdictions, download_chunk_kb, download_backend, download_base_url, reuse_browser_sessions, listing_backend
+from lib.spool import FileSpool
+from lib.validators import conditional_headers
+from lib.rate_limit import limiter_for, limited_get, is_retryable
 from lib.models import SCCSchema, SVTippsSchema
 from html_sanitizer import Sanitizer
+from lib import metrics
+from lib.metrics import ContextThreadPoolExecutor, HTTP_HOOKS
+
+log = logging.getLogger("rich")
+
+
+def file_type_from_content_type(content_type):
+    if content_type:
+        # stream can be odt
+        return content_type.split("/")[-1]
+    return "unknown"
+
+
+def _spool_response(response, url, spool, known, validators):
+    """(is_valid, file_type, SpooledFile) of a final download response"""
+    if response.status_code == 304 and known is not None:
+        metrics.incr("http_not_modified")
+        return True, known["file_type"], spool.get(known["sha256"])
+    if response.status_code != 200:
+        return False, "unknown", None
+    file_type = file_type_from_content_type(response.headers.get("Content-Type", ""))
+    spooled = spool.write_chunks(response.iter_content(chunk_size=download_chunk_kb * 1024))
+    if validators is not None:
+        validators.put(
+            url,
+            response.headers.get("ETag"),
+            response.headers.get("Last-Modified"),
+            file_type,
+            spooled.sha256,
+            spooled.size,
+        )
+    return True, file_type, spooled
+
+
+def download_file(url, spool, max_retries=5, retry_delay=3, validators=None):
+    """Stream a file into the spool chunk by chunk, returns (is_valid, file_type, SpooledFile)
+
+    With a ValidatorStore, the request is conditional if the file of an earlier download is still
+    in the spool; on 304 Not Modified that file is returned without downloading it again.
+    429 and 5xx responses are retried like connection errors.
+    """
+    known = validators.get(url) if validators is not None else None
+    if known is not None and not spool.has(known["sha256"]):
+        known = None
+    headers = conditional_headers(known) if known is not None else {}
 
-
-def download_file_binary(url, max_retries=5, retry_delay=3):
-    jitter = random.uniform(2, 4)
-    time.sleep(jitter)
     for attempt in range(max_retries):
         try:
-            response = requests.get(url, allow_redirects=True, timeout=60, stream=True)
-            if response.status_code == 200:
-                content_type = response.headers.get("Content-Type", "")
-                if content_type:
-                    # stream can be odt
-                    file_type = content_type.split("/")[-1]
-                else:
-                    file_type = "unknown"
-                return True, file_type, response.content
-            else:
-                return False, "unknown", None
+            # the slot is held until the body is in the spool
+            with limiter_for(url).slot() as slot, requests.get(
+                url, allow_redirects=True, timeout=60, stream=True, headers=headers, hooks=HTTP_HOOKS
+            ) as response:
+                slot.record(response)
+                if not is_retryable(response.status_code) or attempt == max_retries - 1:
+                    return _spool_response(response, url, spool, known, validators)
+                retry_after = response.headers.get("Retry-After")
         except requests.RequestException:
             if attempt < max_retries - 1:
+                metrics.incr("http_retries")
                 time.sleep(retry_delay * (attempt + 1))
                 continue
             else:
                 return False, "unknown", None
+        # 429 or 5xx: the limiter has backed off and pauses the host for a Retry-After
+        metrics.incr("http_retries")
+        if not retry_after:
+            time.sleep(retry_delay * (attempt + 1))
 
 
-def process_link(link, root_node):
+def download_file_binary(url, max_retries=5, retry_delay=3):
+    """Download a file into memory, returns (is_valid, file_type, bytes)"""
+    spool = FileSpool()
+    is_valid, file_type, spooled = download_file(url, spool, max_retries, retry_delay)
+    if not is_valid:
+        return False, file_type, None
+    return True, file_type, spool.read(spooled.sha256)
+
+
+def link_info(link, root_node, base_url=download_base_url):
+    """Everything about a file link that is known before downloading it"""
     category_id = int(link.get("data-category_id", 0))
     data_id = int(link.get("data-id", 0))
-    title = link.get("title", "")
-    category_title = find_node_by_id(root_node, str(category_id)).name
-    download_link = f"https://meinsvwissen.de/download/{category_id}/cat-id/{data_id}/data-id".lower()
-
-    is_valid, file_type, file_binary = download_file_binary(download_link)
-
-    if is_valid:
-        return {
-            "data_id": data_id,
-            "data_category_id": category_id,
-            "title": title,
-            "category_title": category_title,
-            "download_link": download_link,
-            "file_type": file_type,
-            "file_binary": file_binary,
-        }
-    else:
-        raise Exception(f"Invalid link: {download_link}")
+    return {
+        "data_id": data_id,
+        "data_category_id": category_id,
+        "title": link.get("title", ""),
+        "category_title": find_node_by_id(root_node, str(category_id)).name,
+        "download_link": f"{base_url}/download/{category_id}/cat-id/{data_id}/data-id".lower(),
+    }
+
+
+def download_record(info, is_valid, file_type, spooled):
+    if not is_valid:
+        raise Exception(f"Invalid link: {info['download_link']}")
+    return {
+        **info,
+        "file_type": file_type,
+        "file_sha256": spooled.sha256,
+        "file_size": spooled.size,
+    }
+
+
+def process_link(link, root_node, spool, validators=None, base_url=download_base_url):
+    info = link_info(link, root_node, base_url)
+    is_valid, file_type, spooled = download_file(info["download_link"], spool, validators=validators)
+    return download_record(info, is_valid, file_type, spooled)
+
+
+def extract_download_info(
+    lst, root_node, max_workers=4, spool=None, validators=None, backend=download_backend, base_url=download_base_url
+):
+    """Download all files into the spool (a temporary one by default).
+
+    With a ValidatorStore, files that are unchanged since an earlier run are taken from the spool.
+    `backend` is "threads" (`max_workers` threads) or "asyncio" (lib.async_download, one pooled
+    keep-alive connection per concurrent download, `async_download_concurrency` at once).
+
+    The returned frame has `file_sha256` and `file_size` instead of the file binaries, which are
+    loaded with `lib.spool.load_spooled_binaries` when the table is written.
+    """
+    if backend not in ("threads", "asyncio"):
+        raise ValueError(f"Unknown download backend: {backend}")
+    spool = spool or FileSpool()
+    data = []
 
+    with progress_task("Extracting download info...", total=len(lst)) as advance:
 
-def extract_download_info(lst, root_node, max_workers=4):
-    data = []
+        if backend == "asyncio":
+            # aiohttp is only imported when this backend is used
+            from lib.async_download import download_links
 
-    with Progress(
-        TextColumn("[progress.description]{task.description}"),
-        BarColumn(),
-        TextColumn("[progress.percentage]{task.percentage:>3.0f}%"),
-        TimeRemainingColumn(),
-    ) as progress:
-        task = progress.add_task("Extracting download info...", total=len(lst))
+            data = download_links(
+                lst,
+                root_node,
+                spool,
+                validators=validators,
+                base_url=base_url,
+                on_done=advance,
+            )
+            return pl.DataFrame(data)
 
-        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        with ContextThreadPoolExecutor(max_workers=max_workers) as executor:
             future_to_link = {
-                executor.submit(process_link, link, root_node): link for link in lst
+                executor.submit(process_link, link, root_node, spool, validators, base_url): link for link in lst
             }
 
             for future in concurrent.futures.as_completed(future_to_link):
                 result = future.result()
                 data.append(result)
-                progress.update(task, advance=1)
+                advance()
 
     df = pl.DataFrame(data)
     return df
 
 
-def get_download_soup(wp_user, wp_pw, max_retries=3):
+class WPFDClient:
+    """Reads the category tree and file lists of the WP File Download plugin over plain HTTP.
+
+    `login` opens a cookie session in wp-admin, which is needed for the category tree only;
+    the file lists come from the plugin's public AJAX endpoint, the same one the archive page
+    calls when a category is opened. The session is shared by all threads.
+    """
+
+    def __init__(self, base_url=download_base_url, session=None):
+        self.base_url = base_url
+        self.session = session or requests.Session()
+        self.session.hooks["response"].append(HTTP_HOOKS["response"])
+
+    def login(self, wp_user, wp_pw):
+        # wp-login.php refuses logins without its test cookie
+        self.session.cookies.set("wordpress_test_cookie", "WP Cookie check")
+        response = self.session.post(
+            f"{self.base_url}/wp-login.php",
+            data={
+                "log": wp_user,
+                "pwd": wp_pw,
+                "wp-submit": "Log In",
+                "redirect_to": f"{self.base_url}/wp-admin/",
+                "testcookie": "1",
+            },
+            timeout=60,
+        )
+        response.raise_for_status()
+        if not any(name.startswith("wordpress_logged_in") for name in self.session.cookies.keys()):
+            raise Exception("WordPress login failed")
+
+    def category_soup(self):
+        """The `#categorieslist` of the plugin's admin page, like get_download_soup"""
+        response = limited_get(f"{self.base_url}/wp-admin/admin.php?page=wpfd", session=self.session, timeout=60)
+        response.raise_for_status()
+        categories = parse_html(response.text).find(id="categorieslist")
+        if categories is None:
+            raise Exception("No #categorieslist on the WP File Download admin page")
+        # build_category_tree reads the top-level items, lxml would wrap them in <html><body>
+        return BeautifulSoup(categories.decode_contents(), "html.parser")
+
+    def file_links(self, category_id):
+        """`a.wpfd-file-link` elements with the attributes the archive page renders for the files"""
+        response = limited_get(
+            f"{self.base_url}/wp-admin/admin-ajax.php",
+            session=self.session,
+            params={
+                "juwpfisadmin": "false",
+                "action": "wpfd",
+                "task": "files.display",
+                "view": "files",
+                "id": category_id,
+                "rootcat": "36",
+            },
+            timeout=60,
+        )
+        response.raise_for_status()
+        payload = response.json()
+        # anything but a list of files must not be taken for an empty category
+        if not isinstance(payload, dict) or payload.get("success") is False or not isinstance(payload.get("files"), list):
+            raise Exception(f"Unexpected file list of category {category_id}: {str(payload)[:200]}")
+        soup = BeautifulSoup("", "html.parser")
+        links = []
+        for file in payload["files"]:
+            link = soup.new_tag(
+                "a",
+                attrs={
+                    "class": "wpfd-file-link",
+                    "data-category_id": str(file.get("catid", category_id)),
+                    "data-id": str(file.get("ID", file.get("id"))),
+                    "title": file.get("post_title", file.get("title", "")),
+                    "href": file.get("linkdownload", ""),
+                },
+            )
+            links.append(link)
+        return links
+
+
+def get_download_soup(wp_user, wp_pw, max_retries=3, backend=listing_backend, base_url=download_base_url):
+    """Nested html list of all download categories, read over HTTP or with selenium.
+
+    The "http" backend falls back to selenium if the login or the admin page fails.
+    """
+    if backend == "http":
+        try:
+            client = WPFDClient(base_url)
+            client.login(wp_user, wp_pw)
+            return client.category_soup()
+        except Exception as e:
+            log.warning(f"HTTP category listing failed ({e}), falling back to selenium")
+            metrics.incr("listing_fallbacks")
+    return _selenium_download_soup(wp_user, wp_pw, max_retries)
+
+
+def _selenium_download_soup(wp_user, wp_pw, max_retries=3):
+    from selenium import webdriver
+    from selenium.webdriver.common.by import By
+
     options = webdriver.ChromeOptions()
     options.add_argument("--headless")
     driver = webdriver.Chrome(options=options)
@@ -100,6 +280,7 @@ def get_download_soup(wp_user, wp_pw, max_retries=3):
         while retry_count < max_retries:
             try:
                 driver.get("https://meinsvwissen.de/wp-admin/admin.php?page=wpfd")
+                metrics.incr("selenium_page_loads")
                 time.sleep(10)
                 user = driver.find_element(By.ID, "user_login")
                 pw = driver.find_element(By.ID, "user_pass")
@@ -116,6 +297,7 @@ def get_download_soup(wp_user, wp_pw, max_retries=3):
 
                 file_list = driver.find_element(By.ID, "categorieslist")
                 html = file_list.get_attribute("innerHTML")
+                # build_category_tree reads the top-level items, lxml would wrap them in <html><body>
                 soup = BeautifulSoup(html, "html.parser")
                 return soup
 
@@ -133,86 +315,181 @@ def get_download_soup(wp_user, wp_pw, max_retries=3):
         driver.quit()
 
 
-def process_id(id, index, total, max_retries=5):
-    options = webdriver.ChromeOptions()
-    options.add_argument("--headless")
-    driver = webdriver.Chrome(options=options)
-    driver.implicitly_wait(5)
+# WP File Download renders the category named in the URL hash into this container
+_CATEGORY_STATE_JS = """
+const container = document.getElementById("wpfd-elementor-category");
+if (!container) return null;
+const ids = Array.from(container.querySelectorAll("a.wpfd-file-link"), a => a.getAttribute("data-category_id"));
+// the rendered category content carries the id of the category it shows
+const content = container.querySelector("[data-category]");
+return {html: container.innerHTML, ids: ids, category: content ? content.getAttribute("data-category") : null};
+"""
 
-    retry_count = 0
-    success = False
-    html = None
 
-    try:
-        while retry_count < max_retries and not success:
-            try:
-                jitter = random.uniform(3, 5)
-                time.sleep(jitter)
-                driver.get(f"https://meinsvwissen.de/sv-archiv/#36-{id}")
-                time.sleep(10)  # Increased wait time for folder expansion
+class BrowserSession:
+    """Headless Chrome that stays open while crawling many categories of the SV archive.
 
-                container = driver.find_element(By.ID, "wpfd-elementor-category")
-                html = container.get_attribute("innerHTML")
-                success = True
+    The first category is opened with a full page load. After that the session moves to the next
+    category by changing the URL hash and waits until `#wpfd-elementor-category` shows that
+    category's files, or content marked with its id for folders without files. If it does not,
+    the category is loaded from scratch, and a failed full load is retried in a new browser.
+    """
 
-            except Exception as e:
-                retry_count += 1
-                if retry_count < max_retries:
-                    print(
-                        f"{id} - Retrying... (Attempt {retry_count + 1}/{max_retries})"
-                    )
-                    time.sleep(2.5**retry_count + random.uniform(4, 6))
-                else:
-                    raise Exception(f"Max retries ({max_retries}) reached for ID {id}.")
+    def __init__(self, timeout=10, hash_timeout=5):
+        self.timeout = timeout
+        self.hash_timeout = hash_timeout
+        self.driver = None
 
-        if success and html:
-            soup = BeautifulSoup(html, "html.parser")
-            file_items = soup.find_all("a", class_="wpfd-file-link")
-            return file_items
-        else:
-            return []
+    def __enter__(self):
+        return self
 
-    finally:
-        driver.quit()
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self.driver is not None:
+            self.driver.quit()
+            self.driver = None
+
+    def _start(self):
+        from selenium import webdriver
+
+        options = webdriver.ChromeOptions()
+        options.add_argument("--headless")
+        self.driver = webdriver.Chrome(options=options)
 
+    def _state(self):
+        return self.driver.execute_script(_CATEGORY_STATE_JS)
 
-def get_file_links(category_ids, max_workers=4):
+    def _wait_for(self, category_id, timeout):
+        """Wait until the container shows the files of `category_id`, returns its html or None"""
+        from selenium.webdriver.support.ui import WebDriverWait
+        from selenium.common.exceptions import TimeoutException
+
+        def shown(driver):
+            state = self._state()
+            if state is None:
+                return False
+            if state["ids"]:
+                return all(id_ == category_id for id_ in state["ids"]) and state["html"]
+            # folders without files only count as empty once the content identifies the category,
+            # a loading spinner or a stale container must not be taken for an empty folder
+            return state.get("category") == category_id and state["html"]
+
+        try:
+            return WebDriverWait(self.driver, timeout, poll_frequency=0.1).until(shown)
+        except TimeoutException:
+            return None
+
+    def _load(self, url, category_id):
+        # navigating away first forces a full load even if only the hash differs
+        self.driver.get("about:blank")
+        self.driver.get(url)
+        metrics.incr("selenium_page_loads")
+        html = self._wait_for(category_id, self.timeout)
+        if html is None:
+            raise Exception(f"Category {category_id} was not shown on {url}")
+        return html
+
+    def category_html(self, category_id):
+        """innerHTML of the category container once it shows `category_id`"""
+        category_id = str(category_id)
+        url = f"{download_base_url}/sv-archiv/#36-{category_id}"
+        with limiter_for(url).slot():
+            if self.driver is None:
+                self._start()
+                return self._load(url, category_id)
+            self.driver.execute_script("window.location.hash = arguments[0]", f"36-{category_id}")
+            metrics.incr("selenium_hash_navigations")
+            html = self._wait_for(category_id, self.hash_timeout)
+            if html is not None:
+                return html
+            return self._load(url, category_id)
+
+    def file_links(self, category_id, max_retries=5):
+        """All file links of a category; the browser is restarted after a failed attempt"""
+        for attempt in range(1, max_retries + 1):
+            try:
+                html = self.category_html(category_id)
+                break
+            except Exception:
+                self.close()
+                if attempt == max_retries:
+                    raise Exception(f"Max retries ({max_retries}) reached for ID {category_id}.")
+                print(f"{category_id} - Retrying... (Attempt {attempt + 1}/{max_retries})")
+                time.sleep(2.5**attempt + random.uniform(4, 6))
+        soup = parse_html(html)
+        return soup.find_all("a", class_="wpfd-file-link")
+
+
+def process_id(id, index, total, max_retries=5):
+    """File links of one category, in a browser of its own"""
+    with BrowserSession() as session:
+        return session.file_links(id, max_retries)
+
+
+def get_file_links(
+    category_ids,
+    max_workers=4,
+    reuse_browsers=reuse_browser_sessions,
+    backend=listing_backend,
+    base_url=download_base_url,
+):
+    """File links of all categories, crawled by `max_workers` threads.
+
+    The "http" backend reads the file lists from the WP File Download AJAX endpoint and only
+    opens a browser for categories where that fails. With `reuse_browsers`, every thread keeps
+    one BrowserSession open for all the categories it crawls and navigates between them via the
+    URL hash; otherwise every category gets a new browser.
+    """
     lst = []
+    local = threading.local()
+    sessions = []
+    sessions_lock = threading.Lock()
+    client = WPFDClient(base_url) if backend == "http" else None
 
-    with Progress(
-        TextColumn("[progress.description]{task.description}"),
-        BarColumn(),
-        TextColumn("[progress.percentage]{task.percentage:>3.0f}%"),
-        TimeRemainingColumn(),
-    ) as progress:
-        task = progress.add_task("Processing...", total=len(category_ids))
-
-        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-            future_to_id = {
-                executor.submit(process_id, id, index, len(category_ids)): id
-                for index, id in enumerate(category_ids)
-                if id
-            }
+    def crawl(id_):
+        if client is not None:
+            try:
+                return client.file_links(id_)
+            except Exception as e:
+                log.warning(f"{id_} - HTTP file listing failed ({e}), falling back to selenium")
+                metrics.incr("listing_fallbacks")
+        if not reuse_browsers:
+            return process_id(id_, None, len(category_ids))
+        if not hasattr(local, "session"):
+            local.session = BrowserSession()
+            with sessions_lock:
+                sessions.append(local.session)
+        return local.session.file_links(id_)
+
+    with progress_task("Processing...", total=len(category_ids)) as advance:
 
-            for future in concurrent.futures.as_completed(future_to_id):
-                id_ = future_to_id[future]
-                try:
-                    file_items = future.result()
-                    lst.extend(file_items)
-                except Exception as e:
-                    raise e
-                progress.update(task, advance=1)
+        try:
+            with ContextThreadPoolExecutor(max_workers=max_workers) as executor:
+                future_to_id = {executor.submit(crawl, id): id for id in category_ids if id}
+
+                for future in concurrent.futures.as_completed(future_to_id):
+                    lst.extend(future.result())
+                    advance()
+        finally:
+            for session in sessions:
+                session.close()
 
     return list(set(lst))
 
 
 def get_terms(smoke_test, smoke_test_n, max_workers, lm):
+    # dspy is slow to import and only needed for the glossary
+    import dspy
+    from lib.llm_parsers import make_termparser
+
     term_parser = make_termparser()
 
     glossary_url = "https://meinsvwissen.de/glossar/"
 
-    response = requests.get(glossary_url)
-    soup = BeautifulSoup(response.content, "html.parser")
+    response = requests.get(glossary_url, hooks=HTTP_HOOKS)
+    soup = parse_html(response.content)
 
     elementors = soup.find_all(class_="elementor-toggle-item")
     if smoke_test:
@@ -237,14 +514,8 @@ def get_terms(smoke_test, smoke_test_n, max_workers, lm):
     n = len(elementors)
     results = [None] * n
 
-    with Progress(
-        TextColumn("[progress.description]{task.description}"),
-        BarColumn(),
-        TextColumn("[progress.percentage]{task.percentage:>3.0f}%"),
-        TimeRemainingColumn(),
-    ) as progress:
-        task = progress.add_task("Parsing terms...", total=n)
-        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+    with progress_task("Parsing terms...", total=n) as advance:
+        with ContextThreadPoolExecutor(max_workers=max_workers) as executor:
             future_to_idx = {
                 executor.submit(parse_term, elem): idx
                 for idx, elem in enumerate(elementors)
@@ -253,7 +524,7 @@ def get_terms(smoke_test, smoke_test_n, max_workers, lm):
             for future in as_completed(future_to_idx):
                 idx = future_to_idx[future]
                 results[idx] = future.result()
-                progress.update(task, advance=1)
+                advance()
 
     return pl.DataFrame(results)
 
@@ -261,11 +532,10 @@ def scrape_scc():
     """
     Scraping Student council committees
     """
-    schema = SCCSchema.to_pydantic_model()
     url = "https://www.bildungsserver.de/schule/gremien-der-schuelervertretung-sm-12681-de.html"
-    res = requests.get(url)
+    res = requests.get(url, hooks=HTTP_HOOKS)
     res.raise_for_status()
-    soup = BeautifulSoup(res.content, "html.parser")
+    soup = parse_html(res.content)
     cards = soup.find_all("section", class_="a5-section-linklist")[1:]
     objs = []
     for card in cards:
@@ -275,9 +545,9 @@ def scrape_scc():
             key for key, value in valid_jurisdictions.items() if value == name
         ][0]
         detail_link = card.find("a", title="Mehr Info")["href"]
-        res = requests.get("https://www.bildungsserver.de" + detail_link)
+        res = requests.get("https://www.bildungsserver.de" + detail_link, hooks=HTTP_HOOKS)
         res.raise_for_status()
-        soup = BeautifulSoup(res.content, "html.parser")
+        soup = parse_html(res.content)
         description = soup.find("div", class_="ym-gbox-left").find_all("p")[3].text
         obj = {
             "name": name,
@@ -285,28 +555,25 @@ def scrape_scc():
             "jurisdiction": jurisdiction,
             "description": description,
         }
-        validated = schema.model_validate(obj).model_dump()
-        objs.append(validated)
+        objs.append(obj)
 
     # manually add Saarland (missing from website) but hoping for addition in the future
     if len(objs) == 16:
         with open("static_data/saarland_scc.json") as f:
             obj = json.loads(f.read())
-        validated = schema.model_validate(obj).model_dump()
-        objs.append(validated)
+        objs.append(obj)
 
     assert len(objs) == 17
 
-    return pl.from_dicts(objs)
+    return SCCSchema.check_frame(pl.from_dicts(objs, infer_schema_length=None))
 
 def scrape_svtipps(sample_k=-1):
-    schema = SVTippsSchema.to_pydantic_model()
     sanitizer = Sanitizer()
     base_url = "https://svtipps.de"
     
-    response = requests.get(base_url)
+    response = requests.get(base_url, hooks=HTTP_HOOKS)
     response.raise_for_status()
-    soup = BeautifulSoup(response.content, "html.parser")
+    soup = parse_html(response.content)
     
     nav_tag = soup.find("nav").find("ul")
     if not nav_tag:
@@ -358,25 +625,17 @@ def scrape_svtipps(sample_k=-1):
     
     objs = []
     
-    with Progress(
-        TextColumn("[progress.description]{task.description}"),
-        BarColumn(),
-        TextColumn("[progress.percentage]{task.percentage:>3.0f}%"),
-        TimeRemainingColumn(),
-    ) as progress:
-        task = progress.add_task("Scraping SVTipps pages...", total=len(urls_to_scrape))
+    with progress_task("Scraping SVTipps pages...", total=len(urls_to_scrape)) as advance:
         
         for url in urls_to_scrape:
-            time.sleep(random.uniform(0.5, 1.5))
-            
-            response = requests.get(url, timeout=30)
+            response = limited_get(url, timeout=30, hooks=HTTP_HOOKS)
             response.raise_for_status()
-            page_soup = BeautifulSoup(response.content, "html.parser")
+            page_soup = parse_html(response.content)
             
             content_div = page_soup.find("div", {"id": "content"})
             if not content_div:
                 print(f"No content div found for {url}")
-                progress.update(task, advance=1)
+                advance()
                 raise RuntimeError("Invalid Page?!: ", url)
             
             title_tag = page_soup.find("title")
@@ -396,9 +655,8 @@ def scrape_svtipps(sample_k=-1):
                 "subcategory": subcategory,
             }
             
-            validated = schema.model_validate(obj).model_dump()
-            objs.append(validated)
+            objs.append(obj)
         
-            progress.update(task, advance=1)
+            advance()
     
-    return pl.from_dicts(objs)
\ No newline at end of file
+    return SVTippsSchema.check_frame(pl.from_dicts(objs, infer_schema_length=None))
\ No newline at end of file
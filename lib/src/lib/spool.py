@@ -0,0 +1,132 @@
+import os
+import shutil
+import hashlib
+import tempfile
+import weakref
+import pyarrow as pa
+import polars as pl
+
+
+class SpooledFile:
+    """A file body stored in a FileSpool, identified by its sha256"""
+
+    def __init__(self, path, sha256, size):
+        self.path = path
+        self.sha256 = sha256
+        self.size = size
+
+    def __repr__(self):
+        return f"SpooledFile(sha256='{self.sha256}', size={self.size})"
+
+
+class FileSpool:
+    """Directory holding downloaded file bodies on disk until a table is written.
+
+    Files are named by their sha256, so identical downloads are stored once. Without `path`,
+    a temporary directory is used and removed when the spool is garbage collected.
+    """
+
+    def __init__(self, path=None):
+        if path is None:
+            self.path = tempfile.mkdtemp(prefix="segg-spool-")
+            self._cleanup = weakref.finalize(self, shutil.rmtree, self.path, ignore_errors=True)
+        else:
+            self.path = path
+            os.makedirs(path, exist_ok=True)
+
+    def file_path(self, sha256):
+        return os.path.join(self.path, sha256)
+
+    def writer(self) -> "SpoolWriter":
+        return SpoolWriter(self)
+
+    def write_chunks(self, chunks) -> SpooledFile:
+        """Write an iterable of byte chunks, hashing them on the fly. Only one chunk is held in memory."""
+        writer = self.writer()
+        try:
+            for chunk in chunks:
+                writer.write(chunk)
+        except BaseException:
+            writer.abort()
+            raise
+        return writer.commit()
+
+    def has(self, sha256) -> bool:
+        return os.path.exists(self.file_path(sha256))
+
+    def get(self, sha256) -> SpooledFile:
+        path = self.file_path(sha256)
+        return SpooledFile(path, sha256, os.path.getsize(path))
+
+    def read(self, sha256) -> bytes:
+        with open(self.file_path(sha256), "rb") as f:
+            return f.read()
+
+    def prune(self, keep, older_than=None):
+        """Delete all files whose sha256 is not in `keep`, returns (number of files, bytes) removed.
+
+        Files modified after the timestamp `older_than` are kept, so downloads of a run that is
+        still going on (including their unfinished `.part` files) are not deleted.
+        """
+        removed, removed_bytes = 0, 0
+        with os.scandir(self.path) as entries:
+            for entry in entries:
+                if not entry.is_file() or entry.name in keep:
+                    continue
+                stat = entry.stat()
+                if older_than is not None and stat.st_mtime > older_than:
+                    continue
+                os.remove(entry.path)
+                removed += 1
+                removed_bytes += stat.st_size
+        return removed, removed_bytes
+
+
+class SpoolWriter:
+    """Incremental write of one file into a spool, for callers that receive chunks one by one.
+
+    The file is written to a temporary name and renamed to its sha256 on `commit`.
+    """
+
+    def __init__(self, spool):
+        self.spool = spool
+        self.size = 0
+        self._digest = hashlib.sha256()
+        fd, self._tmp_path = tempfile.mkstemp(dir=spool.path, suffix=".part")
+        self._file = os.fdopen(fd, "wb")
+
+    def write(self, chunk):
+        if chunk:
+            self._digest.update(chunk)
+            self._file.write(chunk)
+            self.size += len(chunk)
+
+    def commit(self) -> SpooledFile:
+        self._file.close()
+        sha256 = self._digest.hexdigest()
+        path = self.spool.file_path(sha256)
+        os.replace(self._tmp_path, path)
+        return SpooledFile(path, sha256, self.size)
+
+    def abort(self):
+        self._file.close()
+        os.remove(self._tmp_path)
+
+
+def load_spooled_binaries(df: pl.DataFrame, spool: FileSpool, column: str) -> pl.DataFrame:
+    """Replace the `<name>_sha256` and `<name>_size` columns of spooled files by the `column` binaries.
+
+    The files are read one by one straight into an Arrow array, without an intermediate list of
+    bytes objects. Rows with a null sha256 get a null binary.
+    """
+    base = column.removesuffix("_binary")
+    sha256_col, size_col = f"{base}_sha256", f"{base}_size"
+    binaries = pa.array(
+        (spool.read(digest) if digest is not None else None for digest in df[sha256_col]),
+        type=pa.large_binary(),
+        size=len(df),
+    )
+    position = df.columns.index(sha256_col)
+    columns = df.drop(sha256_col, size_col).get_columns()
+    binary = pl.Series(column, binaries)
+    return pl.DataFrame(columns[:position] + [binary] + columns[position:])
@@ -0,0 +1,70 @@
+import re
+import urllib.parse
+import polars as pl
+
+# Transcripts of videos and Prezis are listed in a sheet (url_medium -> url_transkript). The same
+# medium is linked in many forms (youtu.be, watch?v=, embed/, prezi.com/p/embed/, /view/ ...),
+# so both the sheet and the looked up urls are reduced to a media key.
+
+_YOUTUBE_HOSTS = ("youtube.com", "youtube-nocookie.com", "youtu.be")
+_YOUTUBE_PATH_PREFIXES = ("embed", "shorts", "live", "v")
+_PREZI_PATH_PREFIXES = ("p", "view", "embed", "v")
+_YOUTUBE_ID = re.compile(r"^[A-Za-z0-9_-]{11}$")
+
+
+def media_key(url):
+    """("youtube", id), ("prezi", id) or ("url", url without scheme and trailing slash)"""
+    url = url.strip()
+    parts = urllib.parse.urlsplit(url if "//" in url else f"//{url}")
+    host = (parts.hostname or "").removeprefix("www.").removeprefix("m.")
+    segments = [segment for segment in parts.path.split("/") if segment]
+
+    if host.endswith(_YOUTUBE_HOSTS):
+        video_id = None
+        if host == "youtu.be" and segments:
+            video_id = segments[0]
+        elif len(segments) >= 2 and segments[0] in _YOUTUBE_PATH_PREFIXES:
+            video_id = segments[1]
+        else:
+            video_id = urllib.parse.parse_qs(parts.query).get("v", [None])[0]
+        if video_id and _YOUTUBE_ID.match(video_id):
+            return ("youtube", video_id)
+    elif host.endswith("prezi.com"):
+        while segments and segments[0] in _PREZI_PATH_PREFIXES:
+            segments = segments[1:]
+        if segments:
+            return ("prezi", segments[0])
+    return ("url", f"{host}{parts.path}".rstrip("/"))
+
+
+class TranscriptIndex:
+    """Transcript urls by media key, for O(1) lookups of any form of a media url"""
+
+    def __init__(self, df: pl.DataFrame):
+        self._by_key = {}
+        for medium, transcript in df.select("url_medium", "url_transkript").iter_rows():
+            if medium and transcript:
+                # the first row wins, like the former filter on the sheet
+                self._by_key.setdefault(media_key(medium), transcript)
+
+    def __len__(self):
+        return len(self._by_key)
+
+    def lookup(self, media_url):
+        return self._by_key.get(media_key(media_url))
+
+
+def load_transcript_sheet(url, spool, validators) -> pl.DataFrame:
+    """The transcript sheet from the disk cache, refreshed with a conditional GET.
+
+    If the sheet cannot be fetched, the cached copy of an earlier run is used.
+    """
+    from lib.scraping import download_file
+
+    is_valid, _, spooled = download_file(url, spool, max_retries=2, retry_delay=1, validators=validators)
+    if not is_valid:
+        known = validators.get(url)
+        if known is None or not spool.has(known["sha256"]):
+            raise RuntimeError(f"Transcript sheet {url} is not available and not cached")
+        spooled = spool.get(known["sha256"])
+    return pl.read_excel(spooled.path)
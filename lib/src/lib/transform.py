@@ -30,3 +30,9 @@ def transform_api_results(pipeline_name, db_name):
     pl.col("date").dt.truncate("1d"))
 
     return df[["id","date","title","content", "stage", "topics", "tool_types"]]
+
+
+def post_permalinks(pipeline_name, db_name):
+    """id, link and slug of every loaded post, to resolve links between posts without requests"""
+    with duckdb.connect(f"{pipeline_name}.duckdb", read_only=True) as db:
+        return db.sql(f"SELECT id, link, slug FROM {db_name}.posts_pre").pl()
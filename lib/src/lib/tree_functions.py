@@ -1,10 +1,10 @@
 
 from lib.models import DownloadCategoryNode
-from anytree import RenderTree, Resolver
-from anytree.resolver import ChildResolverError
 from anytree.exporter import JsonExporter
-from anytree.importer import JsonImporter
+from anytree.importer import JsonImporter, DictImporter
 import polars as pl
+import weakref
+from array import array
 
 def build_category_tree(ul, parent_node=None):
     if parent_node is None:
@@ -34,87 +34,214 @@ def build_category_tree(ul, parent_node=None):
 
         return None
     
+class CategoryTree:
+    """Flat, read-only copy of a category tree, stored as arrays in pre-order.
+
+    Node i has the id `ids[i]` and its subtree occupies the positions `i` to `ends[i] - 1`, so
+    descendant checks and subtree listings are slices instead of tree walks. `index` maps ids
+    to positions (the first node in pre-order for duplicate ids, like a depth-first search).
+    `nodes` keeps the anytree nodes the tree was built from.
+    """
+
+    __slots__ = ("ids", "names", "levels", "parent_ids", "parents", "ends", "index", "nodes")
+
+    def __init__(self, ids, names, levels, parent_ids, parents, ends, nodes=None):
+        self.ids = ids
+        self.names = names
+        self.levels = levels
+        self.parent_ids = parent_ids
+        self.parents = parents
+        self.ends = ends
+        self.nodes = nodes
+        self.index = {}
+        for position, id_ in enumerate(ids):
+            self.index.setdefault(id_, position)
+
+    @classmethod
+    def from_anytree(cls, root_node):
+        ids, names, levels, parent_ids, nodes = [], [], [], [], []
+        parents, ends = array("l"), array("l")
+        # iterative pre-order walk; a node's subtree ends where the walk leaves it
+        stack = [(root_node, -1, False)]
+        while stack:
+            node, parent, leaving = stack.pop()
+            if leaving:
+                ends[parent] = len(ids)
+                continue
+            position = len(ids)
+            ids.append(node.data_id)
+            names.append(node.name)
+            levels.append(node.data_level)
+            parent_ids.append(node.data_parent_id)
+            nodes.append(node)
+            parents.append(parent)
+            ends.append(position + 1)
+            stack.append((node, position, True))
+            stack.extend((child, position, False) for child in reversed(node.children))
+        return cls(ids, names, levels, parent_ids, parents, ends, nodes)
+
+    def to_anytree(self):
+        nodes = []
+        for position, parent in enumerate(self.parents):
+            nodes.append(
+                DownloadCategoryNode(
+                    self.names[position],
+                    data_id=self.ids[position],
+                    data_level=self.levels[position],
+                    data_parent_id=self.parent_ids[position],
+                    parent=nodes[parent] if parent >= 0 else None,
+                )
+            )
+        return nodes[0] if nodes else None
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, category_id):
+        return category_id in self.index
+
+    def position(self, category_id):
+        return self.index.get(category_id)
+
+    def node(self, category_id):
+        """The anytree node with this id, or None"""
+        position = self.index.get(category_id)
+        return None if position is None or self.nodes is None else self.nodes[position]
+
+    def name(self, category_id):
+        position = self.index.get(category_id)
+        return None if position is None else self.names[position]
+
+    def parent_id(self, category_id):
+        position = self.index.get(category_id)
+        if position is None or self.parents[position] < 0:
+            return None
+        return self.ids[self.parents[position]]
+
+    def subtree_ids(self, category_id):
+        """The id and all descendant ids of a category, in pre-order"""
+        position = self.index.get(category_id)
+        if position is None:
+            return []
+        return self.ids[position : self.ends[position]]
+
+    def is_descendant(self, category_id, ancestor_id):
+        """True if `category_id` is `ancestor_id` or lies below it"""
+        position, ancestor = self.index.get(category_id), self.index.get(ancestor_id)
+        if position is None or ancestor is None:
+            return False
+        return ancestor <= position < self.ends[ancestor]
+
+
+# trees are built once per run and not changed afterwards, so the flat copy is cached per root
+_category_trees = weakref.WeakKeyDictionary()
+
+
+def category_tree(root_node) -> CategoryTree:
+    """The cached CategoryTree of an anytree category tree"""
+    tree = _category_trees.get(root_node)
+    if tree is None:
+        tree = _category_trees[root_node] = CategoryTree.from_anytree(root_node)
+    return tree
+
+
 def find_node_by_id(root_node, target_id):
-    if root_node.data_id == target_id:
-        return root_node
-    for child in root_node.children:
-        found = find_node_by_id(child, target_id)
-        if found:
-            return found
-    return None
+    return category_tree(root_node).node(target_id)
 
 def get_node_lst(root_node):
-    node_ids = []
+    return list(category_tree(root_node).ids)
 
-    for pre, _, node in RenderTree(root_node):
-        node_ids.append(node.data_id)
 
-    return node_ids
+def tree_to_json(root_node):
+    exporter = JsonExporter(indent=2, sort_keys=True)
+    return exporter.export(root_node)
 
 
 def export_tree_to_json(root_node,file_path):
-    exporter = JsonExporter(indent=2, sort_keys=True)
-    jason = exporter.export(root_node)
+    jason = tree_to_json(root_node)
     with open(file_path, "w") as f:
         f.write(jason)
 
 def import_tree_from_json(file_path):
-    importer = JsonImporter()
+    importer = JsonImporter(DictImporter(nodecls=DownloadCategoryNode))
     with open(file_path, "r") as f:
         root_node = importer.import_(f.read())
     return root_node
 
 
-def get_all_category_ids(cat_id, root_node, resolver):
+def get_all_category_ids(cat_id, root_node):
     """Get this category ID and all descendant category IDs from the tree."""
     if cat_id is None:
         return []
+    descendants = category_tree(root_node).subtree_ids(str(cat_id))
+    return [int(cat_id)] + [int(id_) for id_ in descendants[1:]]
 
-    category_ids = [cat_id]
-
-    try:
-        node = resolver.get(root_node, str(cat_id))
-        for child in node.children:
-            child_id = int(child.data_id)
-            category_ids.extend(get_all_category_ids(child_id, root_node, resolver))
-    except ChildResolverError:
-        pass
 
-    return category_ids
+def category_closure(root_node) -> pl.DataFrame:
+    """All (ancestor_id, descendant_id) pairs of the category tree, each category paired with itself too.
 
+    Built from the subtree intervals of the CategoryTree: the descendants of the node at
+    position i are the nodes at positions i to ends[i] - 1.
+    """
+    tree = category_tree(root_node)
+    nodes = pl.DataFrame(
+        {
+            "position": pl.int_range(len(tree), eager=True),
+            "category_id": pl.Series(tree.ids, dtype=pl.Utf8).cast(pl.Int64, strict=False),
+            "end": pl.Series(tree.ends, dtype=pl.Int64),
+        }
+    )
+    return (
+        nodes.select(
+            pl.col("category_id").alias("ancestor_id"),
+            pl.int_ranges("position", "end").alias("descendant_position"),
+        )
+        .explode("descendant_position")
+        .join(
+            nodes.select(pl.col("position").alias("descendant_position"), pl.col("category_id").alias("descendant_id")),
+            on="descendant_position",
+        )
+        .select("ancestor_id", "descendant_id")
+        .drop_nulls()
+        .unique()
+    )
 
-def add_associated_downloads(posts_df, downloads_df, root_node):
-    """Add a column with associated downloads for each post based on category tree traversal."""
-    # Prepare data
-    dl_dicts = downloads_df[["data_id", "data_category_id"]].to_dicts()
-    post_dicts = posts_df[["id", "download_chapter_dedicated"]].to_dicts()
-
-    # Create resolver for tree traversal
-    resolver = Resolver('data_id')
-
-    # Build mapping of post_id -> list of associated download IDs
-    post_downloads_map = {}
-    for post in post_dicts:
-        post_id = post["id"]
-        cat_id = post["download_chapter_dedicated"]
 
-        # Get all category IDs (post category + all descendants)
-        all_cat_ids = get_all_category_ids(cat_id, root_node, resolver)
+def post_download_pairs(posts_df, downloads_df, root_node) -> pl.DataFrame:
+    """(post id, download id) for every download in the category tree of a post's dedicated chapter.
 
-        # Find downloads whose category is in this tree
-        matched = [
-            dl['data_id'] for dl in dl_dicts
-            if dl['data_category_id'] in all_cat_ids
-        ]
+    Chapters that are not in the tree only match downloads of their own category. The
+    `post_row`/`download_row` columns keep the positions in the input frames.
+    """
+    posts = (
+        posts_df.select(pl.col("id").alias("post_id"), pl.col("download_chapter_dedicated").alias("ancestor_id"))
+        .with_row_index("post_row")
+        .drop_nulls("ancestor_id")
+    )
+    downloads = downloads_df.select(
+        pl.col("data_id").alias("download_id"), pl.col("data_category_id").alias("descendant_id")
+    ).with_row_index("download_row")
+    return (
+        posts.join(category_closure(root_node), on="ancestor_id", how="left")
+        .with_columns(pl.col("descendant_id").fill_null(pl.col("ancestor_id")))
+        .join(downloads, on="descendant_id")
+        .select("post_row", "post_id", "download_row", "download_id")
+    )
 
-        post_downloads_map[post_id] = matched if matched else None
 
-    # Add the new column to the dataframe
-    posts_df = posts_df.with_columns(
-        pl.col("id").replace(post_downloads_map, default=None).alias("associated_downloads")
+def add_associated_downloads(posts_df, downloads_df, root_node):
+    """Add a column with associated downloads for each post based on category tree traversal."""
+    associated = (
+        post_download_pairs(posts_df, downloads_df, root_node)
+        .sort("post_row", "download_row")
+        .group_by("post_row", maintain_order=True)
+        .agg(pl.col("download_id").alias("associated_downloads"))
+    )
+    return (
+        posts_df.with_row_index("post_row")
+        .join(associated, on="post_row", how="left", maintain_order="left")
+        .drop("post_row")
     )
-
-    return posts_df
 
 
 def add_associated_posts(downloads_df, posts_df, root_node):
@@ -123,38 +250,14 @@ def add_associated_posts(downloads_df, posts_df, root_node):
     This is the inverse of add_associated_downloads - for each download, find all posts
     whose category tree includes this download's category.
     """
-    # Prepare data
-    dl_dicts = downloads_df[["data_id", "data_category_id"]].to_dicts()
-    post_dicts = posts_df[["id", "download_chapter_dedicated"]].to_dicts()
-
-    # Create resolver for tree traversal
-    resolver = Resolver('data_id')
-
-    # Build mapping of download_id -> list of associated post IDs
-    download_posts_map = {}
-
-    for dl in dl_dicts:
-        download_id = dl["data_id"]
-        download_cat_id = dl["data_category_id"]
-
-        # Find all posts whose category tree includes this download's category
-        associated_post_ids = []
-        for post in post_dicts:
-            post_id = post["id"]
-            post_cat_id = post["download_chapter_dedicated"]
-
-            # Get all category IDs for this post's tree
-            all_cat_ids = get_all_category_ids(post_cat_id, root_node, resolver)
-
-            # If the download's category is in this post's tree, add the post
-            if download_cat_id in all_cat_ids:
-                associated_post_ids.append(post_id)
-
-        download_posts_map[download_id] = associated_post_ids if associated_post_ids else None
-
-    # Add the new column to the dataframe
-    downloads_df = downloads_df.with_columns(
-        pl.col("data_id").replace(download_posts_map, default=None).alias("associated_posts")
+    associated = (
+        post_download_pairs(posts_df, downloads_df, root_node)
+        .sort("download_row", "post_row")
+        .group_by("download_row", maintain_order=True)
+        .agg(pl.col("post_id").alias("associated_posts"))
+    )
+    return (
+        downloads_df.with_row_index("download_row")
+        .join(associated, on="download_row", how="left", maintain_order="left")
+        .drop("download_row")
     )
-
-    return downloads_df
\ No newline at end of file
@@ -0,0 +1,68 @@
+import os
+import sqlite3
+import datetime
+import threading
+
+
+class ValidatorStore:
+    """Persistent HTTP validators (ETag, Last-Modified) of downloaded files, keyed by url.
+
+    Together with the sha256 and size of the file in the FileSpool, they allow conditional
+    requests: a 304 response means the spooled file of the previous run can be reused.
+    """
+
+    def __init__(self, path):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS validators (
+                    url TEXT PRIMARY KEY,
+                    etag TEXT,
+                    last_modified TEXT,
+                    file_type TEXT NOT NULL,
+                    sha256 TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    checked_at TEXT NOT NULL
+                )
+                """
+            )
+
+    def get(self, url):
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT etag, last_modified, file_type, sha256, size FROM validators WHERE url = ?",
+                (url,),
+            ).fetchone()
+        if row is None:
+            return None
+        return dict(zip(["etag", "last_modified", "file_type", "sha256", "size"], row))
+
+    def put(self, url, etag, last_modified, file_type, sha256, size):
+        checked_at = datetime.datetime.now(datetime.timezone.utc).isoformat()
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO validators VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (url, etag, last_modified, file_type, sha256, size, checked_at),
+            )
+
+    def digests(self):
+        """sha256 of all files that have validators"""
+        with self._lock:
+            return {row[0] for row in self._connection.execute("SELECT DISTINCT sha256 FROM validators")}
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+def conditional_headers(validator):
+    headers = {}
+    if validator.get("etag"):
+        headers["If-None-Match"] = validator["etag"]
+    if validator.get("last_modified"):
+        headers["If-Modified-Since"] = validator["last_modified"]
+    return headers
@@ -1,18 +1,14 @@
-import dlt
 import argparse
 import random
 import os
-import concurrent.futures
-import dspy
-import boto3
-from botocore.config import Config
+import time
+import functools
 import json
-from dotenv import load_dotenv
+import logging
 import polars as pl
 from anytree import RenderTree
 from rich.logging import RichHandler
-import logging
-from lib.tree_functions import build_category_tree, get_node_lst, export_tree_to_json, add_associated_downloads, add_associated_posts
+from lib.tree_functions import build_category_tree, get_node_lst, tree_to_json, add_associated_downloads, add_associated_posts
 from lib.scraping import (
     get_download_soup,
     get_file_links,
@@ -21,9 +17,13 @@ from lib.scraping import (
     scrape_scc,
     scrape_svtipps
 )
-from lib.transform import transform_api_results
-from lib.dlt_defs import api_source
-from lib.config import tree_json_path, llm_base_url, llm_model, db_name, pipeline_name
+from lib.transform import transform_api_results, post_permalinks
+from lib.scheduler import Stage, select_stages, run_stages
+from lib.checkpoints import CheckpointStore, new_run_id, spooled_digests
+from lib import metrics
+from lib.metrics import RunReport
+from lib import html_parsing
+from lib.config import tree_json_path, run_report_path, llm_base_url, llm_model, db_name, pipeline_name, checkpoint_dir, spool_dir, download_validators_path, download_backend, listing_backend, html_parser, async_download_concurrency
 from lib.models import (
     DownloadSchema,
     PostSchema,
@@ -34,52 +34,56 @@ from lib.models import (
     SCCSchema,
     SVTippsSchema
 )
-from lib.post_parsing import (
-    process_posts_row,
-    extract_further_download_category_ids,
-    extract_book_chapter,
-    extract_related_posts,
-    extract_dedicated_download_chapter_id,
-)
+from lib.post_parsing import analyze_posts, load_transcript_index, resolve_related_links
 from lib.legal_res_helpers import get_legal_resources
 from lib.pulication_helpers import get_zotero_api_data, convert_zotero_api_results
-import pyarrow.parquet as pq
+from lib.s3_helpers import conform_to_schema, upload_table, upload_bytes, BackgroundUploader
+from lib.datasets import upload_dataset
+from lib.spool import FileSpool, load_spooled_binaries
+from lib.validators import ValidatorStore
 
-load_dotenv()
-
-logging.basicConfig(
-    level="INFO",
-    format="%(message)s",
-    datefmt="[%X]",
-    handlers=[RichHandler(rich_tracebacks=True)],
-)
+# Importing this module has no side effects: clients, the LLM and the dlt pipeline are
+# created in main() or by the steps that need them, and heavy libraries (boto3, dspy, dlt)
+# are imported there as well.
 
 log = logging.getLogger("rich")
 
+NOISY_LOGGERS = ["LiteLLM", "LiteLLM Router", "httpx", "dspy"]
+
 SMOKE_TEST_N = 3
 MAX_WORKERS = 3
+# the glossary stage mostly waits for LLM responses
+GLOSSARY_WORKERS = MAX_WORKERS * 6
+# enough for the glossary next to two of the other stages
+WORKER_BUDGET = GLOSSARY_WORKERS + 2 * MAX_WORKERS
 S3_BUCKET_NAME = "cdl-segg"
 
-config = Config(
-    region_name="fra1",
-    connect_timeout=20,
-    read_timeout=60,
-    retries={"max_attempts": 8, "mode": "standard"},
-    s3={"addressing_style": "path"},
-)
+table_names = [
+    "student_council_committees",
+    "svtipps",
+    "legal_resources",
+    "publications",
+    "downloads_and_posts_and_sections",  # Group of dependent sub-stages, see step_groups
+    "glossary_terms",
+]
 
 
-session = boto3.session.Session()
-client = session.client(
-    "s3",
-    endpoint_url=os.getenv("S3_ENDPOINT"),
-    aws_access_key_id=os.getenv("S3_ACCESS_KEY_ID"),
-    aws_secret_access_key=os.getenv("S3_SECRET_ACCESS_KEY"),
-    config=config,
-)
+class PipelineContext:
+    """Settings and clients of one pipeline run, passed to every step."""
 
+    def __init__(self, args, client, wp_user, wp_pw, uploader=None, spool=None, validators=None):
+        self.args = args
+        self.client = client
+        # uploads run in the background, so a stage can finish while its tables are uploading
+        self.uploader = uploader or BackgroundUploader(logger=log)
+        # downloaded files are kept on disk until the downloads table is written
+        self.spool = spool or FileSpool()
+        self.validators = validators
+        self.wp_user = wp_user
+        self.wp_pw = wp_pw
 
-def parse_arguments():
+
+def parse_arguments(argv=None):
     parser = argparse.ArgumentParser(
         description="Run the script with optional smoke test and step selection."
     )
@@ -92,117 +96,222 @@ def parse_arguments():
         metavar="STEP_NAME",
         help="Run only specific steps. Available: student_council_committees, svtipps, legal_resources, publications, downloads_and_posts_and_sections, glossary_terms"
     )
-    return parser.parse_args()
-
-
-args = parse_arguments()
-
-if args.smoke_test:
-    log.info("🚭 Smoke Test 🚭")
-
-wp_user = os.getenv("WP_USER")
-wp_pw = os.getenv("WP_PW")
+    parser.add_argument(
+        "--worker-budget",
+        type=int,
+        default=WORKER_BUDGET,
+        help="Maximum number of threads, processes and concurrent requests used by all concurrently running stages together",
+    )
+    parser.add_argument(
+        "--resume",
+        metavar="RUN_ID",
+        help="Resume the given run, skipping all stages that were checkpointed as completed",
+    )
+    parser.add_argument(
+        "--force-upload",
+        action="store_true",
+        help="Upload all tables, even if their content fingerprint matches the remote object",
+    )
+    parser.add_argument(
+        "--layout",
+        choices=["auto", "flat", "partitioned", "both"],
+        default="auto",
+        help="Upload tables whose schema declares partitioning as hive partitioned datasets with a manifest.json and all others as single parquet files (auto), all as single files (flat) or the partitioned ones in both layouts (both, except tables with binary columns)",
+    )
+    parser.add_argument(
+        "--externalize-binaries",
+        action="store_true",
+        help="Store download and publication files once per content under blobs/sha256/ instead of inside the parquet files",
+    )
+    parser.add_argument(
+        "--listing-backend",
+        choices=["http", "selenium"],
+        default=listing_backend,
+        help="Read the download categories and file lists over HTTP (with selenium as fallback) or with selenium only",
+    )
+    parser.add_argument(
+        "--html-parser",
+        choices=list(html_parsing.PARSERS),
+        default=html_parser,
+        help="BeautifulSoup parser for all scraped pages; lxml is faster than the pure-Python html.parser",
+    )
+    parser.add_argument(
+        "--download-backend",
+        choices=["threads", "asyncio"],
+        default=download_backend,
+        help="Download the SV archive files with a thread pool or with asyncio over pooled keep-alive connections",
+    )
+    parser.add_argument(
+        "--prune-spool",
+        action="store_true",
+        help=f"Delete the files in {spool_dir} that are referenced by no download validator and no checkpoint, then exit",
+    )
+    return parser.parse_args(argv)
 
-assert wp_user and wp_pw, "WP_USER and WP_PW must be set in the environment variables"
 
-lm = dspy.LM(
-    model=f"openai/{llm_model}",
-    model_type="chat",
-    temperature=0.3,
-    api_key=os.getenv("OR_KEY"),
-    base_url=llm_base_url,
-    cache=False,
-)
+def make_s3_client():
+    import boto3
+    from botocore.config import Config
 
-pipeline = dlt.pipeline(
-    pipeline_name=pipeline_name,
-    destination=dlt.destinations.duckdb(os.path.abspath("segg.duckdb")),
-    dataset_name=db_name,
-)
+    config = Config(
+        region_name="fra1",
+        connect_timeout=20,
+        read_timeout=60,
+        retries={"max_attempts": 8, "mode": "standard"},
+        s3={"addressing_style": "path"},
+    )
 
-table_names = [
-    "student_council_committees",
-    "svtipps",
-    "legal_resources",
-    "publications",
-    "downloads_and_posts_and_sections",  # Combined step due to dependencies
-    "glossary_terms",
-]
+    session = boto3.session.Session()
+    return session.client(
+        "s3",
+        endpoint_url=os.getenv("S3_ENDPOINT"),
+        aws_access_key_id=os.getenv("S3_ACCESS_KEY_ID"),
+        aws_secret_access_key=os.getenv("S3_SECRET_ACCESS_KEY"),
+        config=config,
+    )
 
-# Validate and setup step selection
-if args.steps:
-    invalid_steps = set(args.steps) - set(table_names)
-    if invalid_steps:
-        log.error(f"Invalid step names: {invalid_steps}")
-        log.error(f"Available steps: {table_names}")
-        exit(1)
-    steps_to_run = set(args.steps)
-    log.info(f"Running only selected steps: {sorted(steps_to_run)}")
-else:
-    steps_to_run = set(table_names)
-    log.info("Running all pipeline steps")
 
+def make_lm():
+    import dspy
 
-# Upload function
-def upload_to_s3(df, table_name, schema):
-    """Upload dataframe to S3 as parquet"""
-    if args.smoke_test:
-        local_file_path = f"smoke_test_{table_name}.parquet"
-    else:
-        local_file_path = f"{table_name}.parquet"
+    return dspy.LM(
+        model=f"openai/{llm_model}",
+        model_type="chat",
+        temperature=0.3,
+        api_key=os.getenv("OR_KEY"),
+        base_url=llm_base_url,
+        cache=False,
+    )
 
-    log.info(f"Uploading {table_name} to S3")
 
-    arrow_table = df.to_arrow()
-    df_columns = set(arrow_table.column_names)
-    schema_columns = set(schema.names)
+def make_dlt_pipeline():
+    import dlt
 
-    missing_in_df = schema_columns - df_columns
-    extra_in_df = df_columns - schema_columns
+    return dlt.pipeline(
+        pipeline_name=pipeline_name,
+        destination=dlt.destinations.duckdb(os.path.abspath("segg.duckdb")),
+        dataset_name=db_name,
+    )
 
-    if missing_in_df:
-        raise ValueError(f"DataFrame missing required schema fields for {table_name}: {missing_in_df}")
-    if extra_in_df:
-        log.warning(f"Extra fields in DataFrame for {table_name}: {extra_in_df}")
 
-    table = arrow_table.select(schema.names)
+def table_layouts(layout, schema_cls):
+    """The layouts ("partitioned", "flat") in which a table of `schema_cls` is uploaded with --layout `layout`"""
+    if not (schema_cls.partition_by or schema_cls.bucket_by):
+        return ["flat"]
+    if layout == "auto":
+        return ["partitioned"]
+    if layout == "both":
+        # a second copy of the files would double the storage and egress of the largest tables
+        if any(fld["type"] is pl.Binary for fld in schema_cls.fields):
+            log.warning(f"Uploading {schema_cls.__name__} only as partitioned dataset, its binaries are not externalized")
+            return ["partitioned"]
+        return ["partitioned", "flat"]
+    return [layout]
 
-    # Cast table to match the expected schema types
-    table = table.cast(schema)
-    pq.write_table(table, local_file_path)
 
-    client.upload_file(
-        local_file_path,
-        S3_BUCKET_NAME,
-        local_file_path,
-        ExtraArgs={"ACL": "public-read"},
-    )
-    log.info(f"Uploaded {table_name} to S3")
-    os.remove(local_file_path)
-    log.info(f"Removed local file {local_file_path}")
+# Upload function
+def upload_to_s3(ctx, df, table_name, schema_cls):
+    """Queue the dataframe for a background upload to S3 as parquet, unless the remote file has the same content
+
+    Depending on --layout, the table is uploaded as one flat file, as a partitioned dataset
+    (for schemas that declare partitioning) or both, see `table_layouts`.
+    """
+    prefix = f"smoke_test_{table_name}" if ctx.args.smoke_test else table_name
+    layouts = table_layouts(ctx.args.layout, schema_cls)
+    uploads, keys, n_bytes = [], [], 0
+    if "partitioned" in layouts:
+        log.info(f"Queueing upload of {table_name} as partitioned dataset to S3")
+        uploads.append(
+            functools.partial(
+                upload_dataset,
+                ctx.client,
+                df,
+                schema_cls,
+                S3_BUCKET_NAME,
+                prefix,
+                extra_args={"ACL": "public-read"},
+                skip_unchanged=not ctx.args.force_upload,
+                logger=log,
+            )
+        )
+        keys.append(f"{prefix}/")
+        n_bytes = df.estimated_size()
+    if "flat" in layouts:
+        key = f"{prefix}.parquet"
+        log.info(f"Queueing upload of {table_name} to S3")
+        table = conform_to_schema(df.to_arrow(), schema_cls.to_pyarrow_schema(), table_name, logger=log)
+        uploads.append(
+            functools.partial(
+                upload_table,
+                ctx.client,
+                table,
+                S3_BUCKET_NAME,
+                key,
+                extra_args={"ACL": "public-read"},
+                sort_keys=schema_cls.sort_keys,
+                skip_unchanged=not ctx.args.force_upload,
+                logger=log,
+                **schema_cls.to_parquet_write_options(),
+            )
+        )
+        keys.append(key)
+        # the arrow table shares its buffers with the frame, so their memory is only charged once
+        n_bytes = max(n_bytes, table.nbytes)
+    # both layouts in one job, so the bytes in flight hold the frame only once
+    ctx.uploader.submit(" and ".join(keys), n_bytes, lambda: sum(upload() for upload in uploads))
+
+
+def upload_binary_table(ctx, df, table_name, schema_cls, spool=None):
+    """Upload a table with binary columns, with --externalize-binaries its binaries go to the blob store.
+
+    With a `spool`, `df` references the binaries by the `<name>_sha256` and `<name>_size` columns
+    of spooled files. They are only loaded into the table if they are not externalized; blobs are
+    uploaded straight from the spool files.
+    """
+    binary_columns = [fld["name"] for fld in schema_cls.fields if fld["type"] is pl.Binary]
+    if not ctx.args.externalize_binaries:
+        if spool is not None:
+            for column in binary_columns:
+                df = load_spooled_binaries(df, spool, column)
+            df = df.cast(schema_cls.to_polars_schema())
+        upload_to_s3(ctx, df, table_name, schema_cls)
+        return
+    from lib.blobs import externalize_binaries, externalize_spooled_binaries, externalized_schema
+
+    for column in binary_columns:
+        if spool is not None:
+            df = externalize_spooled_binaries(
+                df, column, spool, ctx.client, S3_BUCKET_NAME, extra_args={"ACL": "public-read"}, logger=log
+            )
+        else:
+            df = externalize_binaries(
+                df, column, ctx.client, S3_BUCKET_NAME, extra_args={"ACL": "public-read"}, logger=log
+            )
+    external_schema = externalized_schema(schema_cls)
+    upload_to_s3(ctx, df.cast(external_schema.to_polars_schema()), table_name, external_schema)
 
 
 # Pipeline step functions
-def step_student_council_committees():
+def step_student_council_committees(ctx):
     """Get Student council committee info"""
     log.info("🏭 Get Student council committee info")
     scc_df = scrape_scc()
     log.info(f"We got {len(scc_df)} councils")
-    upload_to_s3(scc_df, "student_council_committees", SCCSchema.to_pyarrow_schema())
+    upload_to_s3(ctx, scc_df, "student_council_committees", SCCSchema)
     return scc_df
 
 
-def step_svtipps():
+def step_svtipps(ctx):
     """Get SV tipps"""
     log.info("🏭 Get SV tipps")
-    sample_k = SMOKE_TEST_N if args.smoke_test else -1
+    sample_k = SMOKE_TEST_N if ctx.args.smoke_test else -1
     svtipps_df = scrape_svtipps(sample_k=sample_k)
     log.info(f"We got {len(svtipps_df)} SV tipps")
-    upload_to_s3(svtipps_df, "svtipps", SVTippsSchema.to_pyarrow_schema())
+    upload_to_s3(ctx, svtipps_df, "svtipps", SVTippsSchema)
     return svtipps_df
 
 
-def step_legal_resources():
+def step_legal_resources(ctx):
     """Get legal_resources from jurisdiction as html"""
     log.info("🏭 Get legal_resources from jurisdiction as html")
     path = "static_data/legal_resources.json"
@@ -210,175 +319,345 @@ def step_legal_resources():
         cfg = json.load(f)
 
     debug_legal = False
-    if args.smoke_test:
+    if ctx.args.smoke_test:
         cfg = random.choices(cfg, k=SMOKE_TEST_N)
         debug_legal = True
 
     legal_df = get_legal_resources(cfg, debug=debug_legal, logger=log)
     log.info(f"We got {len(legal_df)} legal resources")
-    upload_to_s3(legal_df, "legal_resources", LegalResourceSchema.to_pyarrow_schema())
+    upload_to_s3(ctx, legal_df, "legal_resources", LegalResourceSchema)
     return legal_df
 
-def step_publications():
+def step_publications(ctx):
     """Getting publications from zotero"""
     log.info("🏭 Getting publications from zotero")
-    sample_k = SMOKE_TEST_N if args.smoke_test else -1
+    sample_k = SMOKE_TEST_N if ctx.args.smoke_test else -1
     zotero_api_data = get_zotero_api_data(sample_k=sample_k)
     zotero_df = convert_zotero_api_results(zotero_api_data, logger=log)
     zotero_df = zotero_df.cast(PublicationSchema.to_polars_schema())
     log.info(f"We got {len(zotero_df)} publications from zotero")
-    upload_to_s3(zotero_df, "publications", PublicationSchema.to_pyarrow_schema())
+    upload_binary_table(ctx, zotero_df, "publications", PublicationSchema)
     return zotero_df
 
-def step_downloads_and_posts_and_sections():
-    """Combined step: Get downloads, posts, and sections (due to dependencies)"""
-    # Step 1: Downloads
+def step_category_tree(ctx):
+    """Get nested html list of all download categories and convert it to a tree"""
     log.info("🏭 Get download files and their categories")
-    log.info("Get nested html list of all categories using selenium to log in to wp backend")
-    soup = get_download_soup(wp_user, wp_pw)
+    log.info(f"Get nested html list of all categories from the wp backend ({ctx.args.listing_backend})")
+    soup = get_download_soup(ctx.wp_user, ctx.wp_pw, backend=ctx.args.listing_backend)
 
     log.info("convert nested html list to tree structure")
     root_node = build_category_tree(soup)
 
-    if args.smoke_test:
+    if ctx.args.smoke_test:
         log.debug("Displaying tree structure:")
         for pre, _, node in RenderTree(root_node):
             log.debug(f"{pre}{node.name} (ID: {node.data_id}, Level: {node.data_level}) {len(node.children) == 0}")
+    return root_node
+
 
+def step_file_links(ctx, root_node):
+    """Go through all categories and get all file links"""
     category_ids = get_node_lst(root_node)
 
-    if args.smoke_test:
+    if ctx.args.smoke_test:
         category_ids = random.choices(category_ids, k=SMOKE_TEST_N)
 
     log.info("go through all categories and get all file links")
-    file_link_lst = get_file_links(category_ids, max_workers=MAX_WORKERS)
+    file_link_lst = get_file_links(category_ids, max_workers=MAX_WORKERS, backend=ctx.args.listing_backend)
+    # keep only the link attributes, so the links can be checkpointed as json
+    file_link_lst = [dict(link.attrs) for link in file_link_lst]
+    log.info(f"We found {len(file_link_lst)} file links in {len(category_ids)} categories")
+    return file_link_lst
 
-    log.info("build a dataframe that contains available info on downloads, including dl url. We are also checking if the url works.")
-    downloads_df = extract_download_info(file_link_lst, root_node, max_workers=MAX_WORKERS)
 
-    log.info(f"We extracted {len(downloads_df)} download urls from {len(category_ids)} categories")
+def step_download_info(ctx, file_link_lst, root_node):
+    """Build a dataframe with all downloads"""
+    log.info("build a dataframe that contains available info on downloads, including dl url. We are also checking if the url works.")
+    downloads_df = extract_download_info(
+        file_link_lst,
+        root_node,
+        max_workers=MAX_WORKERS,
+        spool=ctx.spool,
+        validators=ctx.validators,
+        backend=ctx.args.download_backend,
+    )
+    log.info(f"We extracted {len(downloads_df)} download urls")
     # Note: downloads_df upload to S3 is deferred until after posts processing to add associated_posts column
+    return downloads_df
+
 
-    # Step 2: Posts
+def step_posts_api(ctx):
+    """Get posts from the WP API"""
     log.info("🏭 Get posts")
     log.info("Requesting API")
 
-    if args.smoke_test:
+    # dlt is only imported when posts are requested, it is slow to import
+    from lib.dlt_defs import api_source
+
+    if ctx.args.smoke_test:
         api_source.add_limit(1)
 
-    load_info = pipeline.run(api_source)
+    make_dlt_pipeline().run(api_source)
     log.info("Transforming API results")
     df_posts = transform_api_results(pipeline_name, db_name)
+    post_links = post_permalinks(pipeline_name, db_name)
     log.info(f"We extracted {len(df_posts)} posts.")
+    return df_posts, post_links
+
 
-    # Step 3: Extend posts (requires root_node from downloads)
-    log.info("Extend posts with further download category")
-    df_posts_extended = extract_further_download_category_ids(df_posts)
+def step_post_analysis(ctx, df_posts):
+    """Parse every post's content once, for the post columns and the sections"""
+    log.info("Parse post contents")
+    load_transcript_index(ctx.spool, ctx.validators)
+    post_columns, section_records = analyze_posts(df_posts, logger=log, max_workers=MAX_WORKERS)
+    log.info(f"We found {len(section_records)} sections in {len(post_columns)} posts")
+    return post_columns, section_records
 
-    log.info("Extend posts with book chapter")
-    df_posts_extended = extract_book_chapter(df_posts_extended)
+
+def step_posts_extended(ctx, df_posts, post_columns, post_links):
+    """Extend posts with further download categories, book chapter, related posts and dedicated download chapter"""
+    df_posts_extended = df_posts.join(post_columns, on="id", how="left", maintain_order="left")
 
     log.info("Extend posts with related posts")
-    df_posts_extended = extract_related_posts(df_posts_extended, logger=log, max_workers=MAX_WORKERS)
+    with metrics.phase("extract_related_posts"):
+        df_posts_extended = resolve_related_links(df_posts_extended, post_links, logger=log)
+    return df_posts_extended
 
-    log.info("Extend posts with dedicated download chapter id")
-    df_posts_extended = extract_dedicated_download_chapter_id(df_posts_extended, root_node)
 
+def step_posts(ctx, df_posts_extended, downloads_df, root_node):
+    """Add associated downloads to posts and upload them"""
     log.info("Add associated downloads to posts")
-    df_posts_extended = add_associated_downloads(df_posts_extended, downloads_df, root_node)
-
-    df_posts_extended = df_posts_extended.cast(PostSchema.to_polars_schema())
-    upload_to_s3(df_posts_extended, "posts", PostSchema.to_pyarrow_schema())
+    posts_df = add_associated_downloads(df_posts_extended, downloads_df, root_node)
 
-    # Step 3b: Add associated posts to downloads (now that posts are processed)
-    log.info("Add associated posts to downloads")
-    downloads_df = add_associated_posts(downloads_df, df_posts_extended, root_node)
-    downloads_df = downloads_df.cast(DownloadSchema.to_polars_schema())
-    upload_to_s3(downloads_df, "downloads", DownloadSchema.to_pyarrow_schema())
+    posts_df = posts_df.cast(PostSchema.to_polars_schema())
+    upload_to_s3(ctx, posts_df, "posts", PostSchema)
+    return posts_df
 
-    # Step 4: Sections (requires df_posts)
-    log.info("🏭 Scrape Sections")
 
-    def process_row(row):
-        return process_posts_row(row, logger=log)
+def step_downloads(ctx, downloads_df, posts, root_node):
+    """Add associated posts to downloads and upload them"""
+    log.info("Add associated posts to downloads")
+    downloads_df = add_associated_posts(downloads_df, posts, root_node)
+    # the files stay on disk, the returned (checkpointed) frame only references them
+    upload_binary_table(ctx, downloads_df, "downloads", DownloadSchema, spool=ctx.spool)
+    return downloads_df
 
-    sections = []
-    df_rows = list(df_posts.iter_rows(named=True))
 
-    if args.smoke_test:
-        df_rows = random.choices(df_rows, k=SMOKE_TEST_N)
+def step_sections(ctx, df_posts, section_records):
+    """Validate and upload the sections parsed from the post content"""
+    log.info("🏭 Scrape Sections")
+    sections = section_records
 
-    with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-        futures = [executor.submit(process_row, row) for row in df_rows]
-        for future in concurrent.futures.as_completed(futures):
-            temp = future.result()
-            sections.extend(temp)
+    if ctx.args.smoke_test:
+        post_ids = set(random.choices(df_posts["id"].to_list(), k=SMOKE_TEST_N))
+        sections = [section for section in sections if section["post_id"] in post_ids]
 
-    section_df = pl.DataFrame(sections, schema_overrides=SectionSchema.to_polars_schema())
+    section_df = SectionSchema.check_frame(pl.from_dicts(sections, infer_schema_length=None))
 
     # Validate sections against posts
     sec_ids = section_df["post_id"].unique().to_list()
-    post_ids = df_posts_extended["id"].unique().to_list()
+    post_ids = df_posts["id"].unique().to_list()
     missing = set(sec_ids) - set(post_ids)
     assert not missing, f"Orphan section post_ids: {missing}"
     assert section_df["type"].is_null().sum() == 0, "Section type is null"
 
-    upload_to_s3(section_df, "sections", SectionSchema.to_pyarrow_schema())
+    upload_to_s3(ctx, section_df, "sections", SectionSchema)
+    return section_df
 
-    # Upload tree JSON
-    if args.smoke_test:
+
+def step_downloads_tree(ctx, root_node):
+    """Upload the download category tree as json"""
+    if ctx.args.smoke_test:
         tree_json_filename = f"smoke_test_{tree_json_path}"
     else:
         tree_json_filename = tree_json_path
 
-    export_tree_to_json(root_node, tree_json_filename)
-    log.info(f"Uploading {tree_json_filename} to S3")
-    client.upload_file(
+    log.info(f"Queueing upload of {tree_json_filename} to S3")
+    body = tree_to_json(root_node).encode("utf-8")
+    ctx.uploader.submit(
         tree_json_filename,
+        len(body),
+        upload_bytes,
+        ctx.client,
+        body,
         S3_BUCKET_NAME,
         tree_json_filename,
-        ExtraArgs={"ACL": "public-read"},
+        extra_args={"ACL": "public-read", "ContentType": "application/json"},
+        skip_unchanged=not ctx.args.force_upload,
+        logger=log,
     )
-    log.info(f"Uploaded {tree_json_filename} to S3")
-    os.remove(tree_json_filename)
-    log.info(f"Removed local file {tree_json_filename}")
 
-    return downloads_df, df_posts_extended, section_df
 
-
-def step_glossary_terms():
+def step_glossary_terms(ctx):
     """Scraping Glossary and parsing terms"""
     log.info("🏭 Scraping Glossary and parsing terms")
 
-    # avoid info logging of litellm etc.
-    logging.getLogger().setLevel(logging.WARN)
-    term_df = get_terms(args.smoke_test, SMOKE_TEST_N, MAX_WORKERS * 6, lm)
+    # avoid info logging of litellm etc. (only for their loggers, other stages are still running)
+    for logger_name in NOISY_LOGGERS:
+        logging.getLogger(logger_name).setLevel(logging.WARN)
+    lm = make_lm()
+    term_df = get_terms(ctx.args.smoke_test, SMOKE_TEST_N, GLOSSARY_WORKERS, lm)
+    metrics.record_llm_usage(lm.history)
     term_df = term_df.cast(TermSchema.to_polars_schema())
-    logging.getLogger().setLevel(logging.INFO)
-    upload_to_s3(term_df, "glossary_terms", TermSchema.to_pyarrow_schema())
+    upload_to_s3(ctx, term_df, "glossary_terms", TermSchema)
     return term_df
 
+def upload_run_report(ctx, report):
+    """Upload the performance report of this run next to the parquet files"""
+    if ctx.args.smoke_test:
+        report_key = f"smoke_test_{run_report_path}"
+    else:
+        report_key = run_report_path
+    body = report.to_json().encode("utf-8")
+    # the latest report, plus one per run to compare runs over time
+    for key in [report_key, f"run_reports/{report.run_id}.json"]:
+        ctx.client.put_object(
+            Bucket=S3_BUCKET_NAME,
+            Key=key,
+            Body=body,
+            ContentType="application/json",
+            ACL="public-read",
+        )
+    log.info(f"Uploaded run report {report_key} to S3")
+
+
+def prune_spool(spool, validators, older_than=None):
+    """Delete spooled files that neither a download validator nor the checkpoint of any run references.
+
+    Files are only referenced by validators while their url serves them, so the files of
+    changed and removed downloads are deleted, as are those of deleted checkpoint runs.
+    """
+    keep = validators.digests() | spooled_digests(checkpoint_dir)
+    removed, removed_bytes = spool.prune(keep, older_than=older_than)
+    log.info(f"Pruned {removed} files ({removed_bytes / 2**20:.1f} MiB) from the spool, {len(keep)} are referenced")
+
+
 # Main pipeline execution
-step_functions = {
-    "student_council_committees": step_student_council_committees,
-    "svtipps": step_svtipps,
-    "legal_resources": step_legal_resources,
-    "publications": step_publications,
-    "downloads_and_posts_and_sections": step_downloads_and_posts_and_sections,
-    "glossary_terms": step_glossary_terms,
+# Each stage declares the artifacts it needs and produces, so independent stages run in parallel.
+# The former combined downloads/posts/sections step is split into sub-stages, which lets posts
+# be fetched while the selenium category crawl is still running.
+def build_stages(ctx):
+    step = lambda func: functools.partial(func, ctx)
+    # requests in flight at once, which the worker budget has to account for
+    download_workers = async_download_concurrency if ctx.args.download_backend == "asyncio" else MAX_WORKERS
+    return [
+        Stage("student_council_committees", step(step_student_council_committees), outputs=["student_council_committees"]),
+        Stage("svtipps", step(step_svtipps), outputs=["svtipps"]),
+        Stage("legal_resources", step(step_legal_resources), outputs=["legal_resources"]),
+        Stage("publications", step(step_publications), outputs=["publications"]),
+        Stage("category_tree", step(step_category_tree), outputs=["root_node"]),
+        Stage("file_links", step(step_file_links), inputs=["root_node"], outputs=["file_link_lst"], workers=MAX_WORKERS),
+        Stage("download_info", step(step_download_info), inputs=["file_link_lst", "root_node"], outputs=["downloads_df"], workers=download_workers),
+        Stage("posts_api", step(step_posts_api), outputs=["df_posts", "post_links"]),
+        Stage("post_analysis", step(step_post_analysis), inputs=["df_posts"], outputs=["post_columns", "section_records"], workers=MAX_WORKERS),
+        Stage("posts_extended", step(step_posts_extended), inputs=["df_posts", "post_columns", "post_links"], outputs=["df_posts_extended"]),
+        Stage("posts", step(step_posts), inputs=["df_posts_extended", "downloads_df", "root_node"], outputs=["posts"]),
+        Stage("downloads", step(step_downloads), inputs=["downloads_df", "posts", "root_node"], outputs=["downloads"]),
+        Stage("sections", step(step_sections), inputs=["df_posts", "section_records"], outputs=["sections"]),
+        Stage("downloads_tree", step(step_downloads_tree), inputs=["root_node"]),
+        Stage("glossary_terms", step(step_glossary_terms), outputs=["glossary_terms"], workers=GLOSSARY_WORKERS),
+    ]
+
+
+step_groups = {
+    "downloads_and_posts_and_sections": ["posts", "downloads", "sections", "downloads_tree"],
 }
 
-# Execute selected steps
-step_num = 1
-total_steps = len([name for name in table_names if name in steps_to_run])
 
-for table_name in table_names:
-    if table_name in steps_to_run:
-        log.info(f"[bold blue]🏭 Pipeline Stage {step_num}/{total_steps}: {table_name}", extra={"markup": True})
-        results = step_functions[table_name]()
-        step_num += 1
+def main(argv=None):
+    args = parse_arguments(argv)
+    html_parsing.set_parser(args.html_parser)
+
+    from dotenv import load_dotenv
+
+    load_dotenv()
+
+    logging.basicConfig(
+        level="INFO",
+        format="%(message)s",
+        datefmt="[%X]",
+        handlers=[RichHandler(rich_tracebacks=True)],
+    )
+
+    if args.prune_spool:
+        prune_spool(FileSpool(spool_dir), ValidatorStore(download_validators_path))
+        return
+
+    if args.smoke_test:
+        log.info("🚭 Smoke Test 🚭")
+
+    wp_user = os.getenv("WP_USER")
+    wp_pw = os.getenv("WP_PW")
+
+    assert wp_user and wp_pw, "WP_USER and WP_PW must be set in the environment variables"
+
+    # Validate and setup step selection
+    if args.steps:
+        invalid_steps = set(args.steps) - set(table_names)
+        if invalid_steps:
+            log.error(f"Invalid step names: {invalid_steps}")
+            log.error(f"Available steps: {table_names}")
+            exit(1)
+        steps_to_run = set(args.steps)
+        log.info(f"Running only selected steps: {sorted(steps_to_run)}")
     else:
-        log.info(f"[yellow]⏭️ Skipping: {table_name}", extra={"markup": True})
+        steps_to_run = set(table_names)
+        log.info("Running all pipeline steps")
 
-log.info("[bold blue]🎉🎉🎉 We are done 🎉🎉🎉", extra={"markup": True})
+    for table_name in table_names:
+        if table_name not in steps_to_run:
+            log.info(f"[yellow]⏭️ Skipping: {table_name}", extra={"markup": True})
 
+    if args.resume:
+        checkpoints = CheckpointStore.open_existing(checkpoint_dir, args.resume)
+        log.info(f"Resuming run {checkpoints.run_id}")
+    else:
+        run_id = new_run_id()
+        if args.smoke_test:
+            run_id = f"smoke_test_{run_id}"
+        checkpoints = CheckpointStore(checkpoint_dir, run_id)
+        log.info(f"Starting run {checkpoints.run_id}, resume with --resume {checkpoints.run_id}")
+
+    started_at = time.time()
+    report = RunReport(checkpoints.run_id)
+    uploader = BackgroundUploader(logger=log, report=report)
+    # the spool is shared by all runs: checkpoints reference its files, and unchanged downloads
+    # (304 Not Modified, see ValidatorStore) are reused from it
+    spool = FileSpool(spool_dir)
+    validators = ValidatorStore(download_validators_path)
+    ctx = PipelineContext(args, make_s3_client(), wp_user, wp_pw, uploader=uploader, spool=spool, validators=validators)
+
+    selected_stages = select_stages(
+        build_stages(ctx),
+        [stage for step in steps_to_run for stage in step_groups.get(step, [step])],
+    )
+    try:
+        try:
+            run_stages(
+                selected_stages,
+                worker_budget=args.worker_budget,
+                logger=log,
+                checkpoints=checkpoints,
+                report=report,
+            )
+        finally:
+            log.info("Waiting for uploads to finish")
+            try:
+                uploader.wait()
+            finally:
+                uploader.shutdown()
+                # a resumed run has to repeat the stages whose uploads failed
+                for stage_name in uploader.failed_stages:
+                    checkpoints.invalidate_stage(stage_name)
+    finally:
+        # also published for failed runs, they are the interesting ones
+        upload_run_report(ctx, report)
+
+    # files written since this run started are kept, a concurrent run may still be downloading them
+    prune_spool(spool, validators, older_than=started_at)
+
+    log.info("[bold blue]🎉🎉🎉 We are done 🎉🎉🎉", extra={"markup": True})
+
+
+if __name__ == "__main__":
+    main()
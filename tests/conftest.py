@@ -0,0 +1,106 @@
+import threading
+import http.server
+import urllib.parse
+import pytest
+
+
+class Request:
+    """A request received by a LocalServer"""
+
+    def __init__(self, method, path, headers, body, client_address):
+        self.method = method
+        self.path = path
+        self.headers = headers
+        self.body = body
+        self.client_address = client_address
+
+    @property
+    def query(self):
+        return urllib.parse.parse_qs(urllib.parse.urlsplit(self.path).query)
+
+    @property
+    def form(self):
+        return urllib.parse.parse_qs(self.body.decode())
+
+
+class LocalServer:
+    """HTTP server on a free local port, answering every GET and POST with `respond(request)`.
+
+    `respond` returns (status, headers, body). All requests are collected in `requests`.
+    """
+
+    def __init__(self, respond, protocol_version="HTTP/1.0"):
+        self.respond = respond
+        self.requests = []
+        local = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def handle_request(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                request = Request(self.command, self.path, dict(self.headers), self.rfile.read(length), self.client_address)
+                local.requests.append(request)
+                status, headers, body = local.respond(request)
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                if status != 304:
+                    self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                if body:
+                    self.wfile.write(body)
+
+            do_GET = do_POST = handle_request
+
+            def log_message(self, *args):
+                pass
+
+        Handler.protocol_version = protocol_version
+        self._server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self._server.server_port}"
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def shutdown(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class FileServer(LocalServer):
+    """Serves `body` with an ETag like the download host, answering If-None-Match with 304.
+
+    The first `fail_first` requests, and all requests while `down` is set, get a 503 with
+    `Retry-After: 0`.
+    """
+
+    def __init__(self, body, content_type="application/pdf", etag='"v1"', headers=None, fail_first=0):
+        self.body = body
+        self.etag = etag
+        self.headers = {"Content-Type": content_type, **({"ETag": etag} if etag else {}), **(headers or {})}
+        self.fail_first = fail_first
+        self.down = False
+        super().__init__(self._respond)
+
+    def _respond(self, request):
+        if self.down or len(self.requests) <= self.fail_first:
+            return 503, {"Retry-After": "0"}, b""
+        if self.etag and request.headers.get("If-None-Match") == self.etag:
+            return 304, {}, b""
+        return 200, self.headers, self.body
+
+
+@pytest.fixture
+def http_server():
+    """Starts local servers for a test and shuts them down afterwards.
+
+    `http_server(body, ...)` serves a file, see FileServer; `http_server(respond=...)` answers
+    with a function, see LocalServer.
+    """
+    servers = []
+
+    def start(body=None, respond=None, **kwargs):
+        server = LocalServer(respond, **kwargs) if respond is not None else FileServer(body, **kwargs)
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
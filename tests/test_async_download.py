@@ -0,0 +1,76 @@
+import time
+import asyncio
+import hashlib
+from lib import scraping
+from lib.async_download import _acquire
+from lib.rate_limit import HostLimiter
+from lib.models import DownloadCategoryNode
+from lib.spool import FileSpool
+from lib.validators import ValidatorStore
+
+LINKS = [{"data-category_id": "41", "data-id": str(i), "title": f"File {i}"} for i in range(3)]
+
+
+def category_tree():
+    root = DownloadCategoryNode("root", data_id="36", data_level="0")
+    DownloadCategoryNode("child", data_id="41", data_level="1", data_parent_id="36", parent=root)
+    return root
+
+
+def test_backends_return_identical_frames(http_server):
+    body = b"%PDF-1.4 " * 10000
+    base_url = http_server(body).url
+    frames = {
+        backend: scraping.extract_download_info(
+            LINKS, category_tree(), spool=FileSpool(), backend=backend, base_url=base_url
+        ).sort("data_id")
+        for backend in ["threads", "asyncio"]
+    }
+
+    assert frames["threads"].equals(frames["asyncio"])
+    assert frames["asyncio"]["file_sha256"].to_list() == [hashlib.sha256(body).hexdigest()] * 3
+    assert frames["asyncio"]["download_link"][0] == f"{base_url}/download/41/cat-id/0/data-id"
+
+
+def test_async_download_is_conditional(tmp_path, http_server):
+    server = http_server(b"%PDF-1.4 unchanged")
+    spool = FileSpool(str(tmp_path / "spool"))
+    validators = ValidatorStore(str(tmp_path / "validators.sqlite"))
+    for _ in range(2):
+        df = scraping.extract_download_info(
+            LINKS[:1], category_tree(), spool=spool, validators=validators, backend="asyncio", base_url=server.url
+        )
+
+    assert server.requests[1].headers["If-None-Match"] == '"v1"'
+    assert df["file_type"].to_list() == ["pdf"]
+    assert spool.read(df["file_sha256"][0]) == b"%PDF-1.4 unchanged"
+
+
+def test_async_download_retries_overloaded_server(http_server):
+    server = http_server(b"%PDF-1.4 after a 503", fail_first=2)
+    df = scraping.extract_download_info(LINKS[:1], category_tree(), spool=FileSpool(), backend="asyncio", base_url=server.url)
+
+    assert len(server.requests) == 3
+    assert df["file_type"].to_list() == ["pdf"]
+
+
+def test_cancelled_acquire_releases_its_slot():
+    limiter = HostLimiter("host", rate=1000, burst=1000, initial_window=1, max_window=1)
+    limiter.acquire()
+
+    async def cancel_waiter():
+        waiter = asyncio.create_task(_acquire(limiter))
+        await asyncio.sleep(0.05)
+        waiter.cancel()
+        # the waiting thread takes the slot only now
+        limiter.release()
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            pass
+
+    asyncio.run(cancel_waiter())
+    deadline = time.monotonic() + 2
+    while limiter.in_flight and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert limiter.in_flight == 0
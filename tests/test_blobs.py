@@ -0,0 +1,100 @@
+import hashlib
+import polars as pl
+from botocore.exceptions import ClientError
+from lib.blobs import externalize_binaries, externalize_spooled_binaries, externalized_schema, BlobResolver, blob_key
+from lib.models import DownloadSchema
+from lib.spool import FileSpool
+
+
+class FakeS3Client:
+    def __init__(self):
+        self.objects = {}
+        self.puts = []
+
+    def head_object(self, Bucket, Key):
+        if Key not in self.objects:
+            raise ClientError({"Error": {"Code": "404"}}, "HeadObject")
+        return {}
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self.puts.append(Key)
+        self.objects[Key] = Body.read()
+
+
+class FakeResponse:
+    def __init__(self, content):
+        self.content = content
+
+    def raise_for_status(self):
+        pass
+
+
+class FakeSession:
+    def __init__(self, objects):
+        self.objects = objects
+        self.requested = []
+
+    def get(self, url, **kwargs):
+        self.requested.append(url)
+        return FakeResponse(self.objects[url.removeprefix("https://bucket/")])
+
+
+def test_identical_binaries_are_stored_once():
+    client = FakeS3Client()
+    df = pl.DataFrame(
+        {"data_id": [1, 2, 3], "file_binary": [b"same", b"same", None], "file_type": ["pdf"] * 3}
+    )
+    external = externalize_binaries(df, "file_binary", client, "bucket")
+
+    digest = hashlib.sha256(b"same").hexdigest()
+    assert client.puts == [blob_key(digest)]
+    assert external.columns == ["data_id", "file_sha256", "file_size", "file_key", "file_type"]
+    assert external["file_sha256"].to_list() == [digest, digest, None]
+    assert external["file_size"].to_list() == [4, 4, None]
+
+    # a second run finds the blob and uploads nothing
+    externalize_binaries(df, "file_binary", client, "bucket")
+    assert len(client.puts) == 1
+
+
+def test_spooled_binaries_are_uploaded_from_disk():
+    client = FakeS3Client()
+    spool = FileSpool()
+    same = spool.write_chunks([b"same"])
+    other = spool.write_chunks([b"other"])
+    df = pl.DataFrame(
+        {
+            "data_id": [1, 2, 3, 4],
+            "file_sha256": [same.sha256, same.sha256, other.sha256, None],
+            "file_size": [4, 4, 5, None],
+            "file_type": ["pdf"] * 4,
+        }
+    )
+    external = externalize_spooled_binaries(df, "file_binary", spool, client, "bucket")
+
+    assert sorted(client.puts) == sorted([blob_key(same.sha256), blob_key(other.sha256)])
+    assert client.objects[blob_key(other.sha256)] == b"other"
+    assert external.columns == ["data_id", "file_sha256", "file_size", "file_key", "file_type"]
+    assert external["file_key"].to_list() == [blob_key(same.sha256), blob_key(same.sha256), blob_key(other.sha256), None]
+
+
+def test_externalized_schema_replaces_binary_fields():
+    schema = externalized_schema(DownloadSchema)
+    names = schema.to_pyarrow_schema().names
+    assert "file_binary" not in names
+    assert {"file_sha256", "file_size", "file_key"} <= set(names)
+    # the small rows of the metadata table use the default row groups
+    assert "row_group_size" not in schema.to_parquet_write_options()
+
+
+def test_resolver_fetches_lazily():
+    client = FakeS3Client()
+    df = pl.DataFrame({"data_id": [1, 2], "file_binary": [b"a", b"b"]})
+    external = externalize_binaries(df, "file_binary", client, "bucket")
+    session = FakeSession(client.objects)
+    resolver = BlobResolver("https://bucket/", session=session)
+
+    lazy = resolver.with_binaries(external, "file_binary")
+    assert session.requested == []
+    assert lazy.collect()["file_binary"].to_list() == [b"a", b"b"]
+    assert len(session.requested) == 2
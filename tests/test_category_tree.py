@@ -0,0 +1,69 @@
+import polars as pl
+from lib.models import DownloadCategoryNode
+from lib.tree_functions import (
+    CategoryTree,
+    add_associated_downloads,
+    add_associated_posts,
+    category_closure,
+    category_tree,
+    find_node_by_id,
+    get_node_lst,
+    tree_to_json,
+)
+
+
+def sample_tree():
+    root = DownloadCategoryNode("SV-Archiv", data_id="36", data_level="0")
+    a = DownloadCategoryNode("A", data_id="41", data_level="1", data_parent_id="36", parent=root)
+    DownloadCategoryNode("A1", data_id="42", data_level="2", data_parent_id="41", parent=a)
+    DownloadCategoryNode("A2", data_id="43", data_level="2", data_parent_id="41", parent=a)
+    DownloadCategoryNode("B", data_id="50", data_level="1", data_parent_id="36", parent=root)
+    return root
+
+
+def test_preorder_and_subtree_intervals():
+    tree = CategoryTree.from_anytree(sample_tree())
+    assert tree.ids == ["36", "41", "42", "43", "50"]
+    assert list(tree.ends) == [5, 4, 3, 4, 5]
+    assert tree.subtree_ids("41") == ["41", "42", "43"]
+    assert tree.subtree_ids("50") == ["50"]
+    assert tree.subtree_ids("99") == []
+    assert tree.is_descendant("43", "41")
+    assert tree.is_descendant("41", "41")
+    assert not tree.is_descendant("50", "41")
+    assert tree.parent_id("42") == "41"
+    assert tree.parent_id("36") is None
+    assert tree.name("50") == "B"
+
+
+def test_lookups_match_anytree():
+    root = sample_tree()
+    assert find_node_by_id(root, "43") is root.children[0].children[1]
+    assert find_node_by_id(root, "99") is None
+    assert get_node_lst(root) == ["36", "41", "42", "43", "50"]
+    assert category_tree(root) is category_tree(root)
+
+
+def test_anytree_roundtrip():
+    root = sample_tree()
+    assert tree_to_json(CategoryTree.from_anytree(root).to_anytree()) == tree_to_json(root)
+
+
+def test_associations_follow_the_whole_subtree():
+    root = sample_tree()
+    posts = pl.DataFrame({"id": [1, 2, 3, 4], "download_chapter_dedicated": [41, None, 42, 77]})
+    downloads = pl.DataFrame({"data_id": [10, 11, 12, 13, 14], "data_category_id": [43, 42, 50, 41, 77]})
+
+    posts_out = add_associated_downloads(posts, downloads, root)
+    downloads_out = add_associated_posts(downloads, posts, root)
+
+    # 41 is not a direct child of the root, its descendants are still found
+    assert posts_out["associated_downloads"].to_list() == [[10, 11, 13], None, [11], [14]]
+    assert downloads_out["associated_posts"].to_list() == [[1], [1, 3], None, [1], [4]]
+    assert posts_out.columns == ["id", "download_chapter_dedicated", "associated_downloads"]
+
+
+def test_closure_contains_each_category_with_its_descendants():
+    closure = category_closure(sample_tree())
+    assert sorted(closure.filter(pl.col("ancestor_id") == 41)["descendant_id"].to_list()) == [41, 42, 43]
+    assert len(closure) == 5 + 4 + 2
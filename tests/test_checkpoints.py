@@ -0,0 +1,63 @@
+import polars as pl
+from lib.checkpoints import CheckpointStore
+from lib.models import DownloadCategoryNode
+from lib.scheduler import Stage, run_stages
+
+
+def test_checkpoint_roundtrip(tmp_path):
+    store = CheckpointStore(tmp_path, "run")
+    root = DownloadCategoryNode("root", data_id="36", data_level="0")
+    DownloadCategoryNode("child", data_id="41", data_level="1", data_parent_id="36", parent=root)
+    df = pl.DataFrame({"id": [1, 2], "blob": [b"a", b"b"]})
+    links = [{"data-id": "1", "data-category_id": "41", "title": "x"}]
+
+    store.save_stage("a", {"root_node": root, "df": df, "links": links})
+
+    reopened = CheckpointStore.open_existing(tmp_path, "run")
+    assert reopened.is_completed("a")
+    assert reopened.load("df").equals(df)
+    assert reopened.load("links") == links
+    tree = reopened.load("root_node")
+    assert isinstance(tree, DownloadCategoryNode)
+    assert tree.children[0].data_id == "41"
+
+
+def test_resume_skips_completed_stages(tmp_path):
+    calls = []
+
+    def produce():
+        calls.append("a")
+        return pl.DataFrame({"x": [1, 2, 3]})
+
+    def fail(df):
+        raise RuntimeError("boom")
+
+    def consume(df):
+        calls.append("b")
+        return df["x"].sum()
+
+    store = CheckpointStore(tmp_path, "run")
+    try:
+        run_stages(
+            [Stage("a", produce, outputs=["df"]), Stage("b", fail, inputs=["df"], outputs=["s"])],
+            worker_budget=2,
+            checkpoints=store,
+        )
+    except RuntimeError:
+        pass
+
+    resumed = CheckpointStore.open_existing(tmp_path, "run")
+    artifacts = run_stages(
+        [Stage("a", produce, outputs=["df"]), Stage("b", consume, inputs=["df"], outputs=["s"])],
+        worker_budget=2,
+        checkpoints=resumed,
+    )
+    assert artifacts["s"] == 6
+    assert calls == ["a", "b"]
+
+
+def test_invalidated_stage_is_not_completed(tmp_path):
+    store = CheckpointStore(tmp_path, "run")
+    store.save_stage("posts", {"posts": pl.DataFrame({"id": [1]})})
+    store.invalidate_stage("posts")
+    assert not CheckpointStore.open_existing(tmp_path, "run").is_completed("posts")
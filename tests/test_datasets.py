@@ -0,0 +1,67 @@
+import json
+import polars as pl
+import pyarrow as pa
+import pyarrow.parquet as pq
+from test_s3_streaming_upload import FakeS3Client
+from lib.datasets import upload_dataset, partition_frame
+from lib.models import PostSchema, LegalResourceSchema
+
+
+class FakePaginator:
+    def __init__(self, objects):
+        self.objects = objects
+
+    def paginate(self, Bucket, Prefix):
+        yield {"Contents": [{"Key": key} for key in self.objects if key.startswith(Prefix)]}
+
+
+class FakeListingS3Client(FakeS3Client):
+    def get_paginator(self, name):
+        return FakePaginator(list(self.objects))
+
+    def delete_object(self, Bucket, Key):
+        del self.objects[Key]
+
+
+def legal_df(jurisdictions):
+    return pl.DataFrame(
+        {
+            "url": [f"https://x/{i}" for i in range(len(jurisdictions))],
+            "type": ["law"] * len(jurisdictions),
+            "title": ["t"] * len(jurisdictions),
+            "html": ["<p></p>"] * len(jurisdictions),
+            "jurisdiction": jurisdictions,
+        }
+    ).cast(LegalResourceSchema.to_polars_schema())
+
+
+def test_dataset_is_partitioned_with_manifest():
+    client = FakeListingS3Client()
+    upload_dataset(client, legal_df(["DE_BY", "DE_BE", "DE_BY"]), LegalResourceSchema, "bucket", "legal_resources")
+
+    manifest = json.loads(client.objects["legal_resources/manifest.json"][0])
+    assert manifest["rows"] == 3
+    assert [(f["key"], f["rows"]) for f in manifest["files"]] == [
+        ("legal_resources/jurisdiction=DE_BE/part-0.parquet", 1),
+        ("legal_resources/jurisdiction=DE_BY/part-0.parquet", 2),
+    ]
+    assert manifest["files"][1]["statistics"]["url"] == {"min": "https://x/0", "max": "https://x/2"}
+    part = pq.read_table(pa.BufferReader(client.objects["legal_resources/jurisdiction=DE_BY/part-0.parquet"][0]))
+    assert "jurisdiction" not in part.column_names
+    assert part.num_rows == 2
+
+
+def test_stale_partitions_are_deleted():
+    client = FakeListingS3Client()
+    upload_dataset(client, legal_df(["DE_BY", "DE_BE"]), LegalResourceSchema, "bucket", "legal_resources")
+    upload_dataset(client, legal_df(["DE_BY"]), LegalResourceSchema, "bucket", "legal_resources")
+    assert "legal_resources/jurisdiction=DE_BE/part-0.parquet" not in client.objects
+    assert "legal_resources/jurisdiction=DE_BY/part-0.parquet" in client.objects
+
+
+def test_posts_are_bucketed_by_id():
+    df = pl.DataFrame({"id": list(range(20))})
+    parts = partition_frame(df, PostSchema)
+    assert len(parts) == PostSchema.bucket_by[1]
+    for partition, part in parts:
+        assert (part["id"] % PostSchema.bucket_by[1] == partition["id_bucket"]).all()
@@ -0,0 +1,184 @@
+import json
+import urllib.parse
+from lib import scraping
+from lib.metrics import RunReport
+from lib.scraping import BrowserSession, WPFDClient
+from lib.tree_functions import build_category_tree
+
+CATEGORIES = {
+    "41": '<div class="wpfd-content" data-category="41">'
+    '<a class="wpfd-file-link" data-category_id="41" data-id="1" title="a"></a></div>',
+    "42": '<div class="wpfd-content" data-category="42">'
+    '<a class="wpfd-file-link" data-category_id="42" data-id="2" title="b"></a>'
+    '<a class="wpfd-file-link" data-category_id="42" data-id="3" title="c"></a></div>',
+    "43": '<div class="wpfd-content" data-category="43"><p>Keine Dateien</p></div>',
+}
+SPINNER = '<div class="wpfd-loading"></div>'
+
+
+class FakeDriver:
+    """Renders the category of the URL hash into the container after a few polls, like the WP File Download script"""
+
+    def __init__(self, render_after=3, spinner=False):
+        self.render_after = render_after
+        self.spinner = spinner
+        self.html = None
+        self.pending = None
+        self.polls = 0
+        self.loads = 0
+        self.ignore_hash = False
+
+    def get(self, url):
+        if "#36-" in url:
+            self.loads += 1
+            self.html = ""
+            self.navigate(url.split("#36-")[1])
+
+    def navigate(self, category_id):
+        self.pending = category_id
+        self.polls = 0
+        if self.spinner:
+            self.html = SPINNER
+
+    def execute_script(self, script, *args):
+        if "location.hash" in script:
+            if not self.ignore_hash:
+                    self.navigate(args[0].removeprefix("36-"))
+            return None
+        self.polls += 1
+        if self.pending is not None and self.polls >= self.render_after:
+            self.html, self.pending = CATEGORIES[self.pending], None
+        ids = [id_ for id_ in CATEGORIES if f'data-category_id="{id_}"' in self.html]
+        category = next((id_ for id_ in CATEGORIES if f'data-category="{id_}"' in self.html), None)
+        return {"html": self.html, "ids": ids, "category": category}
+
+    def quit(self):
+        pass
+
+
+def fake_session(driver):
+    session = BrowserSession(timeout=2, hash_timeout=2)
+    session._start = lambda: setattr(session, "driver", driver)
+    return session
+
+
+def test_session_moves_between_categories_via_hash():
+    driver = FakeDriver()
+    session = fake_session(driver)
+    report = RunReport("run")
+    with report.track("file_links"):
+        links = {id_: session.file_links(id_) for id_ in ["41", "42", "43", "41"]}
+
+    assert driver.loads == 1
+    assert report.to_dict()["stages"]["file_links"]["selenium_hash_navigations"] == 3
+    assert [a["data-id"] for a in links["42"]] == ["2", "3"]
+    assert links["43"] == []
+    assert [a["data-id"] for a in links["41"]] == ["1"]
+
+
+def test_unchanged_container_falls_back_to_full_load():
+    driver = FakeDriver()
+    session = fake_session(driver)
+    session.file_links("41")
+    # the page does not react to the hash change
+    driver.ignore_hash = True
+    assert [a["data-id"] for a in session.file_links("42")] == ["2", "3"]
+    assert driver.loads == 2
+
+
+def test_loading_spinner_is_not_taken_for_an_empty_folder():
+    driver = FakeDriver(spinner=True)
+    session = fake_session(driver)
+    assert [a["data-id"] for a in session.file_links("41")] == ["1"]
+    assert session.file_links("43") == []
+    assert [a["data-id"] for a in session.file_links("42")] == ["2", "3"]
+    assert driver.loads == 1
+
+
+def test_get_file_links_reuses_one_session_per_worker(monkeypatch):
+    drivers = []
+
+    def start(session):
+        session.driver = FakeDriver(render_after=1)
+        drivers.append(session.driver)
+
+    monkeypatch.setattr(BrowserSession, "_start", start)
+    links = scraping.get_file_links(["41", "42", "43"], max_workers=1, backend="selenium")
+
+    assert len(drivers) == 1
+    assert sorted(a["data-id"] for a in links) == ["1", "2", "3"]
+
+
+CATEGORIES_LIST = """
+<ol id="categorieslist" class="dd-list">
+  <li data-id="36" data-level="0" data-parent-id="0"><span class="title">SV-Archiv</span>
+    <ol class="dd-list"><li data-id="41" data-level="1" data-parent-id="36"><span class="title">Satzungen</span></li></ol>
+  </li>
+</ol>
+"""
+
+
+def wordpress(fail_file_lists=False, file_list_payload=None):
+    """Stand-in for the wp-login, wp-admin and admin-ajax endpoints of WP File Download"""
+
+    def respond(request):
+        cookies = request.headers.get("Cookie", "")
+        if request.method == "POST":
+            headers = {"Location": "/wp-admin/"}
+            if request.form["pwd"] == ["secret"] and "wordpress_test_cookie" in cookies:
+                headers["Set-Cookie"] = "wordpress_logged_in_abc=user; Path=/"
+            return 302, headers, b""
+        path, query = urllib.parse.urlsplit(request.path).path, request.query
+        if path == "/wp-admin/":
+            return 200, {"Content-Type": "text/html"}, b"<html></html>"
+        if path == "/wp-admin/admin.php" and "wordpress_logged_in" in cookies:
+            return 200, {"Content-Type": "text/html"}, CATEGORIES_LIST.encode()
+        if path == "/wp-admin/admin-ajax.php" and query["task"] == ["files.display"] and not fail_file_lists:
+            files = [{"ID": 7, "catid": int(query["id"][0]), "post_title": "Satzung", "linkdownload": "x"}]
+            payload = {"files": files} if file_list_payload is None else file_list_payload
+            return 200, {"Content-Type": "application/json"}, json.dumps(payload).encode()
+        return 403, {}, b""
+
+    return respond
+
+
+def test_http_backend_builds_category_tree_and_links(http_server):
+    base_url = http_server(respond=wordpress()).url
+    soup = scraping.get_download_soup("user", "secret", backend="http", base_url=base_url)
+    links = scraping.get_file_links(["41"], backend="http", base_url=base_url)
+
+    root = build_category_tree(soup)
+    assert (root.name, root.data_id) == ("SV-Archiv", "36")
+    assert [(child.name, child.data_id, child.data_parent_id) for child in root.children] == [("Satzungen", "41", "36")]
+    assert [dict(link.attrs) for link in links] == [
+        {"class": ["wpfd-file-link"], "data-category_id": "41", "data-id": "7", "title": "Satzung", "href": "x"}
+    ]
+
+
+def test_failed_login_is_reported(http_server):
+    client = WPFDClient(http_server(respond=wordpress()).url)
+    try:
+        client.login("user", "wrong")
+        assert False, "login should fail"
+    except Exception as e:
+        assert "login failed" in str(e)
+
+
+def test_http_file_listing_falls_back_to_selenium(monkeypatch, http_server):
+    monkeypatch.setattr(BrowserSession, "file_links", lambda self, category_id: [f"selenium {category_id}"])
+    base_url = http_server(respond=wordpress(fail_file_lists=True)).url
+    links = scraping.get_file_links(["41", "42"], backend="http", base_url=base_url)
+    assert sorted(links) == ["selenium 41", "selenium 42"]
+
+
+def test_unexpected_file_list_falls_back_to_selenium(monkeypatch, http_server):
+    monkeypatch.setattr(BrowserSession, "file_links", lambda self, category_id: [f"selenium {category_id}"])
+    for payload in [{"success": False}, {"data": []}, []]:
+        base_url = http_server(respond=wordpress(file_list_payload=payload)).url
+        links = scraping.get_file_links(["41"], backend="http", base_url=base_url)
+        assert links == ["selenium 41"]
+
+
+def test_category_without_files_is_empty(http_server):
+    base_url = http_server(respond=wordpress(file_list_payload={"files": []})).url
+    assert WPFDClient(base_url).file_links("41") == []
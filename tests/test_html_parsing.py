@@ -0,0 +1,50 @@
+import os
+import logging
+import polars as pl
+import pytest
+from lib import html_parsing, post_parsing
+from lib.post_parsing import PostAnalysis, process_widget
+from lib.transcripts import TranscriptIndex
+
+FIXTURE = os.path.join(os.path.dirname(__file__), "fixtures", "elementor_post.html")
+logger = logging.getLogger(__name__)
+
+
+@pytest.fixture
+def content(monkeypatch):
+    transcripts = pl.DataFrame(
+        {"url_medium": ["https://www.youtube.com/embed/ZqFnl5tJi7o"], "url_transkript": ["https://t/1"]}
+    )
+    monkeypatch.setattr(post_parsing, "get_transcript_index", lambda: TranscriptIndex(transcripts))
+    with open(FIXTURE) as f:
+        return f.read()
+
+
+def analyze(content, parser, monkeypatch):
+    monkeypatch.setattr(html_parsing, "_parser", parser)
+    return PostAnalysis(content)
+
+
+@pytest.mark.parametrize("parser", [p for p in html_parsing.PARSERS if p != "html.parser"])
+def test_process_widget_output_is_identical_across_parsers(content, parser, monkeypatch):
+    reference = analyze(content, "html.parser", monkeypatch)
+    other = analyze(content, parser, monkeypatch)
+
+    assert len(other.widgets) == len(reference.widgets)
+    for expected, widget in zip(reference.widgets, other.widgets):
+        assert process_widget(widget, "Wahlen", 1, logger) == process_widget(expected, "Wahlen", 1, logger)
+    for column in ["download_chapters_further", "book_chapter", "related_links", "download_chapter_dedicated"]:
+        assert getattr(other, column) == getattr(reference, column)
+
+
+def test_unknown_parser_is_rejected():
+    with pytest.raises(ValueError):
+        html_parsing.set_parser("html5")
+
+
+def test_parser_is_chosen_in_one_place(monkeypatch):
+    monkeypatch.setattr(html_parsing, "_parser", "lxml")
+    # lxml wraps fragments into a document
+    assert html_parsing.parse_html("<p>a</p>").find("body") is not None
+    monkeypatch.setattr(html_parsing, "_parser", "html.parser")
+    assert html_parsing.parse_html("<p>a</p>").find("body") is None
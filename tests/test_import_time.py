@@ -0,0 +1,43 @@
+import os
+import subprocess
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Generous enough for slow CI machines, but far below what importing dspy, dlt or seaborn costs
+IMPORT_TIME_BUDGET_S = 3.0
+
+HEAVY_MODULES = ["dspy", "dlt", "boto3", "seaborn", "matplotlib", "selenium", "litellm"]
+
+
+def run_python(code):
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=REPO_ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return result.stdout, time.perf_counter() - start
+
+
+def test_imports_do_not_load_heavy_dependencies():
+    stdout, _ = run_python(
+        "import sys, pipeline, lib.scraping, lib.post_parsing, lib.legal_res_helpers, lib.pulication_helpers; "
+        f"print([m for m in {HEAVY_MODULES!r} if m in sys.modules])"
+    )
+    assert stdout.strip() == "[]"
+
+
+def test_transcripts_are_not_downloaded_on_import():
+    stdout, _ = run_python(
+        "import lib.post_parsing as pp; print(pp.get_transcript_df.cache_info().currsize)"
+    )
+    assert stdout.strip() == "0"
+
+
+def test_pipeline_import_time_budget():
+    _, elapsed = run_python("import pipeline")
+    assert elapsed < IMPORT_TIME_BUDGET_S, f"Importing pipeline took {elapsed:.2f}s"
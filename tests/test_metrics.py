@@ -0,0 +1,66 @@
+import json
+import polars as pl
+import pytest
+from lib import metrics
+from lib.metrics import RunReport, ContextThreadPoolExecutor
+from lib.scheduler import Stage, run_stages
+
+
+def test_counters_reach_stage_from_worker_threads():
+    def work():
+        with ContextThreadPoolExecutor(max_workers=3) as executor:
+            for _ in range(5):
+                executor.submit(metrics.incr, "http_requests")
+        with metrics.phase("parse"):
+            metrics.incr("selenium_page_loads", 2)
+        return pl.DataFrame({"a": [1, 2, 3]})
+
+    report = RunReport("run")
+    run_stages([Stage("work", work, outputs=["df"])], worker_budget=2, report=report)
+
+    stage = json.loads(report.to_json())["stages"]["work"]
+    assert stage["status"] == "succeeded"
+    assert stage["rows"] == 3
+    assert stage["http_requests"] == 5
+    assert stage["selenium_page_loads"] == 2
+    assert "parse" in stage["phases_wall_time_s"]
+    assert stage["wall_time_s"] >= 0
+    assert stage["peak_rss_mb"] > 0
+
+
+def test_rows_are_counted_per_output():
+    def work():
+        return pl.DataFrame({"a": [1, 2, 3]}), [{"link": "x"}]
+
+    report = RunReport("run")
+    run_stages([Stage("work", work, outputs=["posts", "links"])], worker_budget=1, report=report)
+
+    stage = report.to_dict()["stages"]["work"]
+    assert stage["rows"] == 3
+    assert stage["output_rows"] == {"posts": 3, "links": 1}
+
+
+def test_failed_stage_is_reported():
+    def fail():
+        raise RuntimeError("boom")
+
+    report = RunReport("run")
+    with pytest.raises(RuntimeError):
+        run_stages([Stage("fail", fail)], worker_budget=1, report=report)
+    assert report.to_dict()["stages"]["fail"]["status"] == "failed"
+
+
+def test_llm_usage():
+    report = RunReport("run")
+    with report.track("glossary"):
+        metrics.record_llm_usage(
+            [{"usage": {"prompt_tokens": 10, "completion_tokens": 5}}, {"usage": {}}]
+        )
+    stage = report.to_dict()["stages"]["glossary"]
+    assert stage["llm_calls"] == 2
+    assert stage["llm_prompt_tokens"] == 10
+    assert stage["llm_completion_tokens"] == 5
+
+
+def test_incr_outside_stage_is_ignored():
+    metrics.incr("http_requests")
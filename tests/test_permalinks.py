@@ -0,0 +1,88 @@
+import json
+import logging
+import polars as pl
+from lib.metrics import RunReport
+from lib.permalinks import PermalinkIndex, fetch_post_ids_by_slug, permalink_path, permalink_slug
+from lib.post_parsing import resolve_related_links
+
+logger = logging.getLogger(__name__)
+
+post_links = pl.DataFrame(
+    {
+        "id": [4791, 6848, 7022],
+        "link": [
+            "https://meinsvwissen.de/das-abc-des-guten-teamgefuehls/",
+            "https://meinsvwissen.de/sv-fahrt/",
+            "https://meinsvwissen.de/andere-schulformen/",
+        ],
+        "slug": ["das-abc-des-guten-teamgefuehls", "sv-fahrt", "andere-schulformen"],
+    }
+)
+
+
+def posts_endpoint(posts):
+    """WP posts endpoint answering `?slug=a,b,c` with the matching posts"""
+
+    def respond(request):
+        slugs = request.query["slug"][0].split(",")
+        body = json.dumps([{"id": posts[slug], "slug": slug} for slug in slugs if slug in posts]).encode()
+        return 200, {"Content-Type": "application/json"}, body
+
+    return respond
+
+
+def requested_slugs(server):
+    return [request.query["slug"][0].split(",") for request in server.requests]
+
+
+def test_permalinks_are_normalized():
+    assert permalink_path("https://www.meinsvwissen.de/SV-Fahrt/?x=1#top") == "meinsvwissen.de/sv-fahrt"
+    assert permalink_path("meinsvwissen.de/sv-fahrt") == "meinsvwissen.de/sv-fahrt"
+    assert permalink_slug("https://meinsvwissen.de/gr%C3%BCnde/") == "gründe"
+
+
+def test_index_lookup():
+    index = PermalinkIndex(post_links)
+    assert len(index) == 3
+    assert index.lookup("https://meinsvwissen.de/sv-fahrt/") == 6848
+    assert index.lookup("http://www.meinsvwissen.de/sv-fahrt") == 6848
+    # the slug also matches links with another path, e.g. from before a permalink change
+    assert index.lookup("https://meinsvwissen.de/2023/05/andere-schulformen/") == 7022
+    assert index.lookup("https://meinsvwissen.de/?p=5764") == 5764
+    assert index.lookup("https://meinsvwissen.de/unbekannt/") is None
+
+
+def test_slugs_are_fetched_in_batches(http_server):
+    server = http_server(respond=posts_endpoint({"a": 1, "b": 2, "c": 3}))
+    found = fetch_post_ids_by_slug(["c", "b", "a", "x", "a"], api_url=server.url, batch_size=2)
+    assert found == {"a": 1, "b": 2, "c": 3}
+    assert requested_slugs(server) == [["a", "b"], ["c", "x"]]
+
+
+def test_related_links_are_resolved_from_the_index(http_server):
+    server = http_server(respond=posts_endpoint({"wahl-der-schulsprecherin": 5286}))
+    df = pl.DataFrame(
+        {
+            "id": [7022, 4791, 6848],
+            "related_links": [
+                [
+                    "https://meinsvwissen.de/sv-fahrt/",
+                    "https://meinsvwissen.de/andere-schulformen/",
+                    "https://meinsvwissen.de/wahl-der-schulsprecherin/",
+                    "https://meinsvwissen.de/unbekannt/",
+                ],
+                [],
+                None,
+            ],
+        }
+    )
+    with RunReport("run").track("posts_extended") as stage:
+        resolved = resolve_related_links(df, post_links, logger, api_url=server.url)
+
+    assert resolved.columns == ["id", "related_posts"]
+    assert resolved["related_posts"].dtype == pl.List(pl.Int32)
+    # without the self-reference and the unknown link
+    assert resolved["related_posts"].to_list() == [[6848, 5286], [], []]
+    # one batched request for both links that are not in the index
+    assert requested_slugs(server) == [["unbekannt", "wahl-der-schulsprecherin"]]
+    assert stage.counters["related_links_indexed"] == 2
@@ -0,0 +1,88 @@
+import os
+import logging
+import polars as pl
+import pytest
+from lib import post_parsing
+from lib.metrics import RunReport
+from lib.transcripts import TranscriptIndex
+from lib.post_parsing import PostAnalysis, analyze_posts
+
+FIXTURE = os.path.join(os.path.dirname(__file__), "fixtures", "elementor_post.html")
+logger = logging.getLogger(__name__)
+
+
+@pytest.fixture
+def row(monkeypatch):
+    transcripts = pl.DataFrame(
+        {"url_medium": ["https://www.youtube.com/embed/ZqFnl5tJi7o"], "url_transkript": ["https://t/1"]}
+    )
+    monkeypatch.setattr(post_parsing, "get_transcript_index", lambda: TranscriptIndex(transcripts))
+    with open(FIXTURE) as f:
+        return {"id": 1, "title": "Wahlen", "content": f.read()}
+
+
+def test_analysis_derives_all_post_columns(row):
+    analysis = PostAnalysis(row["content"])
+    assert analysis.download_chapters_further == [41, 57]
+    assert analysis.book_chapter == "https://meinsvwissen.de/buch/kapitel-3/"
+    assert analysis.download_chapter_dedicated == 156
+    assert analysis.related_links == [
+        "https://meinsvwissen.de/sv-und-schulkonferenz/",
+        "https://meinsvwissen.de/sv-fahrt/",
+        "https://meinsvwissen.de/wahl-der-schulsprecherin/",
+    ]
+    sections = analysis.sections(row["title"], row["id"], logger)
+    assert [section["type"] for section in sections] == [
+        "plain_text",
+        "accordion_section_text",
+        "accordion_section_text",
+        "accordion_section_youtube",
+        "accordion_section_image",
+        "accordion_section_image",
+        "accordion_section_quiz",
+        "image",
+    ]
+    assert sections[3]["transcript_url"] == "https://t/1"
+
+
+def test_row_functions_are_views_of_the_analysis(row):
+    analysis = PostAnalysis(row["content"])
+    assert post_parsing.extract_book_chapter_row(row) == analysis.book_chapter
+    assert post_parsing.extract_dedicated_download_chapter_id_row(row, None) == analysis.download_chapter_dedicated
+    assert post_parsing.extract_sections(row, logger) == analysis.sections(row["title"], row["id"], logger)
+    df = post_parsing.extract_further_download_category_ids(pl.DataFrame([row]))
+    assert df["download_chapters_further"].to_list() == [analysis.download_chapters_further]
+
+
+def test_analyze_posts_parses_each_post_once(row, monkeypatch):
+    parses = []
+    original = post_parsing.parse_html
+    monkeypatch.setattr(post_parsing, "parse_html", lambda markup: parses.append(1) or original(markup))
+
+    columns, sections = analyze_posts(pl.DataFrame([row, {**row, "id": 2}]), logger, max_workers=2, mode="threads")
+
+    assert len(parses) == 2
+    assert columns["id"].to_list() == [1, 2]
+    assert columns["download_chapter_dedicated"].to_list() == [156, 156]
+    assert columns["related_links"].list.len().to_list() == [3, 3]
+    assert sorted({section["post_id"] for section in sections}) == [1, 2]
+
+
+def test_process_pool_matches_threads_and_reports_workers(row):
+    # the fixture has a video widget, whose transcript is looked up in the index of this process;
+    # spawned workers do not see the monkeypatch and must get the index from here
+    df = pl.DataFrame([{**row, "id": i, "title": f"Post {i}"} for i in range(10)])
+
+    report = RunReport("run")
+    with report.track("post_analysis"):
+        in_processes = analyze_posts(df, logger, max_workers=2, mode="processes", batch_size=3)
+    in_threads = analyze_posts(df, logger, max_workers=2, mode="threads", batch_size=3)
+
+    assert in_processes[0].equals(in_threads[0])
+    assert in_processes[1] == in_threads[1]
+    assert in_processes[0]["id"].to_list() == list(range(10))
+    transcripts = [section["transcript_url"] for section in in_processes[1] if "youtube" in section["type"]]
+    assert transcripts == ["https://t/1"] * 10
+    workers = report.to_dict()["stages"]["post_analysis"]["workers"]
+    assert sum(worker["rows"] for worker in workers.values()) == 10
+    assert all(name.startswith("SpawnProcess") for name in workers)
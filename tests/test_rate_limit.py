@@ -0,0 +1,93 @@
+import time
+import threading
+import pytest
+from lib.rate_limit import HostLimiter, parse_retry_after, limiter_for, limited_get
+
+
+class FakeResponse:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+def test_window_grows_on_success_and_halves_on_errors():
+    limiter = HostLimiter("host", rate=100, burst=100, initial_window=2, max_window=4)
+    for _ in range(10):
+        with limiter.slot() as slot:
+            slot.record(FakeResponse(200))
+    assert limiter.window == 4
+
+    with limiter.slot() as slot:
+        slot.record(FakeResponse(503))
+    assert limiter.window == 2
+
+    with pytest.raises(ConnectionError):
+        with limiter.slot():
+            raise ConnectionError()
+    assert limiter.window == 1
+
+
+def test_concurrency_is_capped_by_window():
+    limiter = HostLimiter("host", rate=1000, burst=1000, initial_window=2, max_window=2)
+    peak = []
+    lock = threading.Lock()
+
+    def request():
+        with limiter.slot():
+            with lock:
+                peak.append(limiter.in_flight)
+            time.sleep(0.01)
+
+    threads = [threading.Thread(target=request) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert max(peak) == 2
+
+
+def test_rate_and_retry_after_delay_requests():
+    limiter = HostLimiter("host", rate=20, burst=1, initial_window=4, max_window=4)
+    start = time.monotonic()
+    for _ in range(5):
+        with limiter.slot():
+            pass
+    # one token up front, then one every 50ms
+    assert time.monotonic() - start >= 0.19
+
+    with limiter.slot() as slot:
+        slot.record(FakeResponse(429, {"Retry-After": "0.3"}))
+    start = time.monotonic()
+    with limiter.slot():
+        pass
+    assert time.monotonic() - start >= 0.25
+
+
+def test_retry_after_formats():
+    assert parse_retry_after("2") == 2.0
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+    assert parse_retry_after(None) is None
+
+
+def test_limiters_are_shared_per_host():
+    assert limiter_for("https://svtipps.de/a") is limiter_for("https://svtipps.de/b")
+    assert limiter_for("https://www.svtipps.de/").max_window == 4
+
+
+def test_limited_get_retries_429_and_5xx():
+    class Session:
+        def __init__(self, statuses):
+            self.statuses = list(statuses)
+
+        def get(self, url, **kwargs):
+            response = FakeResponse(self.statuses.pop(0), {"Retry-After": "0"})
+            response.close = lambda: None
+            return response
+
+    session = Session([429, 503, 200])
+    assert limited_get("https://retry.example/a", session=session).status_code == 200
+    assert session.statuses == []
+
+    # the last response is returned once the attempts are used up
+    session = Session([502, 502])
+    assert limited_get("https://retry.example/b", session=session, max_retries=2).status_code == 502
@@ -0,0 +1,209 @@
+import os
+import threading
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+from botocore.exceptions import ClientError
+from lib.s3_helpers import (
+    S3MultipartWriter,
+    conform_to_schema,
+    upload_table,
+    upload_bytes,
+    table_fingerprint,
+    BackgroundUploader,
+    MIN_PART_SIZE,
+)
+from lib.metrics import RunReport
+from lib.scheduler import Stage, run_stages
+
+
+class FakeS3Client:
+    def __init__(self):
+        self.objects = {}
+        self.uploads = {}
+        self.calls = []
+
+    def head_object(self, Bucket, Key):
+        if Key not in self.objects:
+            raise ClientError({"Error": {"Code": "404"}}, "HeadObject")
+        return {"Metadata": self.objects[Key][1].get("Metadata", {})}
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self.calls.append("put_object")
+        self.objects[Key] = (bytes(Body), kwargs)
+
+    def create_multipart_upload(self, Bucket, Key, **kwargs):
+        self.calls.append("create_multipart_upload")
+        upload_id = f"upload-{len(self.uploads)}"
+        self.uploads[upload_id] = {"parts": {}, "kwargs": kwargs}
+        return {"UploadId": upload_id}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        self.uploads[UploadId]["parts"][PartNumber] = Body
+        return {"ETag": f"etag-{PartNumber}"}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        self.calls.append("complete_multipart_upload")
+        upload = self.uploads.pop(UploadId)
+        numbers = [p["PartNumber"] for p in MultipartUpload["Parts"]]
+        assert numbers == sorted(upload["parts"])
+        self.objects[Key] = (b"".join(upload["parts"][n] for n in numbers), upload["kwargs"])
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        self.calls.append("abort_multipart_upload")
+        del self.uploads[UploadId]
+
+
+def read_object(client, key):
+    return pq.read_table(pa.BufferReader(client.objects[key][0]))
+
+
+def test_large_table_uses_multipart_upload():
+    client = FakeS3Client()
+    table = pa.table({"id": list(range(3000)), "blob": [os.urandom(4096) for _ in range(3000)]})
+    upload_table(
+        client, table, "bucket", "t.parquet", {"ACL": "public-read"},
+        part_size=MIN_PART_SIZE, max_concurrency=2, row_group_size=500, compression="none",
+    )
+    assert "complete_multipart_upload" in client.calls
+    assert client.objects["t.parquet"][1]["ACL"] == "public-read"
+    assert read_object(client, "t.parquet").equals(table)
+
+
+def test_small_table_uses_single_put():
+    client = FakeS3Client()
+    table = pa.table({"id": [1, 2, 3]})
+    upload_table(client, table, "bucket", "small.parquet", skip_unchanged=False)
+    assert client.calls == ["put_object"]
+    assert read_object(client, "small.parquet").equals(table)
+
+
+def test_failed_write_aborts_upload():
+    client = FakeS3Client()
+    with pytest.raises(RuntimeError):
+        with S3MultipartWriter(client, "bucket", "x", part_size=MIN_PART_SIZE) as sink:
+            sink.write(bytes(MIN_PART_SIZE + 1))
+            raise RuntimeError("boom")
+    assert client.calls == ["create_multipart_upload", "abort_multipart_upload"]
+    assert "x" not in client.objects
+
+
+class FailingPartClient(FakeS3Client):
+    def __init__(self, failing_part):
+        super().__init__()
+        self.failing_part = failing_part
+        self.attempted_parts = []
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        self.attempted_parts.append(PartNumber)
+        if PartNumber == self.failing_part:
+            raise ClientError({"Error": {"Code": "InternalError"}}, "UploadPart")
+        return super().upload_part(Bucket, Key, UploadId, PartNumber, Body)
+
+
+def test_failed_part_aborts_upload_on_close():
+    client = FailingPartClient(failing_part=2)
+    with pytest.raises(ClientError):
+        with S3MultipartWriter(client, "bucket", "x", part_size=MIN_PART_SIZE) as sink:
+            sink.write(bytes(2 * MIN_PART_SIZE))
+    assert client.calls == ["create_multipart_upload", "abort_multipart_upload"]
+    assert client.uploads == {}
+    assert "x" not in client.objects
+
+
+def test_failed_part_stops_writing():
+    client = FailingPartClient(failing_part=1)
+    with pytest.raises(ClientError):
+        with S3MultipartWriter(client, "bucket", "x", part_size=MIN_PART_SIZE, max_concurrency=1) as sink:
+            for _ in range(8):
+                sink.write(bytes(MIN_PART_SIZE))
+    assert len(client.attempted_parts) < 8
+    assert client.calls == ["create_multipart_upload", "abort_multipart_upload"]
+
+
+def test_conform_to_schema_skips_matching_tables():
+    schema = pa.schema([pa.field("a", pa.int64()), pa.field("b", pa.string())])
+    table = pa.table({"a": [1], "b": ["x"]}, schema=schema)
+    assert conform_to_schema(table, schema, "t") is table
+
+    reordered = pa.table({"b": pa.array(["x"], pa.large_string()), "a": [1], "c": [0]})
+    assert conform_to_schema(reordered, schema, "t").schema.equals(schema)
+
+    with pytest.raises(ValueError):
+        conform_to_schema(pa.table({"a": [1]}), schema, "t")
+
+
+def test_fingerprint_ignores_row_order_and_chunking():
+    table = pa.table({"id": [3, 1, 2], "blob": [b"c", b"a", b"b"]})
+    shuffled = pa.concat_tables([table.slice(1), table.slice(0, 1)])
+    assert table_fingerprint(table, ["id"]) == table_fingerprint(shuffled, ["id"])
+    changed = pa.table({"id": [3, 1, 2], "blob": [b"c", b"a", b"x"]})
+    assert table_fingerprint(table, ["id"]) != table_fingerprint(changed, ["id"])
+    assert table_fingerprint(table, ["id"]) != table_fingerprint(table, ["id"], salt="zstd")
+
+
+def test_fingerprint_sorts_dictionary_columns():
+    table = pa.table({"j": pa.array(["b", "a"]).dictionary_encode(), "v": [1, 2]})
+    reversed_table = table.take([1, 0])
+    assert table_fingerprint(table, ["j"]) == table_fingerprint(reversed_table, ["j"])
+
+
+def test_unchanged_table_is_not_uploaded_again():
+    client = FakeS3Client()
+    table = pa.table({"id": [1, 2, 3]})
+    assert upload_table(client, table, "bucket", "t.parquet", sort_keys=["id"])
+    assert not upload_table(client, table.take([2, 0, 1]), "bucket", "t.parquet", sort_keys=["id"])
+    assert upload_table(client, pa.table({"id": [1, 2]}), "bucket", "t.parquet", sort_keys=["id"])
+    assert client.calls == ["put_object", "put_object"]
+
+
+def test_unchanged_bytes_are_not_uploaded_again():
+    client = FakeS3Client()
+    assert upload_bytes(client, b"{}", "bucket", "tree.json")
+    assert not upload_bytes(client, b"{}", "bucket", "tree.json")
+    assert upload_bytes(client, b"[]", "bucket", "tree.json")
+
+
+def test_background_uploader_bounds_bytes_in_flight():
+    uploader = BackgroundUploader(max_workers=4, max_bytes_in_flight=100)
+    in_flight = []
+    peak = []
+    lock = threading.Lock()
+
+    def upload(n_bytes):
+        with lock:
+            in_flight.append(n_bytes)
+            peak.append(sum(in_flight))
+        threading.Event().wait(0.01)
+        with lock:
+            in_flight.remove(n_bytes)
+        return n_bytes
+
+    for i in range(8):
+        uploader.submit(f"key-{i}", 60, upload, 60)
+    # larger than the limit, accepted once nothing else is in flight
+    uploader.submit("big", 500, upload, 500)
+    uploader.wait()
+    uploader.shutdown()
+
+    assert max(peak) == 500
+    assert all(p <= 100 for p in peak[:-1])
+    assert sorted(t["key"] for t in uploader.transfers) == sorted([f"key-{i}" for i in range(8)] + ["big"])
+
+
+def test_failed_background_upload_marks_stage():
+    report = RunReport("run")
+    uploader = BackgroundUploader(report=report)
+
+    def fail():
+        raise RuntimeError("connection reset")
+
+    def stage():
+        uploader.submit("t.parquet", 10, fail)
+        uploader.submit("u.parquet", 10, lambda: 10)
+
+    run_stages([Stage("upload", stage)], worker_budget=1, report=report)
+    with pytest.raises(RuntimeError):
+        uploader.wait()
+    assert uploader.failed_stages == {"upload"}
+    assert [t["key"] for t in report.to_dict()["uploads"]] == ["u.parquet"]
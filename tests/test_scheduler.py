@@ -0,0 +1,103 @@
+import functools
+import threading
+import time
+import pytest
+from lib.scheduler import Stage, select_stages, run_stages
+
+
+def test_run_stages_passes_artifacts():
+    stages = [
+        Stage("a", lambda: 1, outputs=["x"]),
+        Stage("b", lambda x: x + 1, inputs=["x"], outputs=["y"]),
+        Stage("c", lambda x, y: (x + y, x * y), inputs=["x", "y"], outputs=["s", "p"]),
+    ]
+    artifacts = run_stages(stages, worker_budget=4)
+    assert artifacts == {"x": 1, "y": 2, "s": 3, "p": 2}
+
+
+def test_independent_stages_run_concurrently():
+    barrier = threading.Barrier(3, timeout=5)
+
+    def wait():
+        barrier.wait()
+        return True
+
+    stages = [Stage(name, wait, outputs=[name]) for name in ["a", "b", "c"]]
+    start = time.perf_counter()
+    artifacts = run_stages(stages, worker_budget=3)
+    assert all(artifacts.values())
+    assert time.perf_counter() - start < 5
+
+
+def test_worker_budget_is_respected():
+    active = []
+    peak = []
+    lock = threading.Lock()
+
+    def work():
+        with lock:
+            active.append(1)
+            peak.append(len(active))
+        time.sleep(0.05)
+        with lock:
+            active.pop()
+
+    stages = [Stage(f"s{i}", work, workers=2) for i in range(6)]
+    run_stages(stages, worker_budget=4)
+    assert max(peak) == 2
+
+
+def test_failing_stage_stops_dependents():
+    ran = []
+
+    def fail():
+        raise RuntimeError("boom")
+
+    stages = [
+        Stage("a", fail, outputs=["x"]),
+        Stage("b", lambda x: ran.append(x), inputs=["x"]),
+    ]
+    with pytest.raises(RuntimeError, match="boom"):
+        run_stages(stages, worker_budget=2)
+    assert ran == []
+
+
+def test_select_stages_adds_dependencies():
+    stages = [
+        Stage("a", lambda: 1, outputs=["x"]),
+        Stage("b", lambda x: x, inputs=["x"], outputs=["y"]),
+        Stage("c", lambda: 3, outputs=["z"]),
+    ]
+    assert [s.name for s in select_stages(stages, ["b"])] == ["a", "b"]
+    with pytest.raises(ValueError):
+        select_stages(stages, ["unknown"])
+
+
+def test_concurrent_stages_share_one_live_display(monkeypatch):
+    # rich 14.0 raises as soon as a second live display starts on the same console
+    from rich.console import Console
+    from rich.errors import LiveError
+    from lib.progress import progress_task
+
+    def set_live(self, live):
+        with self._lock:
+            if self._live_stack:
+                raise LiveError("Only one live display may be active at once")
+            self._live_stack.append(live)
+            return True
+
+    monkeypatch.setattr(Console, "set_live", set_live)
+    barrier = threading.Barrier(2, timeout=5)
+
+    def scrape(name):
+        with progress_task(name, total=2) as advance:
+            advance()
+            barrier.wait()
+            advance()
+        return name
+
+    stages = [Stage(name, functools.partial(scrape, name), outputs=[name]) for name in ["svtipps", "file_links"]]
+    assert run_stages(stages, worker_budget=2) == {"svtipps": "svtipps", "file_links": "file_links"}
+    # the display is stopped with the last task, and a later stage can start a new one
+    with progress_task("glossary_terms", total=1) as advance:
+        advance()
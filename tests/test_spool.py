@@ -0,0 +1,86 @@
+import os
+import time
+import hashlib
+import polars as pl
+from lib import scraping
+from lib.checkpoints import CheckpointStore, spooled_digests
+from lib.spool import FileSpool, load_spooled_binaries
+from lib.validators import ValidatorStore
+
+
+def test_spool_hashes_and_deduplicates(tmp_path):
+    spool = FileSpool(str(tmp_path))
+    first = spool.write_chunks([b"ab", b"", b"c"])
+    second = spool.write_chunks(iter([b"abc"]))
+
+    assert first.sha256 == second.sha256 == hashlib.sha256(b"abc").hexdigest()
+    assert first.size == 3
+    assert sorted(p.name for p in tmp_path.iterdir()) == [first.sha256]
+    assert spool.read(first.sha256) == b"abc"
+
+
+def test_binaries_are_loaded_at_write_time():
+    spool = FileSpool()
+    a = spool.write_chunks([b"a" * 10])
+    df = pl.DataFrame(
+        {"data_id": [1, 2], "file_sha256": [a.sha256, None], "file_size": [10, None], "file_type": ["pdf", "pdf"]}
+    )
+    loaded = load_spooled_binaries(df, spool, "file_binary")
+    assert loaded.columns == ["data_id", "file_binary", "file_type"]
+    assert loaded["file_binary"].to_list() == [b"a" * 10, None]
+
+
+def test_download_streams_into_spool(http_server):
+    body = bytes(range(256)) * 1000
+    server = http_server(body)
+    is_valid, file_type, spooled = scraping.download_file(f"{server.url}/f", FileSpool())
+
+    assert is_valid
+    assert file_type == "pdf"
+    assert spooled.size == len(body)
+    assert spooled.sha256 == hashlib.sha256(body).hexdigest()
+
+
+def test_unchanged_download_is_reused(tmp_path, http_server):
+    body = b"%PDF-1.4 unchanged"
+    server = http_server(body)
+    url = f"{server.url}/f"
+    spool = FileSpool(str(tmp_path / "spool"))
+    validators = ValidatorStore(str(tmp_path / "validators.sqlite"))
+    first = scraping.download_file(url, spool, validators=validators)
+    second = scraping.download_file(url, spool, validators=validators)
+
+    assert "If-None-Match" not in server.requests[0].headers
+    assert server.requests[1].headers["If-None-Match"] == '"v1"'
+    is_valid, file_type, spooled = second
+    assert is_valid
+    assert file_type == "pdf"
+    assert spooled.sha256 == first[2].sha256
+    assert spool.read(spooled.sha256) == body
+
+
+def test_overloaded_server_is_retried(http_server):
+    body = b"%PDF-1.4 after a 503"
+    server = http_server(body, fail_first=2)
+    is_valid, _, spooled = scraping.download_file(f"{server.url}/f", FileSpool())
+
+    assert is_valid
+    assert len(server.requests) == 3
+    assert spooled.sha256 == hashlib.sha256(body).hexdigest()
+
+
+def test_unreferenced_files_are_pruned(tmp_path):
+    spool = FileSpool(str(tmp_path / "spool"))
+    validated, checkpointed, orphan = (spool.write_chunks([body]) for body in [b"v", b"c", b"o"])
+    validators = ValidatorStore(str(tmp_path / "validators.sqlite"))
+    validators.put("https://example.org/v.pdf", '"v1"', None, "pdf", validated.sha256, validated.size)
+    checkpoints = CheckpointStore(tmp_path / "checkpoints", "run")
+    downloads = pl.DataFrame({"file_sha256": [checkpointed.sha256, None], "file_size": [1, None]})
+    checkpoints.save_stage("downloads", {"downloads_df": downloads})
+
+    keep = validators.digests() | spooled_digests(tmp_path / "checkpoints")
+    assert keep == {validated.sha256, checkpointed.sha256}
+    # files written after the cutoff may belong to a run that is still downloading
+    assert spool.prune(keep, older_than=time.time() - 60) == (0, 0)
+    assert spool.prune(keep) == (1, 1)
+    assert sorted(os.listdir(spool.path)) == sorted([validated.sha256, checkpointed.sha256])
@@ -0,0 +1,153 @@
+import io
+import zipfile
+import polars as pl
+import pytest
+from xml.sax.saxutils import escape
+from lib import post_parsing
+from lib.spool import FileSpool
+from lib.transcripts import TranscriptIndex, load_transcript_sheet, media_key
+from lib.validators import ValidatorStore
+
+
+def xlsx(rows):
+    """A minimal workbook with inline strings, as written by spreadsheet exports"""
+    cells = "".join(
+        f'<row r="{i}">'
+        + "".join(
+            f'<c r="{chr(65 + j)}{i}" t="inlineStr"><is><t>{escape(value)}</t></is></c>' for j, value in enumerate(values)
+        )
+        + "</row>"
+        for i, values in enumerate(rows, start=1)
+    )
+    main = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+    rels = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+    package_rels = "http://schemas.openxmlformats.org/package/2006/relationships"
+    files = {
+        "[Content_Types].xml": (
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Override PartName="/xl/workbook.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+            '<Override PartName="/xl/worksheets/sheet1.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+            "</Types>"
+        ),
+        "_rels/.rels": (
+            f'<Relationships xmlns="{package_rels}"><Relationship Id="rId1" '
+            f'Type="{rels}/officeDocument" Target="xl/workbook.xml"/></Relationships>'
+        ),
+        "xl/workbook.xml": (
+            f'<workbook xmlns="{main}" xmlns:r="{rels}">'
+            '<sheets><sheet name="Sheet1" sheetId="1" r:id="rId1"/></sheets></workbook>'
+        ),
+        "xl/_rels/workbook.xml.rels": (
+            f'<Relationships xmlns="{package_rels}"><Relationship Id="rId1" '
+            f'Type="{rels}/worksheet" Target="worksheets/sheet1.xml"/></Relationships>'
+        ),
+        "xl/worksheets/sheet1.xml": f'<worksheet xmlns="{main}"><sheetData>{cells}</sheetData></worksheet>',
+    }
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        for name, data in files.items():
+            archive.writestr(name, data)
+    return buffer.getvalue()
+
+
+XLSX = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+
+@pytest.mark.parametrize(
+    "url",
+    [
+        "https://youtu.be/ZqFnl5tJi7o",
+        "https://youtu.be/ZqFnl5tJi7o?si=abc",
+        "https://www.youtube.com/watch?v=ZqFnl5tJi7o&t=42",
+        "https://m.youtube.com/watch?v=ZqFnl5tJi7o",
+        "https://www.youtube.com/embed/ZqFnl5tJi7o?si=xX18a5jYW_FkxuMk",
+        "https://www.youtube-nocookie.com/embed/ZqFnl5tJi7o",
+        "https://www.youtube.com/shorts/ZqFnl5tJi7o",
+        " youtube.com/watch?v=ZqFnl5tJi7o ",
+    ],
+)
+def test_youtube_urls_share_the_video_id(url):
+    assert media_key(url) == ("youtube", "ZqFnl5tJi7o")
+
+
+@pytest.mark.parametrize(
+    "url",
+    [
+        "https://prezi.com/view/VS3INtXFDLbyR0z806Ei/",
+        "prezi.com/view/VS3INtXFDLbyR0z806Ei",
+        "https://prezi.com/p/embed/VS3INtXFDLbyR0z806Ei/",
+        "https://prezi.com/p/VS3INtXFDLbyR0z806Ei/wahlen/",
+        "https://prezi.com/v/VS3INtXFDLbyR0z806Ei/",
+    ],
+)
+def test_prezi_urls_share_the_presentation_id(url):
+    assert media_key(url) == ("prezi", "VS3INtXFDLbyR0z806Ei")
+
+
+def test_other_urls_are_keyed_by_host_and_path():
+    assert media_key("https://www.meinsvwissen.de/a/b.jpg?x=1") == ("url", "meinsvwissen.de/a/b.jpg")
+
+
+def test_index_lookup():
+    df = pl.DataFrame(
+        {
+            "url_medium": [
+                " https://youtu.be/ZqFnl5tJi7o ",
+                "https://www.youtube.com/watch?v=ZqFnl5tJi7o",
+                "prezi.com/view/GWGX1XDylIhHeu0InLo8/",
+                None,
+            ],
+            "url_transkript": ["https://t/1", "https://t/2", "https://t/3", "https://t/4"],
+        }
+    )
+    index = TranscriptIndex(df)
+    assert len(index) == 2
+    assert index.lookup("https://www.youtube.com/embed/ZqFnl5tJi7o?si=x") == "https://t/1"
+    assert index.lookup("https://prezi.com/p/embed/GWGX1XDylIhHeu0InLo8/") == "https://t/3"
+    assert index.lookup("https://meinsvwissen.de/wp-content/uploads/2025/08/Klimaschutz-1.jpg") is None
+
+
+def test_sheet_is_refreshed_with_a_conditional_get(tmp_path, http_server):
+    body = xlsx([["url_medium", "url_transkript"], ["https://youtu.be/ZqFnl5tJi7o", "https://t/1"]])
+    server = http_server(body, content_type=XLSX)
+    url = f"{server.url}/transcripts.xlsx"
+    spool = FileSpool(str(tmp_path / "spool"))
+    validators = ValidatorStore(str(tmp_path / "validators.sqlite"))
+    first = load_transcript_sheet(url, spool, validators)
+    second = load_transcript_sheet(url, spool, validators)
+    # while the server is down, the cached copy is used
+    server.down = True
+    third = load_transcript_sheet(url, spool, validators)
+
+    assert "If-None-Match" not in server.requests[0].headers
+    assert server.requests[1].headers["If-None-Match"] == '"v1"'
+    assert first["url_transkript"].to_list() == ["https://t/1"]
+    assert first.equals(second)
+    assert first.equals(third)
+
+
+def test_missing_sheet_without_cache_raises(tmp_path, http_server):
+    server = http_server(b"", content_type=XLSX)
+    server.down = True
+    spool = FileSpool(str(tmp_path / "spool"))
+    validators = ValidatorStore(str(tmp_path / "validators.sqlite"))
+    with pytest.raises(RuntimeError):
+        load_transcript_sheet(f"{server.url}/transcripts.xlsx", spool, validators)
+
+
+def test_pipeline_loads_the_sheet_through_its_own_store(tmp_path, monkeypatch, http_server):
+    body = xlsx([["url_medium", "url_transkript"], ["https://youtu.be/ZqFnl5tJi7o", "https://t/1"]])
+    url = f"{http_server(body, content_type=XLSX).url}/transcripts.xlsx"
+    monkeypatch.setattr(post_parsing, "transcript_sheet_url", url)
+    monkeypatch.setattr(post_parsing, "_transcript_index", None)
+    # no second connection to the validators of the downloads stage
+    monkeypatch.setattr(post_parsing, "ValidatorStore", None)
+    validators = ValidatorStore(str(tmp_path / "validators.sqlite"))
+    post_parsing.load_transcript_index(FileSpool(str(tmp_path / "spool")), validators)
+
+    assert post_parsing.get_transcript_url("https://www.youtube.com/embed/ZqFnl5tJi7o") == "https://t/1"
+    assert validators.get(url)["etag"] == '"v1"'
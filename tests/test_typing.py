@@ -44,4 +44,88 @@ def test_typing():
     print(pyarrow_schema)
 
     pydantic_model = PostSchema.to_pydantic_model()
-    print(pydantic_model)
\ No newline at end of file
+    print(pydantic_model)
+
+def test_parquet_write_options():
+    import io
+    import pyarrow.parquet as pq
+    from lib.models import DownloadSchema
+
+    df = pl.DataFrame(
+        {
+            "data_id": [1, 2],
+            "data_category_id": [41, 41],
+            "title": ["a", "b"],
+            "category_title": ["c", "c"],
+            "download_link": ["https://x/1", "https://x/2"],
+            "file_type": ["pdf", "pdf"],
+            "file_binary": [b"%PDF-1", b"%PDF-2"],
+            "associated_posts": [[1, 2], None],
+        }
+    )
+    table = df.to_arrow().cast(DownloadSchema.to_pyarrow_schema())
+    sink = io.BytesIO()
+    pq.write_table(table, sink, **DownloadSchema.to_parquet_write_options())
+
+    metadata = pq.ParquetFile(io.BytesIO(sink.getvalue())).metadata
+    columns = {
+        metadata.row_group(0).column(i).path_in_schema: metadata.row_group(0).column(i)
+        for i in range(metadata.num_columns)
+    }
+    assert columns["file_binary"].compression == "UNCOMPRESSED"
+    assert not columns["file_binary"].is_stats_set
+    assert "RLE_DICTIONARY" not in columns["file_binary"].encodings
+    assert columns["data_id"].compression == "ZSTD"
+    assert columns["data_id"].is_stats_set
+    assert columns["associated_posts.list.element"].compression == "ZSTD"
+
+
+def test_schema_conversions_are_shared_and_read_only():
+    import pytest
+    from lib.models import SectionSchema
+
+    assert SectionSchema.to_polars_schema() is SectionSchema.to_polars_schema()
+    assert SectionSchema.to_pyarrow_schema() is SectionSchema.to_pyarrow_schema()
+    assert SectionSchema.to_pydantic_model() is SectionSchema.to_pydantic_model()
+    with pytest.raises(TypeError):
+        SectionSchema.to_polars_schema()["extra"] = pl.Int64
+
+
+def test_validate_frame_reports_errors_per_row():
+    from lib.models import SectionSchema, PostSchema
+
+    df = pl.DataFrame(
+        {
+            "post_id": ["1", "x", None],
+            "title": ["a", None, None],
+            "text": [None, None, None],
+            "type": ["quiz", "nope", "h5p"],
+            "external_link": [None, None, None],
+        }
+    )
+    result = SectionSchema.validate_frame(df)
+    assert not result.ok
+    assert result.frame.schema == SectionSchema.to_polars_schema()
+    assert result.frame["post_id"].to_list() == [1, None, None]
+    assert result.errors.select("row", "column", "error").rows() == [
+        (None, "transcript_url", "missing column"),
+        (1, "post_id", "can not be coerced to Int64"),
+        (1, "type", "is not a valid enum value"),
+        (2, "post_id", "null in non-nullable column"),
+    ]
+
+    posts = pyarrow.table({"id": [1, 2], "tool_types": [["video", "bogus"], ["video"]]})
+    errors = PostSchema.validate_frame(posts).errors.filter(pl.col("row").is_not_null())
+    assert errors.select("row", "column", "error").rows() == [(0, "tool_types", "element is not a valid enum value")]
+
+
+def test_check_frame_raises():
+    import pytest
+    from lib import SchemaValidationError
+    from lib.models import SCCSchema
+
+    valid = pl.DataFrame({"name": ["a"], "description": ["d"], "website": ["w"], "jurisdiction": ["DE_BY"]})
+    assert SCCSchema.check_frame(valid)["jurisdiction"].dtype == SCCSchema.to_polars_schema()["jurisdiction"]
+    with pytest.raises(SchemaValidationError) as e:
+        SCCSchema.check_frame(valid.with_columns(jurisdiction=pl.lit("XX")))
+    assert e.value.errors["column"].to_list() == ["jurisdiction"]